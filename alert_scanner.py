@@ -1,45 +1,84 @@
 #!/usr/bin/env python3
+"""
+alert_scanner.py
+Extract WARN/ERROR alerts from monitoring.log into alerts.json.
+
+For multi-GB logs pass --workers (or --jsonl): the file is then scanned in
+parallel by log_analytics.analyze(), alerts are streamed to a JSON-lines
+file instead of being collected in memory, and per-level / per-device
+counts are printed.
+
+Usage:
+  python alert_scanner.py
+  python alert_scanner.py big_monitoring.log --workers 8 --jsonl alerts.jsonl
+"""
 import json
+import argparse
 from pathlib import Path
 
-log_path = Path("monitoring.log")
-alerts = []
-
-if not log_path.exists():
-    print("monitoring.log not found. Create the file and re-run.")
-    raise SystemExit(1)
-
-with log_path.open() as fh:
-    for line in fh:
-        line = line.strip()
-        if not line:
-            continue
-        # simple patterns for WARN and ERROR
-        if "WARN" in line or "ERROR" in line:
-            # parse simple timestamp / level / message
-            # format: [YYYY-MM-DD HH:MM:SS] LEVEL - message
-            try:
-                ts_end = line.index("]")
-                timestamp = line[1:ts_end]
-                remainder = line[ts_end+2:]
-                level, msg = remainder.split(" - ", 1)
-                level = level.strip()
-            except Exception:
-                timestamp = ""
-                level = "UNKNOWN"
-                msg = line
-
-            alert = {
-                "timestamp": timestamp,
-                "level": level,
-                "message": msg
-            }
-            alerts.append(alert)
-            print(f"ALERT: {timestamp} {level} - {msg}")
-
-# write structured alerts to alerts.json
-alerts_path = Path("alerts.json")
-with alerts_path.open("w") as out:
-    json.dump({"alerts": alerts}, out, indent=2)
-
-print(f"\nFound {len(alerts)} alert(s). Written to {alerts_path.resolve()}")
+
+def parse_alert_line(line):
+    """{"timestamp", "level", "message"} for a WARN/ERROR line, else None."""
+    line = line.strip()
+    # simple patterns for WARN and ERROR
+    if not line or ("WARN" not in line and "ERROR" not in line):
+        return None
+    # parse simple timestamp / level / message
+    # format: [YYYY-MM-DD HH:MM:SS] LEVEL - message
+    try:
+        ts_end = line.index("]")
+        timestamp = line[1:ts_end]
+        remainder = line[ts_end+2:]
+        level, msg = remainder.split(" - ", 1)
+        level = level.strip()
+    except Exception:
+        timestamp = ""
+        level = "UNKNOWN"
+        msg = line
+    return {
+        "timestamp": timestamp,
+        "level": level,
+        "message": msg
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract WARN/ERROR alerts from a monitoring log")
+    parser.add_argument("log", nargs="?", default="monitoring.log")
+    parser.add_argument("--workers", type=int, help="Sharded multi-process scan with this many workers")
+    parser.add_argument("--jsonl", help="Sharded scan output (default alerts.jsonl when --workers is set)")
+    args = parser.parse_args()
+
+    log_path = Path(args.log)
+    alerts = []
+
+    if not log_path.exists():
+        print(f"{log_path} not found. Create the file and re-run.")
+        raise SystemExit(1)
+
+    if args.workers or args.jsonl:
+        from log_analytics import analyze
+
+        summary = analyze(log_path, args.jsonl or "alerts.jsonl", workers=args.workers, fmt="monitoring")
+        print(f"Found {summary['alerts']} alert(s) in {summary['lines']} line(s) "
+              f"({summary['workers']} worker(s), {summary['elapsed_s']}s). "
+              f"Written to {Path(summary['output']).resolve()}")
+        for level, n in summary["levels"].items():
+            print(f"  {level:<10} {n}")
+        for device, levels in summary["devices"].items():
+            print(f"  {device:<20} " + ", ".join(f"{level}={n}" for level, n in levels.items()))
+        raise SystemExit(0)
+
+    with log_path.open() as fh:
+        for line in fh:
+            alert = parse_alert_line(line)
+            if alert:
+                alerts.append(alert)
+                print(f"ALERT: {alert['timestamp']} {alert['level']} - {alert['message']}")
+
+    # write structured alerts to alerts.json
+    alerts_path = Path("alerts.json")
+    with alerts_path.open("w") as out:
+        json.dump({"alerts": alerts}, out, indent=2)
+
+    print(f"\nFound {len(alerts)} alert(s). Written to {alerts_path.resolve()}")
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+bench_ack_throughput.py
+ACKed messages/sec for the ingest pipeline with the write-ahead log on
+(fsync per group commit). The server runs in its own process, so its
+event loop has one core to itself. Clients stream messages over
+persistent connections with up to --window unacknowledged messages each,
+and count the returned MSA-1 codes.
+
+Usage:
+  python benchmarks/bench_ack_throughput.py --connections 20 --messages 2000 --window 32
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mllp import FrameDecoder, frame  # noqa: E402
+from hl7_ack import ack_code  # noqa: E402
+
+
+def make_frame(conn, i):
+    return frame(f"MSH|^~\\&|Device{conn}|Ward1|EMR|Main|202508031010||ORU^R01|C{conn}M{i}|P|2.3\r"
+                 f"PID|||{100000 + i}||DOE^JOHN\r"
+                 f"OBR|1|||DIA001^DIALYSIS^L\r"
+                 f"OBX|1|NM|KtV^Dialysis Adequacy||{1.0 + (i % 10) / 10:.2f}||1.2-2.0||||F")
+
+
+def _server(port_queue, stats_queue, stop_event, workdir, fsync):
+    # imported here so the client process doesn't load the alert stack
+    import os
+    import logging
+    from hl7_wal import WriteAheadLog
+    from mllp_server import MLLPServer
+    from ingest_pipeline import IngestPipeline
+
+    logging.disable(logging.WARNING)
+    os.chdir(workdir)
+
+    async def main():
+        pipeline = await IngestPipeline(wal=WriteAheadLog("wal", fsync=fsync)).start()
+        server = await MLLPServer(pipeline.receive, "127.0.0.1", 0, pipelined=True).start()
+        port_queue.put(server.port)
+        while not stop_event.is_set():
+            await asyncio.sleep(0.05)
+        await server.close()
+        await pipeline.stop()
+        stats_queue.put(pipeline.stats())
+
+    asyncio.run(main())
+
+
+async def _client(port, conn, count, window, codes):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    slots = asyncio.Semaphore(window)
+
+    async def send():
+        for i in range(count):
+            await slots.acquire()
+            writer.write(make_frame(conn, i))
+            await writer.drain()
+
+    async def receive():
+        decoder = FrameDecoder()
+        received = 0
+        while received < count:
+            chunk = await reader.read(65536)
+            if not chunk:
+                raise ConnectionError("server closed the connection")
+            decoder.feed(chunk)
+            for view in decoder:
+                code = ack_code(bytes(view))
+                codes[code] = codes.get(code, 0) + 1
+                received += 1
+                slots.release()
+
+    try:
+        await asyncio.gather(send(), receive())
+    finally:
+        writer.close()
+
+
+async def _drive(port, connections, messages, window):
+    codes = {}
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_client(port, c, messages, window, codes) for c in range(connections)))
+    return codes, time.perf_counter() - t0
+
+
+def run(connections, messages, window, fsync=True):
+    ctx = multiprocessing.get_context("spawn")
+    port_queue, stats_queue, stop_event = ctx.Queue(), ctx.Queue(), ctx.Event()
+    with tempfile.TemporaryDirectory() as workdir:
+        proc = ctx.Process(target=_server, args=(port_queue, stats_queue, stop_event, workdir, fsync))
+        proc.start()
+        try:
+            port = port_queue.get(timeout=30)
+            codes, elapsed = asyncio.run(_drive(port, connections, messages, window))
+        finally:
+            stop_event.set()
+        stats = stats_queue.get(timeout=60)
+        proc.join()
+    acked = codes.get("AA", 0)
+    return {
+        "connections": connections,
+        "window": window,
+        "messages": connections * messages,
+        "ack_codes": codes,
+        "elapsed_s": round(elapsed, 3),
+        "acked_msgs_per_sec": round(acked / elapsed, 1),
+        "wal_records": stats["wal"]["records"],
+        "wal_fsync_groups": stats["wal"]["groups"],
+        "msgs_per_fsync": round(stats["wal"]["records"] / max(1, stats["wal"]["groups"]), 1),
+        "fsync": fsync,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ACK-after-WAL throughput benchmark")
+    parser.add_argument("--connections", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=2000, help="Messages per connection")
+    parser.add_argument("--window", type=int, default=32, help="Unacknowledged messages per connection")
+    parser.add_argument("--no-fsync", action="store_true", help="Skip fsync (shows the fsync cost)")
+    parser.add_argument("--target", type=float, default=5000.0, help="Fail below this many ACKed msgs/sec")
+    args = parser.parse_args()
+
+    result = run(args.connections, args.messages, args.window, fsync=not args.no_fsync)
+    print(json.dumps(result, indent=2))
+    if result["acked_msgs_per_sec"] < args.target:
+        print(f"FAIL: {result['acked_msgs_per_sec']} ACKed msgs/sec < target {args.target}")
+        sys.exit(1)
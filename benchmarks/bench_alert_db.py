@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+bench_alert_db.py
+Alerts/sec into the postgres-schema.sql tables: AlertDatabase (batched
+upsert + COPY/executemany) vs row-by-row inserts, one commit per alert.
+
+Alerts come in ward-outage bursts: many alerts for a few hundred patients,
+plus every MONITOR_EVERY-th one a monitor alert with no patient (NULL
+patient_id). After the batched run the stored rows are counted back, so a
+COPY that drops or mangles NULLs fails the run (exit 1) on PostgreSQL too.
+The row-by-row baseline gets a smaller count.
+
+Usage:
+  python benchmarks/bench_alert_db.py --alerts 200000
+  python benchmarks/bench_alert_db.py --db postgresql://localhost/hl7db_bench
+"""
+
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "cloud-monitoring"))
+
+from alert_db import (INSERT_ALERT, UPSERT_PATIENT, AlertDatabase, ConnectionPool,  # noqa: E402
+                      alert_row, dialect_for, init_schema)
+
+MONITOR_EVERY = 10
+
+
+def make_alert(i, patients=500):
+    if i % MONITOR_EVERY == 0:
+        return {"alert_ts": "2025-08-12T08:15:42Z", "device_id": f"dev-{i % 500}",
+                "reason": "missing-heartbeat (last seen 14s ago)", "detected_at": "2025-08-12T08:15:28Z"}
+    return {
+        "alert_id": f"ALERT-20250812-{i}",
+        "type": "LOW_KTV" if i % 3 else "HL7_PROTOCOL_ERROR",
+        "severity": "HIGH",
+        "timestamp": "2025-08-12T08:15:42.123456",
+        "patient_id": 100000 + i % patients,
+    }
+
+
+def reset(pool):
+    with pool.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM alerts")
+        cur.execute("DELETE FROM patients")
+        cur.close()
+
+
+def row_by_row(pool, count):
+    dialect = pool.dialect
+    upsert = UPSERT_PATIENT.format(dialect.placeholder, dialect.placeholder)
+    insert = INSERT_ALERT.format(dialect.placeholder)
+    t0 = time.perf_counter()
+    for i in range(count):
+        row = alert_row(make_alert(i))
+        with pool.connection() as conn:
+            cur = conn.cursor()
+            if row[1] is not None:
+                cur.execute(upsert, (row[1], f"Patient {row[1]}"))
+            cur.execute(insert, row)
+            cur.close()
+    return round(count / (time.perf_counter() - t0), 1)
+
+
+def batched(pool, count, batch_size):
+    db = AlertDatabase(pool=pool, batch_size=batch_size, create=False)
+    t0 = time.perf_counter()
+    for i in range(count):
+        alert = make_alert(i)
+        if "patient_id" in alert:
+            db.add_patient(alert["patient_id"], f"Patient {alert['patient_id']}")
+        db.write(alert)
+    db.close()
+    return round(count / (time.perf_counter() - t0), 1)
+
+
+def stored_counts(pool):
+    """(alerts, alerts with a patient, alerts with a timestamp) in the database."""
+    with pool.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*), COUNT(patient_id), COUNT(timestamp) FROM alerts")
+        counts = tuple(cur.fetchone())
+        cur.close()
+    return counts
+
+
+def run(url, alerts, rows, batch_size):
+    pool = ConnectionPool(dialect_for(url))
+    init_schema(pool)
+    results = {}
+    reset(pool)
+    results["row-by-row"] = row_by_row(pool, rows)
+    reset(pool)
+    results[f"batched({batch_size})"] = batched(pool, alerts, batch_size)
+    monitor = len(range(0, alerts, MONITOR_EVERY))
+    expected = (alerts, alerts - monitor, alerts)
+    stored = stored_counts(pool)
+    pool.close()
+    failures = [] if stored == expected else [
+        f"stored (alerts, with patient, with timestamp) {stored}, expected {expected}"]
+    return results, failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Patient/alert persistence benchmark")
+    parser.add_argument("--db", help="Database URL (default: a temporary sqlite: file)")
+    parser.add_argument("--alerts", type=int, default=200_000)
+    parser.add_argument("--row-alerts", type=int, default=5_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.db or f"sqlite:{Path(tmp) / 'hl7db.sqlite'}"
+        results, failures = run(url, args.alerts, args.row_alerts, args.batch_size)
+    for name, rate in results.items():
+        print(f"{name:<16} {rate:>12} alerts/s")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+bench_alert_store.py
+Alerts/sec for each alert_store backend vs the old read-modify-rewrite of
+alerts.json (which is O(n^2) overall, so it gets a smaller count).
+
+Usage:
+  python benchmarks/bench_alert_store.py --alerts 100000 --legacy-alerts 2000
+"""
+
+import sys
+import json
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "cloud-monitoring"))
+
+from alert_store import JsonlAlertSink, SqliteAlertSink  # noqa: E402
+
+
+def make_alert(i):
+    return {
+        "alert_ts": "2025-08-12T08:15:42Z",
+        "device_id": f"dev-{i % 500}",
+        "reason": "missing-heartbeat (last seen 14s ago)",
+        "detected_at": "2025-08-12T08:15:28Z",
+        "details": {"ts": "2025-08-12T08:15:28Z", "device_id": f"dev-{i % 500}",
+                    "status": "OK", "battery": 71, "metric": 156.39},
+    }
+
+
+def legacy_write(path, alert):
+    """The previous write_alert JSON handling."""
+    alerts = []
+    if path.exists():
+        try:
+            alerts = json.loads(path.read_text(encoding="utf-8"))
+        except Exception:
+            alerts = []
+    alerts.append(alert)
+    path.write_text(json.dumps(alerts, indent=2), encoding="utf-8")
+
+
+def timed(count, write, close=None):
+    t0 = time.perf_counter()
+    for i in range(count):
+        write(make_alert(i))
+    if close:
+        close()
+    return round(count / (time.perf_counter() - t0), 1)
+
+
+def run(alerts, legacy_alerts):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        path = tmp / "alerts.json"
+        results["legacy-json"] = timed(legacy_alerts, lambda a: legacy_write(path, a))
+        sink = JsonlAlertSink(tmp / "jsonl")
+        results["jsonl"] = timed(alerts, sink.write, sink.close)
+        sink = SqliteAlertSink(tmp / "alerts.db")
+        results["sqlite"] = timed(alerts, sink.write, sink.close)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Alert store throughput benchmark")
+    parser.add_argument("--alerts", type=int, default=100_000)
+    parser.add_argument("--legacy-alerts", type=int, default=2_000)
+    args = parser.parse_args()
+
+    for name, rate in run(args.alerts, args.legacy_alerts).items():
+        print(f"{name:<12} {rate:>12} alerts/s")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+bench_cold_start.py
+Cold-start import budget for the l2lab.py commands, from -X importtime.
+
+Each command is started --runs times as `python -X importtime l2lab.py
+<command> ...` on a small fixture in a scratch directory. Its import cost
+is the sum of the top-level cumulative times minus the same sum for a
+bare `python -c pass` (site, encodings: paid by every script). The median
+run is compared to --budget-ms; a command over budget fails the check
+(exit 1) and its heaviest imports are listed, so a new module-level
+`import boto3` shows up by name. Wall time per start is reported too.
+
+Usage:
+  python benchmarks/bench_cold_start.py
+  python benchmarks/bench_cold_start.py --budget-ms 100 --runs 7 --json cold_start.json
+"""
+
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+CLI = ROOT / "l2lab.py"
+
+# command -> (l2lab.py arguments, checked against the budget)
+COMMANDS = {
+    "scan": (["scan", "monitoring.log"], True),
+    "monitor": (["monitor", "--once", "--threshold", "12"], True),
+    "listen --help": (["listen", "--help"], False),
+    "simulate-dialysis --help": (["simulate-dialysis", "--help"], False),
+}
+
+
+def parse_importtime(stderr):
+    """[(name, self_us, cumulative_us, depth)] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def start(args, cwd):
+    """One cold start: (import ms, wall ms, top-level imports by cumulative us)."""
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=cwd,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    wall = (time.perf_counter() - t0) * 1000
+    top = {name: cumulative for name, _, cumulative, depth in parse_importtime(proc.stderr) if depth == 0}
+    return sum(top.values()) / 1000, wall, top
+
+
+def measure(args, cwd, runs):
+    start(args, cwd)  # warm the bytecode cache and the page cache
+    samples = [start(args, cwd) for _ in range(runs)]
+    imports = [s[0] for s in samples]
+    median_run = sorted(samples, key=lambda s: s[0])[len(samples) // 2]
+    return statistics.median(imports), statistics.median(s[1] for s in samples), median_run[2]
+
+
+def scratch_dir(tmp):
+    """Fixtures the commands read from their working directory."""
+    shutil.copy(ROOT / "monitoring.log", tmp / "monitoring.log")
+    shutil.copy(ROOT / "device_heartbeats.log", tmp / "device_heartbeats.log")
+    return tmp
+
+
+def run(runs=5, budget_ms=100.0, top=5):
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = scratch_dir(Path(tmp))
+        base_imports, base_wall, _ = measure(["-c", "pass"], cwd, runs)
+        results = {"python": sys.version.split()[0], "budget_ms": budget_ms, "runs": runs,
+                   "baseline": {"import_ms": round(base_imports, 1), "wall_ms": round(base_wall, 1)},
+                   "commands": {}}
+        for name, (args, budgeted) in COMMANDS.items():
+            imports, wall, modules = measure([str(CLI), *args], cwd, runs)
+            import_ms = imports - base_imports
+            heaviest = sorted(modules.items(), key=lambda kv: -kv[1])[:top]
+            results["commands"][name] = {
+                "import_ms": round(import_ms, 1),
+                "wall_ms": round(wall, 1),
+                "budgeted": budgeted,
+                "ok": import_ms <= budget_ms or not budgeted,
+                "heaviest": {module: round(us / 1000, 1) for module, us in heaviest},
+            }
+    results["ok"] = all(c["ok"] for c in results["commands"].values())
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start import budget for l2lab.py commands")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=100.0)
+    parser.add_argument("--json", help="Also write the results here")
+    args = parser.parse_args()
+
+    results = run(args.runs, args.budget_ms)
+    print(f"baseline (python -c pass): imports {results['baseline']['import_ms']} ms, "
+          f"wall {results['baseline']['wall_ms']} ms")
+    for name, r in results["commands"].items():
+        status = ("ok" if r["ok"] else "OVER BUDGET") if r["budgeted"] else "-"
+        heaviest = ", ".join(f"{m} {ms}" for m, ms in r["heaviest"].items())
+        print(f"{name:<26} imports {r['import_ms']:>6} ms  wall {r['wall_ms']:>6} ms  {status:<11} {heaviest}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+    sys.exit(0 if results["ok"] else 1)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+bench_dedup.py
+A retransmit storm through hl7_dedup.DedupCache, per store.
+
+--messages distinct control IDs from --senders interface engines, each
+sent --copies times (the copies arrive within a few seconds, interleaved
+with other traffic). Reports checks/s, duplicates caught and the cache's
+peak memory, which must stay flat however long the storm runs.
+
+Usage:
+  python benchmarks/bench_dedup.py --messages 1000000 --copies 3 --size 100000
+"""
+
+import sys
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from hl7_dedup import DedupCache, open_store  # noqa: E402
+
+
+def storm(messages, copies, senders, seed=7):
+    """Keys in arrival order: every copy within ~1000 messages of the original."""
+    rng = random.Random(seed)
+    window = []
+    for i in range(messages):
+        key = f"LAB{i % senders}|MSG{i:09d}"
+        window.extend([key] * copies)
+        if len(window) >= 1000:
+            rng.shuffle(window)
+            yield from window[:500]
+            del window[:500]
+    rng.shuffle(window)
+    yield from window
+
+
+def run(store_spec, keys, size, clock_step=0.001):
+    now = [1_700_000_000.0]
+
+    def clock():
+        now[0] += clock_step
+        return now[0]
+
+    store = open_store(store_spec, size, ttl=3600.0)
+    cache = DedupCache(size, ttl=3600.0, store=store, clock=clock)
+    t0 = time.perf_counter()
+    for key in keys:
+        cache.check(key)
+    cache.close()
+    elapsed = time.perf_counter() - t0
+    return {"checks_per_sec": round(len(keys) / elapsed, 1), **cache.stats()}
+
+
+def memory_profile(keys, size, points=4):
+    """Traced bytes of a memory-only cache at `points` steps through the storm
+    (separate pass: tracing is slow), plus the overall peak."""
+    tracemalloc.start()
+    cache = DedupCache(size, ttl=3600.0)
+    step = max(1, len(keys) // points)
+    current = []
+    for i, key in enumerate(keys, 1):
+        cache.check(key)
+        if i % step == 0:
+            current.append(tracemalloc.get_traced_memory()[0])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return current, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dedup cache retransmit-storm benchmark")
+    parser.add_argument("--messages", type=int, default=300_000)
+    parser.add_argument("--copies", type=int, default=3)
+    parser.add_argument("--senders", type=int, default=50)
+    parser.add_argument("--size", type=int, default=100_000)
+    args = parser.parse_args()
+
+    keys = list(storm(args.messages, args.copies, args.senders))
+    print(f"{len(keys)} arrivals, {args.messages} distinct, cache size {args.size}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for spec in (None, f"sqlite:{tmp}/dedup.db", f"bloom:{tmp}/dedup.bloom"):
+            result = run(spec, keys, args.size)
+            print(f"{spec.split(':')[0] if spec else 'memory':<8} {result['checks_per_sec']:>12} checks/s  "
+                  f"duplicates {result['duplicates']}  evicted {result['evicted']}  size {result['size']}")
+    current, peak = memory_profile(keys, args.size)
+    print("cache memory through the storm: " + ", ".join(f"{n / 2**20:.1f}" for n in current)
+          + f" MiB (peak {peak / 2**20:.1f} MiB)")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+bench_heartbeat_codec.py
+Lines/sec per heartbeat_codec backend on a scaled-up device_heartbeats.log.
+
+The heartbeats bundled in cloud-monitoring/device_heartbeats.log (the JSON
+part of each simulator line) are repeated with rotating device IDs and
+timestamps until there are --lines lines. For every installed backend:
+
+  parse   cloud-monitoring.parse_line: loads() + parse_ts()
+  decode  typed decode() into Heartbeat
+  encode  dumps() of the entry dicts (device_simulator, load_generator)
+
+"baseline" is the previous json.loads + datetime.strptime / json.dumps.
+
+Usage:
+  python benchmarks/bench_heartbeat_codec.py --lines 1000000
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from datetime import datetime, timedelta
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "cloud-monitoring"))
+
+from heartbeat_codec import CODECS, TS_FORMAT, get_codec, parse_ts  # noqa: E402
+
+SAMPLE_LOG = ROOT / "cloud-monitoring" / "device_heartbeats.log"
+
+
+def make_lines(count, devices=2000):
+    samples = []
+    for raw in SAMPLE_LOG.read_text(encoding="utf-8").splitlines():
+        start = raw.find("{")
+        if start >= 0:
+            samples.append(json.loads(raw[start:]))
+    start_ts = datetime(2025, 8, 14, 19, 0, 0)
+    lines = []
+    for i in range(count):
+        entry = dict(samples[i % len(samples)])
+        entry["device_id"] = f"dev-{i % devices}"
+        # ~devices heartbeats per second, like a busy ward
+        entry["ts"] = (start_ts + timedelta(seconds=i // devices)).strftime(TS_FORMAT)
+        lines.append(json.dumps(entry))
+    return lines
+
+
+def best_of(repeat, fn):
+    best = None
+    for _ in range(repeat):
+        parse_ts.cache_clear()
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_baseline(lines, entries, repeat):
+    def parse():
+        for line in lines:
+            obj = json.loads(line)
+            datetime.strptime(obj["ts"], TS_FORMAT)
+
+    def encode():
+        for entry in entries:
+            json.dumps(entry)
+
+    return {"parse": best_of(repeat, parse), "encode": best_of(repeat, encode)}
+
+
+def bench_codec(codec, lines, entries, repeat):
+    loads, decode, dumps = codec.loads, codec.decode, codec.dumps
+
+    def parse():
+        for line in lines:
+            obj = loads(line)
+            parse_ts(obj["ts"])
+
+    def typed():
+        for line in lines:
+            decode(line)
+
+    def encode():
+        for entry in entries:
+            dumps(entry)
+
+    return {"parse": best_of(repeat, parse), "decode": best_of(repeat, typed),
+            "encode": best_of(repeat, encode)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Heartbeat codec backend benchmark")
+    parser.add_argument("--lines", type=int, default=500000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    lines = make_lines(args.lines)
+    entries = [json.loads(line) for line in lines]
+    timings = {"baseline": bench_baseline(lines, entries, args.repeat)}
+    for name in CODECS:
+        timings[name] = bench_codec(get_codec(name), lines, entries, args.repeat)
+
+    base_parse = timings["baseline"]["parse"]
+    results = {"lines": args.lines, "backends": {}}
+    for name, t in timings.items():
+        row = {f"{op}_lines_per_sec": round(args.lines / secs, 1) for op, secs in t.items()}
+        row["parse_speedup"] = round(base_parse / t["parse"], 2)
+        results["backends"][name] = row
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+bench_mllp_decoder.py
+Micro-benchmark: mllp.FrameDecoder vs the old decode-and-concatenate
+approach, over the same byte stream cut into recv()-sized chunks, for a
+range of message sizes (OBX-heavy ORUs easily run to tens of KB).
+
+Usage:
+  python benchmarks/bench_mllp_decoder.py --sizes 160,2000,20000 --chunk 4096
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mllp import FrameDecoder, frame  # noqa: E402
+
+HEADER = (
+    "MSH|^~\\&|Device1|Ward1|EMR|Main|202508031010||ORU^R01|MSG00001|P|2.3\r"
+    "PID|||123456||DOE^JOHN\r"
+    "OBR|1|||DIA001^DIALYSIS^L\r"
+)
+OBX = "OBX|1|NM|BP^Blood Pressure||145|mmHg\r"
+
+
+def make_message(size):
+    """An ORU of roughly `size` bytes (header plus repeated OBX segments)."""
+    return HEADER + OBX * max(1, (size - len(HEADER)) // len(OBX))
+
+
+def string_decoder(chunks):
+    """Old style: decode every read to str and grow a str buffer."""
+    count = 0
+    buf = ""
+    for chunk in chunks:
+        buf += chunk.decode("utf-8")
+        while "\x1c\r" in buf:
+            msg, buf = buf.split("\x1c\r", 1)
+            msg = msg[msg.index("\x0b") + 1:]
+            count += 1
+    return count
+
+
+def frame_decoder(chunks):
+    count = 0
+    decoder = FrameDecoder()
+    for chunk in chunks:
+        decoder.feed(chunk)
+        for _ in decoder:
+            count += 1
+    return count
+
+
+def run(size, chunk_size, volume=8_000_000):
+    message = make_message(size)
+    messages = max(1, volume // len(message))
+    stream = frame(message) * messages
+    chunks = [stream[i:i + chunk_size] for i in range(0, len(stream), chunk_size)]
+    results = {}
+    for name, fn in (("str-concat", string_decoder), ("FrameDecoder", frame_decoder)):
+        t0 = time.perf_counter()
+        count = fn(chunks)
+        elapsed = time.perf_counter() - t0
+        assert count == messages, f"{name} decoded {count}/{messages} frames"
+        results[name] = round(messages / elapsed, 1)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MLLP frame decoder micro-benchmark")
+    parser.add_argument("--sizes", default="160,2000,20000,200000",
+                        help="Comma-separated approximate message sizes in bytes")
+    parser.add_argument("--chunk", type=int, default=4096, help="Bytes per simulated recv()")
+    args = parser.parse_args()
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        results = run(size, args.chunk)
+        print(f"~{size} B/msg: " + "  ".join(f"{name}={rate} frames/s" for name, rate in results.items())
+              + f"  speedup={results['FrameDecoder'] / results['str-concat']:.2f}x")
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+bench_mllp_server.py
+Load benchmark for mllp_server: N persistent client connections each send
+M framed ORU messages and wait for a 1-byte reply before sending the next.
+Reports messages/sec and round-trip latency percentiles.
+
+Usage:
+  python benchmarks/bench_mllp_server.py --connections 1000 --messages 50
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mllp import frame  # noqa: E402
+from mllp_server import MLLPServer  # noqa: E402
+
+MESSAGE = (
+    "MSH|^~\\&|Device1|Ward1|EMR|Main|202508031010||ORU^R01|MSG00001|P|2.3\r"
+    "PID|||123456||DOE^JOHN\r"
+    "OBR|1|||DIA001^DIALYSIS^L\r"
+    "OBX|1|NM|BP^Blood Pressure||145|mmHg"
+).encode("utf-8")
+FRAME = frame(MESSAGE)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+async def _client(host, port, count, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(count):
+            t0 = time.perf_counter()
+            writer.write(FRAME)
+            await writer.drain()
+            await reader.readexactly(1)
+            latencies.append(time.perf_counter() - t0)
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def run(connections, messages, host="127.0.0.1"):
+    server = await MLLPServer(lambda message, peer: b"\x06", host, 0).start()
+    latencies = []
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_client(host, server.port, messages, latencies)
+                           for _ in range(connections)))
+    elapsed = time.perf_counter() - t0
+    await server.close()
+
+    latencies.sort()
+    total = len(latencies)
+    return {
+        "connections": connections,
+        "messages": total,
+        "elapsed_s": round(elapsed, 3),
+        "msgs_per_sec": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MLLP server load benchmark")
+    parser.add_argument("--connections", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=50, help="Messages per connection")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.connections, args.messages))
+    print(f"connections={result['connections']} messages={result['messages']} "
+          f"elapsed={result['elapsed_s']}s")
+    print(f"throughput={result['msgs_per_sec']} msg/s  "
+          f"p50={result['p50_ms']}ms  p99={result['p99_ms']}ms")
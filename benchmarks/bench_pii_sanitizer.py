@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+bench_pii_sanitizer.py
+Cost of PII masking relative to the per-message work it is added to.
+
+  hl7   hl7_listener.handle_message (parse, print, append to the log) with and
+        without sanitize_hl7, on MLLP frames as the listener receives them
+  json  device_simulator's sanitize + json.dumps + log write, for the
+        previous copy-and-check sanitize_log_entry and the precompiled one
+
+Reports messages/sec and the added cost in percent; exits non-zero if the
+HL7 overhead is above --max-overhead (default 5%).
+
+Usage:
+  python benchmarks/bench_pii_sanitizer.py --messages 20000
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+from pathlib import Path
+
+import hl7
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "cloud-monitoring"))
+sys.path.insert(0, str(ROOT))
+
+import hl7_listener  # noqa: E402
+from pii_sanitizer import sanitize_hl7, sanitize_log_entry  # noqa: E402
+
+
+def make_message(i):
+    return (f"MSH|^~\\&|Device{i % 50}|Ward1|EMR|Main|202508031010||ORU^R01|MSG{i:08d}|P|2.3\r"
+            f"PID|1||{100000 + i}^^^HOSP^MR||DOE^JOHN^Q||19600101|M|||12 Main St^^Hometown^NY^10001||(555)555-1212\r"
+            f"NK1|1|DOE^JANE|SPO|12 Main St^^Hometown^NY^10001|(555)555-3434\r"
+            f"OBR|1|||DIA001^DIALYSIS^L\r"
+            f"OBX|1|NM|KtV^Dialysis Adequacy||{1.0 + (i % 10) / 10:.2f}||1.2-2.0||||F\r"
+            f"OBX|2|ST|BP^Blood Pressure||{90 + i % 60}/{60 + i % 30}|mmHg|||||F").encode("utf-8")
+
+
+def legacy_sanitize_log_entry(entry):
+    """The previous device_simulator implementation."""
+    sanitized = entry.copy()
+    for k in ("patient_name", "full_name", "name"):
+        if k in sanitized and sanitized[k]:
+            sanitized[k] = "REDACTED"
+    if "patient_id" in sanitized and sanitized["patient_id"]:
+        pid = str(sanitized["patient_id"])
+        sanitized["patient_id"] = f"{pid[:3]}****" if len(pid) >= 3 else "****"
+    if "mrn" in sanitized and sanitized["mrn"]:
+        mrn = str(sanitized["mrn"])
+        sanitized["mrn"] = f"{mrn[:3]}****"
+    if "ssn" in sanitized and sanitized["ssn"]:
+        sanitized["ssn"] = "***-**-****"
+    if "phone" in sanitized and sanitized["phone"]:
+        sanitized["phone"] = "REDACTED"
+    if "email" in sanitized and sanitized["email"]:
+        sanitized["email"] = "redacted@example.com"
+    for k in ("address", "dob", "date_of_birth"):
+        if k in sanitized and sanitized[k]:
+            sanitized[k] = "REDACTED"
+    return sanitized
+
+
+def make_entry(rng, i, pii):
+    entry = {"ts": "2025-08-12T08:15:28Z", "device_id": f"dev-{i % 500}", "status": "OK",
+             "battery": rng.randint(30, 100), "metric": round(rng.uniform(0.0, 200.0), 2)}
+    if pii:
+        entry.update({"patient_name": "John Doe", "patient_id": str(rng.randint(100000, 999999)),
+                      "dob": "1980-01-01", "phone": "(555) 555-1212", "email": "john.doe@example.com",
+                      "address": "123 Main St, Hometown, NY"})
+    return entry
+
+
+def best_of(repeat, fn):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_hl7(count, repeat):
+    frames = [make_message(i) for i in range(count)]
+
+    def unmasked():
+        # handle_message as it was before masking: decode, parse, print, save
+        for frame in frames:
+            data = frame.decode("utf-8")
+            message = hl7.parse(data)
+            print("Parsed HL7 message:")
+            for segment in message:
+                if segment[0] == "PID":
+                    print(f"PID - Patient ID: {segment[3]}, Patient Name: {segment[5]}")
+            print(data)
+            with open("logs/received_message.hl7", "a") as f:
+                f.write(data + "\n\n")
+
+    def masked():
+        for frame in frames:
+            hl7_listener.handle_message(frame)
+
+    def sanitize_only():
+        for frame in frames:
+            sanitize_hl7(bytearray(frame))
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()) as out:
+        os.chdir(tmp)
+        try:
+            os.mkdir("logs")
+            base = best_of(repeat, unmasked)
+            out.seek(0), out.truncate()
+            full = best_of(repeat, masked)
+            out.seek(0), out.truncate()
+        finally:
+            os.chdir(cwd)
+    alone = best_of(repeat, sanitize_only)
+    return {
+        "messages": count,
+        "unmasked_msgs_per_sec": round(count / base, 1),
+        "masked_msgs_per_sec": round(count / full, 1),
+        "sanitize_hl7_us_per_msg": round(alone / count * 1e6, 2),
+        "overhead_pct": round((alone / base) * 100, 2),
+        "end_to_end_delta_pct": round((full - base) / base * 100, 2),
+    }
+
+
+def bench_json(count, repeat):
+    rng = random.Random(7)
+    entries = [make_entry(rng, i, pii=i % 10 == 0) for i in range(count)]
+    results = {"entries": count}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "device_heartbeats.log"
+        for name, sanitize in (("legacy", legacy_sanitize_log_entry), ("precompiled", sanitize_log_entry)):
+            def run():
+                with path.open("w", encoding="utf-8") as fh:
+                    fh.write("\n".join(json.dumps(sanitize(e)) for e in entries))
+            results[f"{name}_lines_per_sec"] = round(count / best_of(repeat, run), 1)
+            results[f"{name}_sanitize_us_per_entry"] = round(
+                best_of(repeat, lambda: [sanitize(e) for e in entries]) / count * 1e6, 3)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PII sanitizer overhead benchmark")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-overhead", type=float, default=5.0, help="Allowed HL7 overhead in percent")
+    args = parser.parse_args()
+
+    results = {"hl7": bench_hl7(args.messages, args.repeat), "json": bench_json(args.messages * 5, args.repeat)}
+    print(json.dumps(results, indent=2))
+    if results["hl7"]["overhead_pct"] > args.max_overhead:
+        print(f"FAIL: sanitize_hl7 adds {results['hl7']['overhead_pct']}% (> {args.max_overhead}%)")
+        sys.exit(1)
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+bench_replay.py
+Replay the bundled sample data, scaled up, through each hot path.
+
+The fixtures are tiny (sample-hl7-messages/*.hl7 and
+cloud-monitoring/demo_errors.hl7: 5 messages; device_heartbeats.log and
+monitoring.log: ~80 lines), so they are used as templates and replayed
+--messages / --lines times:
+  HL7          each template with a unique MSH-10 (annotation lines of the
+               example files dropped)
+  heartbeats   template entries spread over --devices device IDs with a
+               rising ts; every 10th carries the device simulator's
+               --demo-pii fields
+  monitoring   template lines with a rising timestamp
+Input is generated in blocks of --block items, outside the timed region,
+so memory stays flat for any scale.
+
+Timed paths (items/s, plus MB/s where bytes are the unit):
+  mllp_frame          mllp.frame() per message
+  mllp_decode         FrameDecoder over the framed stream, fed in 64 KiB reads
+  hl7_parse           parse_message() + MSH-9 / MSH-10 lookups
+  analyze_hl7         HL7AlertHandler.analyze_hl7() on parsed messages
+  scan_last_seen      monitor's full re-read of a heartbeat log file
+  sanitize_log_entry  pii_sanitizer on decoded heartbeat entries
+  alert_scanner       alert_scanner.parse_alert_line() per monitoring line
+
+Results go to stdout (or --json) as JSON. Each path is checked against a
+floor in THRESHOLDS and, with --baseline, against a previous run's JSON:
+a path slower than baseline * (1 - --max-regression) fails. Any failure
+exits 1.
+
+Usage:
+  python benchmarks/bench_replay.py                          # 1M messages, 1M lines
+  python benchmarks/bench_replay.py --messages 100000 --lines 200000 --json replay.json
+  python benchmarks/bench_replay.py --baseline replay.json --max-regression 0.15
+  python benchmarks/bench_replay.py --only hl7_parse analyze_hl7
+"""
+
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import importlib.util
+from pathlib import Path
+from itertools import islice
+
+ROOT = Path(__file__).resolve().parent.parent
+MONITORING = ROOT / "cloud-monitoring"
+sys.path.insert(0, str(MONITORING))
+sys.path.insert(0, str(ROOT))
+
+from mllp import FrameDecoder, frame  # noqa: E402
+from hl7_reader import iter_messages  # noqa: E402
+from hl7_message import parse_message  # noqa: E402
+from pii_sanitizer import sanitize_log_entry  # noqa: E402
+from alert_scanner import parse_alert_line  # noqa: E402
+from alert_handler import HL7AlertHandler  # noqa: E402
+
+HL7_FIXTURES = sorted((ROOT / "sample-hl7-messages").glob("*.hl7")) + [MONITORING / "demo_errors.hl7"]
+HEARTBEAT_FIXTURE = ROOT / "device_heartbeats.log"
+MONITORING_FIXTURE = ROOT / "monitoring.log"
+EPOCH = 1_754_990_000  # 2025-08-12, when the fixtures were captured
+DEMO_PII = {"patient_name": "John Doe", "patient_id": "482913", "dob": "1980-01-01",
+            "phone": "(555) 555-1212", "email": "john.doe@example.com"}
+
+# minimum items/s per path; about a third of a 1-CPU container, so only a real regression trips them
+THRESHOLDS = {
+    "mllp_frame": 500_000,
+    "mllp_decode": 150_000,
+    "hl7_parse": 15_000,
+    "analyze_hl7": 15_000,
+    "scan_last_seen": 100_000,
+    "sanitize_log_entry": 300_000,
+    "alert_scanner": 350_000,
+}
+
+
+# -------------------- scaled fixtures --------------------
+def hl7_templates():
+    """(prefix, control ID, suffix) per fixture message, split around MSH-10."""
+    templates = []
+    for path in HL7_FIXTURES:
+        for raw in iter_messages(path, blank_lines=False):
+            segments = [s for s in raw.split(b"\r") if s.strip() and not s.startswith(b"#")]
+            fields = segments[0].split(b"|")
+            prefix = b"|".join(fields[:9]) + b"|"
+            suffix = b"|".join([b""] + fields[10:]) + b"\r" + b"\r".join(segments[1:])
+            templates.append((prefix, fields[9], suffix))
+    return templates
+
+
+def scaled_messages(count):
+    templates = hl7_templates()
+    n = len(templates)
+    for i in range(count):
+        prefix, control_id, suffix = templates[i % n]
+        yield b"%s%s-%d%s" % (prefix, control_id, i, suffix)
+
+
+def scaled_heartbeats(count, devices):
+    templates = [json.loads(line) for line in HEARTBEAT_FIXTURE.read_text(encoding="utf-8").splitlines()
+                 if line.strip()]
+    n = len(templates)
+    for i in range(count):
+        entry = dict(templates[i % n])
+        entry["ts"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(EPOCH + i // devices))
+        entry["device_id"] = f"dev-{i % devices}"
+        if i % 10 == 0:
+            entry.update(DEMO_PII)
+        yield json.dumps(entry)
+
+
+def scaled_monitoring_lines(count):
+    templates = [line.split("] ", 1)[1] for line in
+                 MONITORING_FIXTURE.read_text(encoding="utf-8").splitlines() if "] " in line]
+    n = len(templates)
+    for i in range(count):
+        yield f"[{time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(EPOCH + i))}] {templates[i % n]}"
+
+
+def blocks(items, size):
+    items = iter(items)
+    while True:
+        block = list(islice(items, size))
+        if not block:
+            return
+        yield block
+
+
+# -------------------- timed paths --------------------
+def time_blocks(source, prepare, work):
+    """Sum of work(prepare(block)) times over all blocks -> (items, bytes, seconds)."""
+    items = nbytes = 0
+    elapsed = 0.0
+    for block in source:
+        data = prepare(block)
+        t0 = time.perf_counter()
+        nbytes += work(data) or 0
+        elapsed += time.perf_counter() - t0
+        items += len(block)
+    return items, nbytes, elapsed
+
+
+def bench_mllp_frame(messages, block):
+    def work(data):
+        return sum(len(frame(m)) for m in data)
+    return time_blocks(blocks(scaled_messages(messages), block), lambda b: b, work)
+
+
+def bench_mllp_decode(messages, block):
+    def prepare(data):
+        stream = b"".join(map(frame, data))
+        return [stream[i:i + 65536] for i in range(0, len(stream), 65536)]
+
+    decoder = FrameDecoder()
+
+    def work(chunks):
+        nbytes = 0
+        for chunk in chunks:
+            decoder.feed(chunk)
+            for view in decoder:
+                nbytes += len(view)
+        return nbytes
+    return time_blocks(blocks(scaled_messages(messages), block), prepare, work)
+
+
+def bench_hl7_parse(messages, block):
+    def work(data):
+        for raw in data:
+            message = parse_message(raw)
+            message.message_type
+            message.control_id
+        return sum(map(len, data))
+    return time_blocks(blocks(scaled_messages(messages), block), lambda b: b, work)
+
+
+def bench_analyze_hl7(messages, block):
+    handler = HL7AlertHandler()
+
+    def work(parsed):
+        for message in parsed:
+            handler.analyze_hl7(message)
+    return time_blocks(blocks(scaled_messages(messages), block),
+                       lambda b: [parse_message(raw) for raw in b], work)
+
+
+def load_monitor():
+    """cloud-monitoring/cloud-monitoring.py as a module (its file name has a hyphen)."""
+    spec = importlib.util.spec_from_file_location("monitor", MONITORING / "cloud-monitoring.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bench_scan_last_seen(lines, block, devices, tmp):
+    monitor = load_monitor()
+    monitor.LOG_FILE = Path(tmp) / "device_heartbeats.log"
+    with monitor.LOG_FILE.open("w", encoding="utf-8") as out:
+        for chunk in blocks(scaled_heartbeats(lines, devices), block):
+            out.write("\n".join(chunk) + "\n")
+    t0 = time.perf_counter()
+    last = monitor.scan_last_seen()
+    elapsed = time.perf_counter() - t0
+    assert len(last) == min(lines, devices), f"scan_last_seen found {len(last)} devices"
+    return lines, monitor.LOG_FILE.stat().st_size, elapsed
+
+
+def bench_sanitize_log_entry(lines, block, devices):
+    def work(entries):
+        for entry in entries:
+            sanitize_log_entry(entry)
+    return time_blocks(blocks(scaled_heartbeats(lines, devices), block),
+                       lambda b: [json.loads(line) for line in b], work)
+
+
+def bench_alert_scanner(lines, block):
+    def work(data):
+        for line in data:
+            parse_alert_line(line)
+        return sum(map(len, data))
+    return time_blocks(blocks(scaled_monitoring_lines(lines), block), lambda b: b, work)
+
+
+def run(messages, lines, block=10_000, devices=2000, only=None):
+    benches = {
+        "mllp_frame": lambda tmp: bench_mllp_frame(messages, block),
+        "mllp_decode": lambda tmp: bench_mllp_decode(messages, block),
+        "hl7_parse": lambda tmp: bench_hl7_parse(messages, block),
+        "analyze_hl7": lambda tmp: bench_analyze_hl7(messages, block),
+        "scan_last_seen": lambda tmp: bench_scan_last_seen(lines, block, devices, tmp),
+        "sanitize_log_entry": lambda tmp: bench_sanitize_log_entry(lines, block, devices),
+        "alert_scanner": lambda tmp: bench_alert_scanner(lines, block),
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, bench in benches.items():
+            if only and name not in only:
+                continue
+            items, nbytes, elapsed = bench(tmp)
+            results[name] = {"items": items, "seconds": round(elapsed, 3),
+                             "per_sec": round(items / elapsed, 1)}
+            if nbytes:
+                results[name]["mb_per_sec"] = round(nbytes / elapsed / 2**20, 1)
+    return results
+
+
+def check(results, thresholds, baseline=None, max_regression=0.2):
+    """Fill in each result's threshold and ok flag; returns the failure messages."""
+    failures = []
+    for name, result in results.items():
+        floor = thresholds.get(name, 0)
+        if baseline and name in baseline:
+            floor = max(floor, baseline[name]["per_sec"] * (1 - max_regression))
+        result["threshold_per_sec"] = round(floor, 1)
+        result["ok"] = result["per_sec"] >= floor
+        if not result["ok"]:
+            failures.append(f"{name}: {result['per_sec']}/s < {result['threshold_per_sec']}/s")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaled replay of the sample data through each hot path")
+    parser.add_argument("--messages", type=int, default=1_000_000, help="HL7 messages per HL7 path")
+    parser.add_argument("--lines", type=int, default=1_000_000, help="Log lines per log path")
+    parser.add_argument("--block", type=int, default=10_000, help="Items generated per timed block")
+    parser.add_argument("--devices", type=int, default=2000, help="Distinct device IDs in the heartbeat log")
+    parser.add_argument("--only", nargs="+", choices=sorted(THRESHOLDS), help="Run only these paths")
+    parser.add_argument("--baseline", help="Previous --json output; fail on a drop of more than --max-regression")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    parser.add_argument("--json", help="Also write the results here")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    results = run(args.messages, args.lines, args.block, args.devices, args.only)
+    baseline = json.loads(Path(args.baseline).read_text())["results"] if args.baseline else None
+    failures = check(results, THRESHOLDS, baseline, args.max_regression)
+    report = {
+        "python": sys.version.split()[0],
+        "scale": {"messages": args.messages, "lines": args.lines, "devices": args.devices},
+        "results": results,
+        "ok": not failures,
+    }
+    print(json.dumps(report, indent=2))
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
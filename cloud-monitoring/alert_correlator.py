@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+alert_correlator.py
+Alert correlation and storm suppression in front of an alert sink.
+
+When a switch or VPN tunnel drops, every device behind it goes silent at
+once and the monitor raises one missing-heartbeat alert per device. The
+correlator groups alerts by kind (missing-heartbeat, LOW_KTV, ...) and
+topology tag, trying ward, then subnet, then device type:
+
+  - alerts of a group are held for up to `group_wait` seconds
+  - once `min_group` distinct devices of a group are pending (alerts that
+    name no device count individually), one parent INCIDENT record is
+    written (state "open") with the child count, and every further alert
+    of that group only increments the incident's counters
+  - while alerts keep arriving, an "update" record is written at most
+    every `update_interval` seconds; `window` seconds after the last one
+    a final "closed" record carries the totals
+  - a group that stays below `min_group` releases its alerts one by one
+    after `group_wait`, rate-limited per (device, kind): at most one
+    every `repeat_interval` seconds, the rest counted as suppressed (and
+    reported on the next one let through, if it comes before the
+    rate-limit state of that (device, kind) expires)
+
+Topology comes from a JSON file mapping device ID -> {"ward": ...,
+"subnet": ..., "device_type": ...}. Without an entry, the subnet is
+derived from an IP in the alert (details.ip, or the peer of an HL7
+alert) and the device type from the ID prefix ("dev" for dev-17).
+
+CorrelatingSink wraps any alert_store sink (write/flush/close), so the
+monitor and the ingest pipeline use it unchanged; flush() also runs the
+timers.
+
+Usage:
+  python cloud-monitoring/alert_correlator.py jsonl:alert-store --topology device_topology.json
+  python cloud-monitoring/cloud-monitoring.py --correlate --topology device_topology.json
+"""
+
+import re
+import sys
+import json
+import time
+import argparse
+import ipaddress
+from pathlib import Path
+from datetime import datetime, UTC
+from collections import Counter
+
+GROUP_BY = ("ward", "subnet", "device_type")
+DEFAULT_WINDOW = 120.0
+DEFAULT_GROUP_WAIT = 10.0
+DEFAULT_MIN_GROUP = 3
+DEFAULT_UPDATE_INTERVAL = 60.0
+DEFAULT_REPEAT_INTERVAL = 300.0
+SAMPLE_DEVICES = 20
+TICK_INTERVAL = 1.0  # process() runs the timers at most this often
+SEVERITY_ORDER = ("LOW", "MEDIUM", "HIGH", "CRITICAL")
+
+_KIND_RE = re.compile(r"[^\s:(]+")
+_PREFIX_RE = re.compile(r"[A-Za-z]+")
+
+
+def _iso_now():
+    return datetime.now(UTC).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def alert_kind(alert):
+    """HL7 alerts carry a type; monitor alerts start their reason with it."""
+    if alert.get("type"):
+        return alert["type"]
+    m = _KIND_RE.match(alert.get("reason") or "")
+    return m.group(0) if m else "unknown"
+
+
+def alert_entity(alert):
+    return alert.get("device_id") or alert.get("peer") or "*"
+
+
+class Topology:
+    def __init__(self, devices=None):
+        self.devices = devices or {}
+
+    @classmethod
+    def load(cls, path):
+        return cls(json.loads(Path(path).read_text(encoding="utf-8")))
+
+    def tags(self, alert):
+        tags = dict(self.devices.get(alert.get("device_id"), {}))
+        if "subnet" not in tags:
+            details = alert.get("details") or {}
+            ip = details.get("ip") if isinstance(details, dict) else None
+            ip = ip or (alert.get("peer") or "").rpartition(":")[0]
+            try:
+                tags["subnet"] = str(ipaddress.ip_network(f"{ip}/24", strict=False))
+            except ValueError:
+                pass
+        if "device_type" not in tags and alert.get("device_id"):
+            m = _PREFIX_RE.match(alert["device_id"])
+            if m:
+                tags["device_type"] = m.group(0)
+        return tags
+
+
+class _Incident:
+    __slots__ = ("incident_id", "kind", "tag", "value", "children", "devices", "severity",
+                 "first_seen", "last_seen", "last_emit", "opened_at", "by_device_type")
+
+    def __init__(self, incident_id, kind, tag, value, now):
+        self.incident_id = incident_id
+        self.kind = kind
+        self.tag = tag
+        self.value = value
+        self.children = 0
+        self.devices = set()
+        self.severity = None
+        self.first_seen = self.last_seen = self.last_emit = now
+        self.opened_at = _iso_now()
+        self.by_device_type = Counter()
+
+
+class AlertCorrelator:
+    def __init__(self, topology=None, group_by=GROUP_BY, window=DEFAULT_WINDOW,
+                 group_wait=DEFAULT_GROUP_WAIT, min_group=DEFAULT_MIN_GROUP,
+                 update_interval=DEFAULT_UPDATE_INTERVAL, repeat_interval=DEFAULT_REPEAT_INTERVAL,
+                 clock=time.monotonic):
+        self.topology = topology or Topology()
+        self.group_by = group_by
+        self.window = window
+        self.group_wait = group_wait
+        self.min_group = min_group
+        self.update_interval = update_interval
+        self.repeat_interval = repeat_interval
+        self.clock = clock
+        # group key -> [first pending time, [(alert, tags)], distinct sources, sources seen]
+        self._pending = {}
+        self._incidents = {}   # group key -> _Incident
+        self._last_passed = {}  # (entity, kind) -> time of last alert let through
+        self._suppressed = Counter()  # (entity, kind) -> repeats since then
+        self._next_id = 1
+        self._last_tick = None
+        self.counts = Counter()
+
+    def _group(self, alert):
+        kind = alert_kind(alert)
+        tags = self.topology.tags(alert)
+        for tag in self.group_by:
+            if tags.get(tag):
+                return (kind, tag, tags[tag]), tags
+        return (kind, "all", "*"), tags
+
+    # -------------------- input --------------------
+    def process(self, alert):
+        """Take one alert; return the records to write downstream now."""
+        now = self.clock()
+        self.counts["in"] += 1
+        out = self.tick(now) if self._last_tick is None or now - self._last_tick >= TICK_INTERVAL else []
+        key, tags = self._group(alert)
+        incident = self._incidents.get(key)
+        if incident is not None:
+            self._absorb(incident, alert, tags, now)
+            if now - incident.last_emit >= self.update_interval:
+                incident.last_emit = now
+                out.append(self._record(incident, "update"))
+            return out
+        group = self._pending.setdefault(key, [now, [], 0, set()])
+        first, held, _, seen = group
+        held.append((alert, tags))
+        entity = alert_entity(alert)
+        if entity == "*" or entity not in seen:
+            seen.add(entity)
+            group[2] += 1
+        if group[2] >= self.min_group:
+            del self._pending[key]
+            incident = self._incidents[key] = _Incident(f"INC-{self._next_id:06d}", *key, now=first)
+            self._next_id += 1
+            for held_alert, held_tags in held:
+                self._absorb(incident, held_alert, held_tags, now)
+            incident.last_emit = now
+            self.counts["incidents"] += 1
+            out.append(self._record(incident, "open"))
+        return out
+
+    def _absorb(self, incident, alert, tags, now):
+        incident.children += 1
+        incident.last_seen = now
+        if len(incident.devices) < SAMPLE_DEVICES:
+            incident.devices.add(alert_entity(alert))
+        incident.by_device_type[tags.get("device_type", "unknown")] += 1
+        severity = alert.get("severity")
+        if severity in SEVERITY_ORDER and (incident.severity is None or
+                                           SEVERITY_ORDER.index(severity) > SEVERITY_ORDER.index(incident.severity)):
+            incident.severity = severity
+        self.counts["grouped"] += 1
+
+    # -------------------- timers --------------------
+    def tick(self, now=None):
+        """Release expired pending groups, close quiet incidents, forget expired rate limits."""
+        now = self.clock() if now is None else now
+        self._last_tick = now
+        out = []
+        for key in [k for k, group in self._pending.items() if now - group[0] >= self.group_wait]:
+            held = self._pending.pop(key)[1]
+            for alert, _ in held:
+                out.extend(self._release(alert, now))
+        for key in [k for k, inc in self._incidents.items() if now - inc.last_seen >= self.window]:
+            out.append(self._record(self._incidents.pop(key), "closed"))
+        for key in [k for k, last in self._last_passed.items() if now - last >= self.repeat_interval]:
+            del self._last_passed[key]
+            self._suppressed.pop(key, None)
+        return out
+
+    def drain(self):
+        """Everything still held, e.g. on shutdown."""
+        out = []
+        for group in self._pending.values():
+            for alert, _ in group[1]:
+                out.extend(self._release(alert, self.clock()))
+        self._pending.clear()
+        out.extend(self._record(inc, "closed") for inc in self._incidents.values())
+        self._incidents.clear()
+        return out
+
+    def _release(self, alert, now):
+        key = (alert_entity(alert), alert_kind(alert))
+        last = self._last_passed.get(key)
+        if last is not None and now - last < self.repeat_interval:
+            self._suppressed[key] += 1
+            self.counts["rate_limited"] += 1
+            return []
+        self._last_passed[key] = now
+        repeats = self._suppressed.pop(key, 0)
+        if repeats:
+            alert = dict(alert, suppressed_repeats=repeats)
+        self.counts["passed"] += 1
+        return [alert]
+
+    # -------------------- output --------------------
+    def _record(self, incident, state):
+        self.counts["written_incident_records"] += 1
+        return {
+            "alert_ts": _iso_now(),
+            "type": "INCIDENT",
+            "severity": incident.severity or "HIGH",
+            "device_id": f"{incident.tag}={incident.value}",
+            "reason": f"incident-{state}: {incident.children} x {incident.kind} on {incident.tag} {incident.value}",
+            "detected_at": incident.opened_at,
+            "details": {
+                "incident_id": incident.incident_id,
+                "state": state,
+                "kind": incident.kind,
+                "group": {incident.tag: incident.value},
+                "children": incident.children,
+                "duration_s": round(incident.last_seen - incident.first_seen, 1),
+                "devices_sample": sorted(incident.devices),
+                "by_device_type": dict(incident.by_device_type),
+            },
+        }
+
+    def stats(self):
+        return {**self.counts, "pending_groups": len(self._pending), "open_incidents": len(self._incidents)}
+
+
+class CorrelatingSink:
+    """alert_store sink wrapper: correlates before writing to `sink`."""
+
+    def __init__(self, sink, correlator=None):
+        self.sink = sink
+        self.correlator = correlator or AlertCorrelator()
+
+    def write(self, alert):
+        for record in self.correlator.process(alert):
+            self.sink.write(record)
+
+    def flush(self):
+        for record in self.correlator.tick():
+            self.sink.write(record)
+        self.sink.flush()
+
+    def close(self):
+        for record in self.correlator.drain():
+            self.sink.write(record)
+        self.sink.close()
+
+    def __iter__(self):
+        return iter(self.sink)
+
+
+def correlate_alerts(alerts, correlator):
+    """Offline replay: alerts (in order) -> records the correlator writes."""
+    for alert in alerts:
+        yield from correlator.process(alert)
+    yield from correlator.drain()
+
+
+if __name__ == "__main__":
+    from alert_store import open_sink
+
+    parser = argparse.ArgumentParser(description="Replay a stored alert stream through the correlator")
+    parser.add_argument("store", help="Alert store to read: jsonl[:dir] or sqlite[:path]")
+    parser.add_argument("--topology", help="JSON device_id -> {ward, subnet, device_type}")
+    parser.add_argument("--min-group", type=int, default=DEFAULT_MIN_GROUP)
+    parser.add_argument("--out", help="Write the correlated records here (JSON lines)")
+    args = parser.parse_args()
+
+    topology = Topology.load(args.topology) if args.topology else Topology()
+    # stored alerts carry no arrival times: a replay counts as one burst
+    correlator = AlertCorrelator(topology, min_group=args.min_group, clock=lambda: 0.0)
+    sink = open_sink(args.store)
+    out = open(args.out, "w", encoding="utf-8") if args.out else None
+    written = 0
+    try:
+        for record in correlate_alerts(sink, correlator):
+            written += 1
+            if out:
+                out.write(json.dumps(record) + "\n")
+            elif record.get("type") == "INCIDENT":
+                print(f"{record['details']['incident_id']} {record['reason']}")
+    finally:
+        sink.close()
+        if out:
+            out.close()
+    stats = correlator.stats()
+    print(f"{stats.get('in', 0)} alert(s) -> {written} record(s) "
+          f"({stats.get('incidents', 0)} incident(s), {stats.get('rate_limited', 0)} rate-limited)",
+          file=sys.stderr)
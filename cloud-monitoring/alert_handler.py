@@ -1,46 +1,54 @@
 #!/usr/bin/env python3
 """HL7 Alert Handler for Dialysis Machine Support"""
 
+import sys
 import logging
 from datetime import datetime
+from pathlib import Path
+
+from alert_rules import compile_rules
+
+# hl7_message.py / metrics.py live at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from hl7_message import Message, parse_message  # noqa: E402
+from metrics import REGISTRY  # noqa: E402
+
+ALERTS = REGISTRY.counter("hl7_alerts_total", "Alerts raised by HL7AlertHandler", ("type", "severity"))
+
 
 class HL7AlertHandler:
-    def __init__(self):
+    def __init__(self, rules=None):
         self.alert_count = 0
+        self.rules = compile_rules(rules)
         logging.info("HL7 Alert Handler initialized")
 
     def analyze_hl7(self, message):
-        """Analyze HL7 messages from dialysis machines"""
-        alerts = []
-        
-        # 1. Check for missing/invalid MSH segment
-        if not message.startswith("MSH|^~\\&"):
-            alerts.append(self._build_alert(
-                alert_type="HL7_PROTOCOL_ERROR",
-                severity="CRITICAL",
-                rca="Missing or corrupt MSH segment - message not HL7-compliant",
-                action="1. Check dialysis machine HL7 settings\n2. Verify physical connection"
-            ))
-        
-        # 2. Check for missing treatment data
-        elif "ORU^R01" in message and "OBX|" not in message:
-            alerts.append(self._build_alert(
-                alert_type="DATA_MISSING",
-                severity="HIGH",
-                rca="No treatment data (OBX segments) found in ORU message",
-                action="1. Restart data export module\n2. Check patient monitor connections"
-            ))
-        
-        # 3. Check for abnormal dialysis metrics
-        abnormal = self._check_abnormal_values(message)
-        if abnormal:
-            alerts.append(abnormal)
-        
-        return alerts
+        """Analyze HL7 messages (str, bytes or parsed Message) from dialysis machines"""
+        if not isinstance(message, Message):
+            message = parse_message(message)
+
+        # Protocol, missing-segment and abnormal-value rules in a single pass
+        return [self._alert_for(rule, value) for rule, value in self.rules.evaluate(message)]
+
+    def analyze_batch(self, messages):
+        """Analyze many messages at once; one alert list per message, same as analyze_hl7"""
+        parsed = [m if isinstance(m, Message) else parse_message(m) for m in messages]
+        return [[self._alert_for(rule, value) for rule, value in hits]
+                for hits in self.rules.evaluate_batch(parsed)]
+
+    def _alert_for(self, rule, value=None):
+        return self._build_alert(
+            alert_type=rule["type"],
+            severity=rule["severity"],
+            rca=rule["rca"].format(value=value) if value is not None else rule["rca"],
+            action=rule["action"]
+        )
 
     def _build_alert(self, alert_type, severity, rca, action):
         """Standardize alert format"""
         self.alert_count += 1
+        ALERTS.labels(alert_type, severity).inc()
         return {
             "alert_id": f"ALERT-{datetime.now().strftime('%Y%m%d')}-{self.alert_count}",
             "type": alert_type,
@@ -50,22 +58,6 @@ class HL7AlertHandler:
             "action": action
         }
 
-    def _check_abnormal_values(self, message):
-        """Check for clinically dangerous values"""
-        try:
-            if "KtV^Dialysis Adequacy" in message:
-                ktv = float(message.split("KtV^Dialysis Adequacy||")[1].split("|")[0])
-                if ktv < 1.2:
-                    return self._build_alert(
-                        alert_type="LOW_KTV",
-                        severity="HIGH",
-                        rca=f"Insufficient dialysis dose (Kt/V={ktv:.2f} < 1.2)",
-                        action="1. Review treatment parameters\n2. Check vascular access"
-                    )
-        except (IndexError, ValueError) as e:
-            logging.warning(f"Value parsing error: {str(e)}")
-        return None
-
     def generate_support_ticket(self, alert):
         """Format for L2 support workflow"""
         return f"""
@@ -87,6 +79,38 @@ ESCALATION PATH:
 ------------------------------
 """
 
+    def generate_incident_ticket(self, incident):
+        """One L2 ticket for a correlated storm (alert_correlator INCIDENT record)"""
+        info = incident["details"]
+        devices = ", ".join(d for d in info["devices_sample"] if d != "*") or "unidentified sources"
+        if info["children"] > len(info["devices_sample"]):
+            devices += f", ... ({info['children']} alerts in total)"
+        scope = ", ".join(f"{k}={v}" for k, v in info["group"].items() if k != "all") or "all sources"
+        return f"""
+[DIALYSIS HL7 INCIDENT - {info['incident_id']} ({info['state'].upper()})]
+Severity: {incident['severity']}
+Type: {info['kind']} x {info['children']}
+Scope: {scope}
+Opened: {incident['detected_at']}
+Affected: {devices}
+
+ROOT CAUSE:
+{info['children']} correlated {info['kind']} alerts ({scope}) - check the shared
+path (switch, VLAN, VPN tunnel, interface engine) before individual devices.
+
+ESCALATION PATH:
+- L1: Verify ward/subnet connectivity (Ref: network-notes/connectivity-tests.md)
+- L2: Review HL7 config (Ref: KB-HL7-{info['kind']})
+- L3: Engage network team / clinical engineering
+------------------------------
+"""
+
+    def ticket_for(self, record):
+        """Ticket text for either a single alert or an INCIDENT record"""
+        if record.get("type") == "INCIDENT":
+            return self.generate_incident_ticket(record)
+        return self.generate_support_ticket(record)
+
 # Test function
 def test_alert_handler():
     """Run sample tests if executed directly"""
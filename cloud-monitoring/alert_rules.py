@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""Declarative clinical/protocol alert rules for HL7AlertHandler
+
+Rules are plain data (the dicts below, or the same shape loaded from JSON).
+compile_rules() turns them into lookup tables so a message is checked in one
+pass over its OBX segments: each OBX-3 identifier is looked up once and only
+the rules for that observation run, however many rules are defined.
+
+Rule kinds ("check"):
+  msh_missing      message does not start with an MSH segment
+  segment_missing  message of `message_type` has no `segment`
+  threshold        OBX `observation` value (`value` extractor) `op` `limit`
+
+evaluate_batch() does the same for N messages at once: OBX values are pulled
+into one NumPy column per (observation, extractor) and every threshold is a
+single vectorised comparison over the whole batch. NumPy is optional and
+not in requirements.txt (pip install numpy to enable it); without it
+evaluate_batch() runs evaluate() per message, with identical results.
+"""
+
+import re
+import json
+import logging
+import operator
+
+# ---- Optional NumPy (batch evaluation falls back to per-message) ----
+# Imported on first batch, not at module load: it takes ~100 ms and
+# analyze_hl7() never needs it.
+_np = False
+
+
+def _numpy():
+    global _np
+    if _np is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _np = numpy
+    return _np
+
+OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+_NUMBER_RE = re.compile(r"\s*([-+]?\d+(?:\.\d+)?)")
+
+
+def _number(text):
+    m = _NUMBER_RE.match(text)
+    if m is None:
+        raise ValueError(f"not a number: {text!r}")
+    return float(m.group(1))
+
+
+# OBX-5 -> float, or None when the component is simply absent (a lone
+# systolic BP has no diastolic). BP arrives as "120/80" or "145".
+EXTRACTORS = {
+    "numeric": _number,
+    "systolic": lambda text: _number(text.split("/", 1)[0]),
+    "diastolic": lambda text: _number(text.split("/", 1)[1]) if "/" in text else None,
+}
+
+DEFAULT_RULES = [
+    {
+        "type": "HL7_PROTOCOL_ERROR", "check": "msh_missing", "severity": "CRITICAL",
+        "rca": "Missing or corrupt MSH segment - message not HL7-compliant",
+        "action": "1. Check dialysis machine HL7 settings\n2. Verify physical connection",
+    },
+    {
+        "type": "DATA_MISSING", "check": "segment_missing",
+        "message_type": "ORU^R01", "segment": "OBX", "severity": "HIGH",
+        "rca": "No treatment data (OBX segments) found in ORU message",
+        "action": "1. Restart data export module\n2. Check patient monitor connections",
+    },
+    {
+        "type": "LOW_KTV", "check": "threshold", "observation": "KtV",
+        "value": "numeric", "op": "<", "limit": 1.2, "severity": "HIGH",
+        "rca": "Insufficient dialysis dose (Kt/V={value:.2f} < 1.2)",
+        "action": "1. Review treatment parameters\n2. Check vascular access",
+    },
+    {
+        "type": "LOW_SYSTOLIC_BP", "check": "threshold", "observation": "BP",
+        "value": "systolic", "op": "<", "limit": 90, "severity": "CRITICAL",
+        "rca": "Intradialytic hypotension (systolic={value:.0f} mmHg < 90)",
+        "action": "1. Reduce or pause ultrafiltration\n2. Notify nephrologist",
+    },
+    {
+        "type": "HIGH_SYSTOLIC_BP", "check": "threshold", "observation": "BP",
+        "value": "systolic", "op": ">", "limit": 180, "severity": "HIGH",
+        "rca": "Hypertension during treatment (systolic={value:.0f} mmHg > 180)",
+        "action": "1. Repeat measurement\n2. Notify nephrologist",
+    },
+    {
+        "type": "HIGH_DIASTOLIC_BP", "check": "threshold", "observation": "BP",
+        "value": "diastolic", "op": ">", "limit": 110, "severity": "HIGH",
+        "rca": "Hypertension during treatment (diastolic={value:.0f} mmHg > 110)",
+        "action": "1. Repeat measurement\n2. Notify nephrologist",
+    },
+]
+
+
+def message_type(header):
+    """
+    MSH-9 as "TYPE^EVENT". Falls back to MSH-8 for senders that drop an empty
+    field in front of it (the bundled dialysis simulator and demo files do).
+    """
+    for n in (9, 8):
+        components = header.components(n)
+        if len(components) >= 2:
+            return "^".join(components[:2])
+    return header.field(9)
+
+
+class CompiledRules:
+    """Rule tables built once by compile_rules(); evaluate() is one pass per message."""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.msh_rules = []
+        self.segment_rules = {}       # message type -> [(segment ID, rule)]
+        self.observation_rules = {}   # OBX-3.1 -> {extractor name: [(op, limit, rule)]}
+        for rule in self.rules:
+            check = rule["check"]
+            if check == "msh_missing":
+                self.msh_rules.append(rule)
+            elif check == "segment_missing":
+                self.segment_rules.setdefault(rule["message_type"], []).append((rule["segment"], rule))
+            elif check == "threshold":
+                if rule.get("value", "numeric") not in EXTRACTORS:
+                    raise ValueError(f"Rule {rule['type']}: unknown value extractor {rule.get('value')!r}")
+                if rule["op"] not in OPERATORS:
+                    raise ValueError(f"Rule {rule['type']}: unknown operator {rule['op']!r}")
+                by_value = self.observation_rules.setdefault(rule["observation"], {})
+                by_value.setdefault(rule.get("value", "numeric"), []).append(
+                    (OPERATORS[rule["op"]], float(rule["limit"]), rule))
+            else:
+                raise ValueError(f"Rule {rule.get('type')}: unknown check {check!r}")
+
+    def _message_hits(self, message):
+        hits = []
+        header = message.header()
+        if header is None:
+            hits.extend((rule, None) for rule in self.msh_rules)
+        elif self.segment_rules:
+            for segment, rule in self.segment_rules.get(message_type(header), ()):
+                if segment not in message:
+                    hits.append((rule, None))
+        return hits
+
+    def _observations(self, message):
+        """Yield (OBX position, observation, extractor name, value) for ruled OBX values."""
+        for pos, obx in enumerate(message.segments("OBX")):
+            observation = obx.component(3, 1)
+            by_value = self.observation_rules.get(observation)
+            if by_value is None:
+                continue
+            text = obx.field(5)
+            for name in by_value:
+                try:
+                    value = EXTRACTORS[name](text)
+                except ValueError as e:
+                    logging.warning(f"Value parsing error: {str(e)}")
+                    continue
+                if value is not None:
+                    yield pos, observation, name, value
+
+    def evaluate(self, message):
+        """
+        message: hl7_message.Message
+        Returns [(rule, value)] for every rule that fired, value None for
+        message-level rules.
+        """
+        hits = self._message_hits(message)
+        for _, observation, name, value in self._observations(message):
+            for op, limit, rule in self.observation_rules[observation][name]:
+                if op(value, limit):
+                    hits.append((rule, value))
+        return hits
+
+    def extract_columns(self, messages):
+        """
+        Columnar OBX values for a batch: {(observation, extractor): (values,
+        message index, OBX position)} as NumPy arrays.
+        """
+        np = _numpy()
+        rows = {}
+        for i, message in enumerate(messages):
+            for pos, observation, name, value in self._observations(message):
+                column = rows.get((observation, name))
+                if column is None:
+                    column = rows[(observation, name)] = ([], [], [])
+                column[0].append(value)
+                column[1].append(i)
+                column[2].append(pos)
+        return {key: (np.array(values, dtype=np.float64), np.array(index, dtype=np.int64),
+                      np.array(pos, dtype=np.int64))
+                for key, (values, index, pos) in rows.items()}
+
+    def evaluate_batch(self, messages):
+        """
+        Same result as [evaluate(m) for m in messages], with thresholds applied
+        as vectorised masks over the whole batch.
+        """
+        messages = list(messages)
+        np = _numpy()
+        if np is None:
+            return [self.evaluate(m) for m in messages]
+
+        results = [self._message_hits(m) for m in messages]
+        # rank = order evaluate() would try the check in for one OBX
+        parts = []
+        for (observation, name), (values, index, pos) in self.extract_columns(messages).items():
+            rank = 0
+            for extractor, checks in self.observation_rules[observation].items():
+                for op, limit, rule in checks:
+                    rank += 1
+                    if extractor != name:
+                        continue
+                    mask = op(values, limit)
+                    if mask.any():
+                        parts.append((index[mask], pos[mask], np.full(mask.sum(), rank),
+                                      values[mask], [rule] * int(mask.sum())))
+        if not parts:
+            return results
+
+        index = np.concatenate([p[0] for p in parts])
+        pos = np.concatenate([p[1] for p in parts])
+        rank = np.concatenate([p[2] for p in parts])
+        values = np.concatenate([p[3] for p in parts])
+        rules = [rule for p in parts for rule in p[4]]
+        for k in np.lexsort((rank, pos, index)):
+            results[index[k]].append((rules[k], float(values[k])))
+        return results
+
+
+def compile_rules(rules=None):
+    return CompiledRules(DEFAULT_RULES if rules is None else rules)
+
+
+def load_rules(path):
+    """Load a JSON list of rule dicts (same shape as DEFAULT_RULES)."""
+    with open(path, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+if __name__ == "__main__":
+    compiled = compile_rules()
+    print(f"{len(compiled.rules)} rules compiled")
+    for obs, by_value in compiled.observation_rules.items():
+        for name, checks in by_value.items():
+            for _, limit, rule in checks:
+                print(f"  OBX {obs} ({name}) {rule['op']} {limit:g} -> {rule['type']} [{rule['severity']}]")
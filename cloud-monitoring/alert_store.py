@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+alert_store.py
+Append-only alert sinks for the monitor (replaces rewriting alerts.json).
+
+  jsonl   one JSON object per line in size-rotated segment files
+          (alert-store/alerts-000001.jsonl, ...). Writes are buffered and
+          fsync'ed in groups: every `sync_every` alerts, every
+          `sync_interval` seconds, or on flush()/close(). A crash can at most
+          tear the last line: readers skip it, and the next writer cuts it
+          off before appending. The directory and first segment are created
+          by the first write, so reading (export, count) leaves no trace.
+  sqlite  a local alerts table for ad-hoc querying; inserts are batched with
+          executemany and committed on the same triggers.
+  db      the patients/alerts tables of postgres-schema.sql, in PostgreSQL
+          or a SQLite stand-in (alert_db.py): db:postgresql://... or
+          db:sqlite:path
+
+`export` rebuilds the old alerts.json format (a JSON list, indent=2) from
+either backend, streaming, so it also works for very large stores.
+
+Usage:
+  python cloud-monitoring/alert_store.py export --store jsonl:alert-store --out alerts.json
+  python cloud-monitoring/alert_store.py count --store sqlite:alerts.db
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import textwrap
+from pathlib import Path
+
+DEFAULT_JSONL_DIR = Path("alert-store")
+DEFAULT_SQLITE_DB = Path("alerts.db")
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+DEFAULT_SYNC_EVERY = 64
+DEFAULT_SYNC_INTERVAL = 1.0
+
+_SEGMENT_RE = re.compile(r"alerts-(\d{6})\.jsonl$")
+
+
+class JsonlAlertSink:
+    def __init__(self, directory=DEFAULT_JSONL_DIR, max_bytes=DEFAULT_SEGMENT_BYTES,
+                 sync_every=DEFAULT_SYNC_EVERY, sync_interval=DEFAULT_SYNC_INTERVAL):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self._fh = None
+        self._size = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        segments = self.segments()
+        self._segment_no = int(_SEGMENT_RE.search(segments[-1].name).group(1)) if segments else 1
+
+    def segments(self):
+        """Segment files in write order."""
+        if not self.directory.is_dir():
+            return []
+        return sorted(p for p in self.directory.iterdir() if _SEGMENT_RE.search(p.name))
+
+    def _open_segment(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"alerts-{self._segment_no:06d}.jsonl"
+        if path.exists():
+            # torn last line from a crash: appending to it would corrupt the next alert too
+            complete = _complete_length(path)
+            if complete < path.stat().st_size:
+                os.truncate(path, complete)
+        self._fh = path.open("ab")
+        self._size = self._fh.tell()
+
+    def write(self, alert):
+        line = (json.dumps(alert, separators=(",", ":")) + "\n").encode("utf-8")
+        if self._fh is None:
+            self._open_segment()
+        elif self._size and self._size + len(line) > self.max_bytes:
+            self._rotate()
+        self._fh.write(line)
+        self._size += len(line)
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+            self.flush()
+
+    def _rotate(self):
+        self.flush()
+        self._fh.close()
+        self._segment_no += 1
+        self._open_segment()
+
+    def flush(self):
+        """Write buffered alerts and fsync them (one fsync per group)."""
+        if self._unsynced and self._fh is not None:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if self._fh is not None:
+            self.flush()
+            self._fh.close()
+            self._fh = None
+
+    def __iter__(self):
+        if self._fh is not None:
+            self._fh.flush()
+        for path in self.segments():
+            with path.open("rb") as fh:
+                for line in fh:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue  # torn tail after a crash
+
+
+def _complete_length(path, chunk=64 * 1024):
+    """Bytes of `path` up to and including its last newline."""
+    with path.open("rb") as fh:
+        end = fh.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - chunk)
+            fh.seek(start)
+            newline = fh.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                return start + newline + 1
+            end = start
+    return 0
+
+
+class SqliteAlertSink:
+    def __init__(self, path=DEFAULT_SQLITE_DB, sync_every=DEFAULT_SYNC_EVERY,
+                 sync_interval=DEFAULT_SYNC_INTERVAL):
+        self.path = Path(path)
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        import sqlite3  # only this backend needs it; keeps jsonl monitor starts light
+        # check_same_thread off: the ingest pipeline flushes from worker threads (one at a time)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS alerts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                alert_ts TEXT,
+                device_id TEXT,
+                reason TEXT,
+                detected_at TEXT,
+                details TEXT
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_device_ts ON alerts (device_id, alert_ts)")
+        self._conn.commit()
+        self._pending = []
+        self._last_sync = time.monotonic()
+
+    def write(self, alert):
+        self._pending.append((alert.get("alert_ts"), alert.get("device_id"), alert.get("reason"),
+                              alert.get("detected_at"), json.dumps(alert.get("details", {}))))
+        if len(self._pending) >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self._conn.executemany(
+                "INSERT INTO alerts (alert_ts, device_id, reason, detected_at, details) VALUES (?, ?, ?, ?, ?)",
+                self._pending)
+            self._conn.commit()
+            self._pending.clear()
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if self._conn is not None:
+            self.flush()
+            self._conn.close()
+            self._conn = None
+
+    def __iter__(self):
+        self.flush()
+        cur = self._conn.execute(
+            "SELECT alert_ts, device_id, reason, detected_at, details FROM alerts ORDER BY id")
+        for alert_ts, device_id, reason, detected_at, details in cur:
+            yield {
+                "alert_ts": alert_ts,
+                "device_id": device_id,
+                "reason": reason,
+                "detected_at": detected_at,
+                "details": json.loads(details) if details else {},
+            }
+
+
+def open_sink(spec="jsonl", **kwargs):
+    """'jsonl[:dir]', 'sqlite[:path]' or 'db:<database url>' -> sink instance."""
+    kind, _, location = spec.partition(":")
+    if kind == "jsonl":
+        return JsonlAlertSink(location or DEFAULT_JSONL_DIR, **kwargs)
+    if kind == "sqlite":
+        return SqliteAlertSink(location or DEFAULT_SQLITE_DB, **kwargs)
+    if kind == "db":
+        from alert_db import DEFAULT_DB, AlertDatabase
+        return AlertDatabase(location or DEFAULT_DB, **kwargs)
+    raise ValueError(f"Unknown alert store {spec!r} (expected jsonl[:dir], sqlite[:path] or db:<url>)")
+
+
+def export_json(sink, out):
+    """Stream every alert to `out` in the legacy alerts.json layout."""
+    count = 0
+    out.write("[")
+    for alert in sink:
+        out.write(",\n" if count else "\n")
+        out.write(textwrap.indent(json.dumps(alert, indent=2), "  "))
+        count += 1
+    out.write("\n]" if count else "]")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append-only alert store tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    exp = sub.add_parser("export", help="Write alerts.json (legacy format) from a store")
+    exp.add_argument("--store", default="jsonl", help="jsonl[:dir] or sqlite[:path]")
+    exp.add_argument("--out", default="alerts.json", help="Output path, '-' for stdout")
+    cnt = sub.add_parser("count", help="Count alerts in a store")
+    cnt.add_argument("--store", default="jsonl", help="jsonl[:dir] or sqlite[:path]")
+    args = parser.parse_args()
+
+    sink = open_sink(args.store)
+    try:
+        if args.command == "export":
+            if args.out == "-":
+                n = export_json(sink, sys.stdout)
+                print()
+            else:
+                tmp = Path(args.out + ".tmp")
+                with tmp.open("w", encoding="utf-8") as fh:
+                    n = export_json(sink, fh)
+                os.replace(tmp, args.out)
+                print(f"Exported {n} alert(s) to {Path(args.out).resolve()}")
+        else:
+            print(sum(1 for _ in sink))
+    finally:
+        sink.close()
@@ -4,24 +4,68 @@ monitor.py
 Simple monitor that scans device_heartbeats.log and raises alerts when
 a device hasn't reported within threshold seconds.
 
+Only lines appended since the previous scan are parsed (see log_tailer.py);
+the byte offset and inode survive restarts in CHECKPOINT_FILE, and the
+last-seen table in LAST_SEEN_FILE: each scan appends only the entries of
+devices that reported, so a scan costs O(new lines) however large the
+fleet, and the file is compacted to one line per device now and then.
+The same file records which devices the watchdog has reported MISSING,
+so a restart (or every --once run) doesn't alert them again.
+--full-rescan restores the old re-read-everything behaviour.
+Staleness is tracked by a deadline heap (heartbeat_watchdog.py): the loop
+wakes for the next deadline or scan, and each device state change
+(missing / error / recovered) is alerted exactly once. --health also feeds
+every heartbeat to the rolling-window statistics in device_health.py
+(battery trend, error rate, heartbeat jitter) and alerts its anomalies.
+--correlate puts alert_correlator.py in front of the alert store, so a
+ward- or subnet-wide outage is stored as one incident instead of one
+alert per device.
+Scan duration, heartbeat lag, tracked devices per state and alerts raised
+are kept in metrics.py; --metrics-port / --metrics-interval export them.
+
 Usage:
   python monitor.py --threshold 12 --scan-interval 5
+  python monitor.py --health --health-window 15
+  python monitor.py --correlate --topology device_topology.json
+  python monitor.py --once        # one scan, e.g. from cron
+  python monitor.py --metrics-port 9102
 """
 
+import sys
 import time
 import json
 import argparse
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from log_tailer import LogTailer
+from heartbeat_codec import get_codec, parse_ts
+from alert_store import open_sink
+from heartbeat_watchdog import HeartbeatWatchdog, OK, ERROR, MISSING, RECOVERED
+
+# metrics.py lives at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from metrics import REGISTRY, add_metrics_arguments, start_exporters  # noqa: E402
+
+SCAN_SECONDS = REGISTRY.histogram("monitor_scan_seconds", "Time per monitor scan (read log, expire, flush)")
+HEARTBEAT_LAG = REGISTRY.histogram("monitor_heartbeat_lag_seconds", "Heartbeat age when the monitor saw it")
+DEVICES = REGISTRY.gauge("monitor_devices", "Devices tracked by the watchdog", ("state",))
+ALERTS = REGISTRY.counter("monitor_alerts_total", "Alerts raised by the monitor", ("kind",))
+
 LOG_FILE = Path("device_heartbeats.log")
+CHECKPOINT_FILE = Path("device_heartbeats.checkpoint.json")
+LAST_SEEN_FILE = Path("device_heartbeats.lastseen.jsonl")
+COMPACT_FACTOR = 4  # compact LAST_SEEN_FILE once it holds this many lines per device
+COMPACT_MIN_LINES = 10_000
 ALERT_LOG = Path("alerts.log")
-ALERT_JSON = Path("alerts.json")
+ALERT_SINK = None  # append-only store (alert_store.py), opened in main
+CODEC = get_codec()  # fastest installed JSON backend (heartbeat_codec.py)
 
 def parse_line(line):
     try:
-        obj = json.loads(line)
-        ts = datetime.strptime(obj["ts"], "%Y-%m-%dT%H:%M:%SZ")
+        obj = CODEC.loads(line)
+        ts = parse_ts(obj["ts"])
         return obj["device_id"], ts, obj
     except Exception:
         return None, None, None
@@ -29,20 +73,109 @@ def parse_line(line):
 def scan_last_seen():
     """
     Parse the entire log and return a dict: device_id -> last_seen_timestamp, last_entry
-    (Simple but fine for small logs. For production, we use a persisted DB or file offset.)
+    (Full re-read - fine for small logs. The monitor loop tails the log with
+    LogTailer + update_last_seen instead; this is kept for --full-rescan.)
     """
     last = {}
     if not LOG_FILE.exists():
         return last
 
     with LOG_FILE.open("r", encoding="utf-8") as fh:
-        for line in fh:
-            device_id, ts, obj = parse_line(line.strip())
-            if device_id and ts:
-                if device_id not in last or ts > last[device_id]["ts"]:
-                    last[device_id] = {"ts": ts, "entry": obj}
+        return update_last_seen(last, fh)
+
+def update_last_seen(last, lines, on_update=None):
+    """
+    Fold newly appended log lines into the last-seen table (O(new lines)).
+    on_update(device_id, ts, entry) is called for every entry that is newer
+    than what the table held.
+    """
+    for line in lines:
+        device_id, ts, obj = parse_line(line.strip())
+        if device_id and ts:
+            if device_id not in last or ts > last[device_id]["ts"]:
+                last[device_id] = {"ts": ts, "entry": obj}
+                if on_update:
+                    on_update(device_id, ts, obj)
     return last
 
+class LastSeenStore:
+    """
+    The last-seen table on disk: heartbeat entries, one per line, later
+    lines win, plus {"device_id": ..., "watchdog": "MISSING"} marks for
+    devices reported missing (a later, newer heartbeat of the device
+    clears its mark). save() appends what changed; once the file holds
+    COMPACT_FACTOR lines per device it is rewritten (atomically) with one
+    line per device and one per missing device.
+    """
+
+    def __init__(self, path=LAST_SEEN_FILE):
+        self.path = Path(path)
+        self.lines = 0
+        self.missing = set()  # device IDs currently MISSING
+
+    def load(self):
+        last = {}
+        self.missing = set()
+        if self.path.exists():
+            with self.path.open("rb") as fh:
+                lines = fh.read().splitlines()
+            self.lines = len(lines)
+            for line in lines:
+                # entries are stored as logged: same parser
+                device_id, ts, obj = parse_line(line)
+                if device_id and ts:
+                    if device_id not in last or ts > last[device_id]["ts"]:
+                        last[device_id] = {"ts": ts, "entry": obj}
+                        self.missing.discard(device_id)
+                    continue
+                try:
+                    mark = CODEC.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(mark, dict) and mark.get("watchdog") == MISSING:
+                    self.missing.add(mark.get("device_id"))
+        return last
+
+    def save(self, last, changed, went_missing=()):
+        """`changed`: entries updated since the last save; `went_missing`: device IDs reported MISSING since."""
+        self.missing.difference_update(entry["device_id"] for entry in changed)
+        self.missing.update(went_missing)
+        if self.lines + len(changed) + len(went_missing) > max(COMPACT_FACTOR * len(last), COMPACT_MIN_LINES):
+            self.compact(last)
+            return
+        with self.path.open("ab") as fh:
+            fh.write(b"".join(CODEC.dumps(entry).encode("utf-8") + b"\n" for entry in changed))
+            fh.write(b"".join(_missing_mark(device_id) for device_id in went_missing))
+        self.lines += len(changed) + len(went_missing)
+
+    def compact(self, last):
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with tmp.open("wb") as fh:
+            fh.write(b"".join(CODEC.dumps(info["entry"]).encode("utf-8") + b"\n" for info in last.values()))
+            fh.write(b"".join(_missing_mark(device_id) for device_id in self.missing))
+        tmp.replace(self.path)
+        self.lines = len(last) + len(self.missing)
+
+
+def _missing_mark(device_id):
+    return CODEC.dumps({"device_id": device_id, "watchdog": MISSING}).encode("utf-8") + b"\n"
+
+
+def load_last_seen(tailer, store):
+    """Last-seen table from the store (or a checkpoint written before it existed)."""
+    last = store.load()
+    legacy = tailer.state.pop("last_seen", None)
+    if legacy:
+        update_last_seen(last, (CODEC.dumps(entry) for entry in legacy.values()))
+        store.compact(last)
+        tailer.save_checkpoint()
+    return last
+
+def save_last_seen(tailer, store, last, changed, went_missing=()):
+    # entries first: after a crash in between, the re-read lines are simply newer-or-equal
+    store.save(last, changed, went_missing)
+    tailer.save_checkpoint()
+
 def write_alert(device_id, when, reason, details=None):
     alert = {
         "alert_ts": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
@@ -54,36 +187,116 @@ def write_alert(device_id, when, reason, details=None):
     # append human-readable log
     with ALERT_LOG.open("a", encoding="utf-8") as fh:
         fh.write(f"{alert['alert_ts']} ALERT {device_id} {reason} {json.dumps(alert['details'])}\n")
-    # update JSON file (overwrite for simplicity)
-    alerts = []
-    if ALERT_JSON.exists():
-        try:
-            alerts = json.loads(ALERT_JSON.read_text(encoding="utf-8"))
-        except Exception:
-            alerts = []
-    alerts.append(alert)
-    ALERT_JSON.write_text(json.dumps(alerts, indent=2), encoding="utf-8")
+    # append to the alert store (alerts.json is produced by `alert_store.py export`)
+    global ALERT_SINK
+    if ALERT_SINK is None:
+        ALERT_SINK = open_sink()
+    ALERT_SINK.write(alert)
+    ALERTS.labels(reason.split(" ", 1)[0].rstrip(":")).inc()
     print(f"[monitor] ALERT -> {device_id} {reason}")
 
+def alert_transition(transition, now):
+    device_id, _, new_state, dev = transition
+    if new_state == MISSING:
+        delta = (now - dev.last_seen).total_seconds()
+        write_alert(device_id, dev.last_seen, f"missing-heartbeat (last seen {int(delta)}s ago)", details=dev.entry)
+    elif new_state == ERROR:
+        write_alert(device_id, dev.last_seen, "device-reported-error", details=dev.entry)
+    elif new_state == RECOVERED:
+        write_alert(device_id, dev.last_seen, "heartbeat-recovered", details=dev.entry)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--threshold", type=int, default=12, help="Missing-heartbeat threshold in seconds")
     parser.add_argument("--scan-interval", type=int, default=5, help="How often monitor checks the log (seconds)")
+    parser.add_argument("--full-rescan", action="store_true", help="Re-read the whole log every scan (no checkpoint)")
+    parser.add_argument("--alert-store", default="jsonl", help="Alert sink: jsonl[:dir], sqlite[:path] or db:<url>")
+    parser.add_argument("--health", action="store_true", help="Alert on battery/error-rate/jitter anomalies")
+    parser.add_argument("--health-window", type=int, default=15, help="Error-rate window in minutes")
+    parser.add_argument("--correlate", action="store_true",
+                        help="Group simultaneous alerts into incidents by ward/subnet/device type")
+    parser.add_argument("--topology", help="JSON device_id -> {ward, subnet, device_type} (with --correlate)")
+    parser.add_argument("--once", action="store_true", help="Scan once and exit (cron / one-shot checks)")
+    add_metrics_arguments(parser)
     args = parser.parse_args()
+    start_exporters(args)
+    ALERT_SINK = open_sink(args.alert_store)
+    # optional features are imported only when enabled, to keep start-up short
+    if args.correlate:
+        from alert_correlator import AlertCorrelator, CorrelatingSink, Topology
+        topology = Topology.load(args.topology) if args.topology else Topology()
+        ALERT_SINK = CorrelatingSink(ALERT_SINK, AlertCorrelator(topology))
 
     print(f"Monitor started: threshold={args.threshold}s scan_interval={args.scan_interval}s")
+    tailer = None if args.full_rescan else LogTailer(LOG_FILE, CHECKPOINT_FILE)
+    store = LastSeenStore() if tailer else None
+    last_seen = load_last_seen(tailer, store) if tailer else {}
+    watchdog = HeartbeatWatchdog(args.threshold)
+    for device_id, info in last_seen.items():
+        watchdog.heartbeat(device_id, info["ts"], info["entry"], alert=False)
+    if store:
+        for device_id in store.missing:
+            watchdog.mark_missing(device_id)  # already alerted before this start
+    for state in (OK, ERROR, MISSING, RECOVERED):
+        # list(): the exporter thread counts while the loop updates the table
+        DEVICES.set_function(lambda state=state: sum(1 for dev in list(watchdog.devices.values())
+                                                     if dev.state == state), state)
+
+    health = None
+    if args.health:
+        from device_health import DeviceHealth
+        health = DeviceHealth(window_minutes=args.health_window)
+
+    def on_heartbeat(device_id, ts, entry):
+        HEARTBEAT_LAG.observe(max(0.0, (scan_now - ts).total_seconds()))
+        transition = watchdog.heartbeat(device_id, ts, entry)
+        if transition:
+            alert_transition(transition, datetime.utcnow())
+        if health is not None:
+            for anomaly in health.observe(device_id, ts, entry):
+                write_alert(device_id, ts, f"{anomaly['type'].lower().replace('_', '-')}: {anomaly['reason']}",
+                            details=health.stats(device_id))
+
+    changed = {}  # device -> entry updated in this scan, for the last-seen store
+
+    def on_update(device_id, ts, entry):
+        changed[device_id] = entry
+        on_heartbeat(device_id, ts, entry)
+
     try:
         while True:
-            last_seen = scan_last_seen()
+            scan_started = time.perf_counter()
+            scan_now = datetime.utcnow()  # heartbeat lag is measured against the scan start
+            changed.clear()
+            new_lines = None
+            if tailer:
+                new_lines = tailer.poll()
+                if new_lines:
+                    update_last_seen(last_seen, new_lines, on_update=on_update)
+            else:
+                for device_id, info in scan_last_seen().items():
+                    on_heartbeat(device_id, info["ts"], info["entry"])
             now = datetime.utcnow()
-            # For demo: assume known small set of devices - pick from last_seen keys
-            for device_id, info in last_seen.items():
-                delta = (now - info["ts"]).total_seconds()
-                if delta > args.threshold:
-                    # missing heartbeat — alert
-                    write_alert(device_id, info["ts"], f"missing-heartbeat (last seen {int(delta)}s ago)", details=info["entry"])
-                elif info["entry"].get("status") == "ERROR":
-                    write_alert(device_id, info["ts"], "device-reported-error", details=info["entry"])
-            time.sleep(args.scan_interval)
+            went_missing = []
+            for transition in watchdog.expire(now):
+                alert_transition(transition, now)
+                went_missing.append(transition[0])
+            ALERT_SINK.flush()  # one fsync for everything alerted this tick
+            if tailer and (new_lines or went_missing):
+                save_last_seen(tailer, store, last_seen, list(changed.values()), went_missing)
+            SCAN_SECONDS.observe(time.perf_counter() - scan_started)
+            if args.once:
+                break
+
+            # sleep until the next scan, or sooner if a device deadline falls due
+            wait = args.scan_interval
+            deadline = watchdog.next_deadline()
+            if deadline is not None:
+                wait = min(wait, max(0.05, (deadline - now).total_seconds()))
+            time.sleep(wait)
     except KeyboardInterrupt:
         print("\nMonitor stopped by user.")
+    finally:
+        if tailer:
+            tailer.close()
+        ALERT_SINK.close()
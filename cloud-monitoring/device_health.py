@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+device_health.py
+Incremental per-device health statistics over the heartbeat stream.
+
+Each heartbeat updates, in O(1) and fixed memory per device:
+
+  battery_ewma        exponentially weighted battery level
+  battery_trend       battery slope in percent per hour: least-squares fit
+                      over the readings, exponentially down-weighted with
+                      age (time constant TREND_SECONDS), kept as 5 sums;
+                      reported once the readings span TREND_MIN_STD seconds
+                      (weighted std of their times), so a few noisy
+                      readings a minute apart don't count as a trend
+  error_rate          share of ERROR heartbeats over the last WINDOW_MINUTES
+                      (ring of per-minute buckets with running sums)
+  interarrival_p50/95/99
+                      seconds between heartbeats, from a log-bucket sketch
+                      (relative error ~SKETCH_GAMMA/2, halved every
+                      SKETCH_DECAY_AT samples so it follows recent
+                      behaviour)
+  interarrival_jitter interarrival_p95 / interarrival_p50
+
+Anomaly rules are plain data in the alert_rules.py style: a metric, an
+operator, a limit and the samples needed before the rule may fire. A rule
+fires once when its condition becomes true and re-arms when it clears, so
+a draining battery raises one alert rather than one per heartbeat.
+
+Nothing is rescanned: state is only what the rolling windows hold, about
+1 KB per device (50k devices -> a few tens of MB).
+
+Usage:
+  python cloud-monitoring/device_health.py device_heartbeats.log --top 10
+"""
+
+import sys
+import json
+import math
+import array
+import argparse
+import operator
+from bisect import bisect_left
+from datetime import datetime
+from itertools import accumulate
+
+WINDOW_MINUTES = 15
+EWMA_ALPHA = 0.2
+TREND_SECONDS = 3600
+TREND_MIN_STD = 300
+SKETCH_MIN = 0.1       # seconds; smaller gaps land in bucket 0
+SKETCH_GAMMA = 1.15    # bucket i covers [MIN*g^(i-1), MIN*g^i)
+SKETCH_BUCKETS = 100   # up to ~MIN*g^99 = 1.1 days
+SKETCH_DECAY_AT = 2048
+
+OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+DEFAULT_RULES = [
+    {"type": "BATTERY_LOW", "metric": "battery_ewma", "op": "<", "limit": 20,
+     "min_samples": 3, "severity": "HIGH",
+     "reason": "battery averaging {value:.1f}% (< {limit}%)"},
+    {"type": "BATTERY_DRAIN", "metric": "battery_trend", "op": "<", "limit": -10,
+     "min_samples": 5, "severity": "MEDIUM",
+     "reason": "battery falling {value:.1f}%/h (< {limit}%/h)"},
+    {"type": "ERROR_RATE_HIGH", "metric": "error_rate", "op": ">", "limit": 0.2,
+     "min_samples": 10, "severity": "HIGH",
+     "reason": "{value:.0%} of heartbeats are ERROR over the window (> {limit:.0%})"},
+    {"type": "HEARTBEAT_JITTER", "metric": "interarrival_jitter", "op": ">", "limit": 3.0,
+     "min_samples": 20, "severity": "MEDIUM",
+     "reason": "heartbeat interval p95 is {value:.1f}x p50 (> {limit}x)"},
+]
+
+# which sample count gates each metric's rules
+_SAMPLES = {
+    "battery_ewma": "battery_samples",
+    "battery_trend": "battery_samples",
+    "error_rate": "window_total",
+    "interarrival_p50": "interarrival_samples",
+    "interarrival_p95": "interarrival_samples",
+    "interarrival_p99": "interarrival_samples",
+    "interarrival_jitter": "interarrival_samples",
+}
+_LOG_GAMMA = math.log(SKETCH_GAMMA)
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _seconds(ts):
+    # naive UTC datetimes (cloud-monitoring.parse_line) or epoch seconds
+    return ts if isinstance(ts, (int, float)) else (ts - _EPOCH).total_seconds()
+
+
+class DeviceStats:
+    __slots__ = ("last_ts", "battery_ewma", "battery_samples", "battery_ts", "fit",
+                 "minute", "totals", "errors", "window_total", "window_errors",
+                 "sketch", "sketch_total", "interarrival_samples", "active")
+
+    def __init__(self, window):
+        self.last_ts = None
+        self.battery_ewma = None
+        self.battery_samples = 0
+        self.battery_ts = None
+        self.fit = None  # [sum w, sum w*t, sum w*b, sum w*t*t, sum w*t*b], t relative to battery_ts
+        self.minute = None
+        self.totals = array.array("H", bytes(2 * window))
+        self.errors = array.array("H", bytes(2 * window))
+        self.window_total = 0
+        self.window_errors = 0
+        self.sketch = None  # allocated on the second heartbeat
+        self.sketch_total = 0
+        self.interarrival_samples = 0
+        self.active = 0  # bitmask of rules currently firing
+
+
+class DeviceHealth:
+    def __init__(self, rules=None, window_minutes=WINDOW_MINUTES, alpha=EWMA_ALPHA):
+        self.rules = rules if rules is not None else DEFAULT_RULES
+        for rule in self.rules:
+            if rule["metric"] not in _SAMPLES:
+                raise ValueError(f"rule {rule['type']}: unknown metric {rule['metric']!r}")
+            if rule["op"] not in OPERATORS:
+                raise ValueError(f"rule {rule['type']}: unknown operator {rule['op']!r}")
+        # (mask, rule, metric, compare, samples attribute, min samples)
+        self._checks = [(1 << bit, rule, rule["metric"], OPERATORS[rule["op"]],
+                         _SAMPLES[rule["metric"]], rule.get("min_samples", 1))
+                        for bit, rule in enumerate(self.rules)]
+        self.window = window_minutes
+        self.alpha = alpha
+        self.devices = {}
+
+    def __len__(self):
+        return len(self.devices)
+
+    # -------------------- updates --------------------
+    def observe(self, device_id, ts, entry):
+        """
+        Fold one heartbeat in. Returns a list of anomalies that started
+        with it: dicts with type, severity, device_id, metric, value, reason.
+        """
+        now = _seconds(ts)
+        dev = self.devices.get(device_id)
+        if dev is None:
+            dev = self.devices[device_id] = DeviceStats(self.window)
+        elif dev.last_ts is not None and now <= dev.last_ts:
+            return []  # older or duplicate line, as in HeartbeatWatchdog
+        if dev.last_ts is not None:
+            self._interarrival(dev, now - dev.last_ts)
+        dev.last_ts = now
+
+        battery = entry.get("battery") if entry else None
+        if isinstance(battery, (int, float)):
+            self._battery(dev, now, float(battery))
+        self._error_window(dev, now, bool(entry) and entry.get("status") == "ERROR")
+        return self._evaluate(device_id, dev)
+
+    def _battery(self, dev, now, battery):
+        dev.battery_samples += 1
+        if dev.battery_ewma is None:
+            dev.battery_ewma = battery
+            dev.battery_ts = now
+            dev.fit = [1.0, 0.0, battery, 0.0, 0.0]
+            return
+        dev.battery_ewma += self.alpha * (battery - dev.battery_ewma)
+        # age the fit and move its time origin to `now` (the new point sits at t=0)
+        d = now - dev.battery_ts
+        decay = math.exp(-d / TREND_SECONDS)
+        w, t, b, tt, tb = (x * decay for x in dev.fit)
+        tt += d * (d * w - 2 * t)
+        tb -= d * b
+        t -= d * w
+        dev.fit = [w + 1, t, b + battery, tt, tb]
+        dev.battery_ts = now
+
+    @staticmethod
+    def _trend(dev):
+        if dev.fit is None:
+            return None
+        w, t, b, tt, tb = dev.fit
+        spread = w * tt - t * t
+        if spread < (TREND_MIN_STD * w) ** 2:
+            return None  # readings too close together in time
+        return (w * tb - t * b) / spread * 3600
+
+    def _error_window(self, dev, now, is_error):
+        minute = int(now // 60)
+        n = self.window
+        if dev.minute is None:
+            dev.minute = minute
+        elif minute > dev.minute:
+            # clear the buckets of the minutes that went by (at most n)
+            for m in range(dev.minute + 1, min(minute, dev.minute + n) + 1):
+                slot = m % n
+                dev.window_total -= dev.totals[slot]
+                dev.window_errors -= dev.errors[slot]
+                dev.totals[slot] = dev.errors[slot] = 0
+            dev.minute = minute
+        slot = minute % n
+        if dev.totals[slot] < 0xFFFF:
+            dev.totals[slot] += 1
+            dev.window_total += 1
+            if is_error:
+                dev.errors[slot] += 1
+                dev.window_errors += 1
+
+    def _interarrival(self, dev, gap):
+        if dev.sketch is None:
+            dev.sketch = array.array("H", bytes(2 * SKETCH_BUCKETS))
+        i = 0 if gap <= SKETCH_MIN else min(SKETCH_BUCKETS - 1, 1 + int(math.log(gap / SKETCH_MIN) / _LOG_GAMMA))
+        dev.sketch[i] += 1
+        dev.sketch_total += 1
+        dev.interarrival_samples += 1
+        if dev.sketch_total >= SKETCH_DECAY_AT:
+            sketch = dev.sketch
+            for j in range(SKETCH_BUCKETS):
+                sketch[j] >>= 1
+            dev.sketch_total = sum(sketch)
+
+    # -------------------- metrics --------------------
+    @staticmethod
+    def _quantiles(dev, *qs):
+        if dev.sketch is None or dev.sketch_total == 0:
+            return [None] * len(qs)
+        cumulative = list(accumulate(dev.sketch))
+        out = []
+        for q in qs:
+            # first bucket whose cumulative count reaches the rank; report its
+            # geometric midpoint (bucket 0 reports SKETCH_MIN)
+            i = bisect_left(cumulative, max(1, q * dev.sketch_total))
+            out.append(SKETCH_MIN if i == 0 else SKETCH_MIN * SKETCH_GAMMA ** (i - 0.5))
+        return out
+
+    def metric(self, dev, name):
+        if name == "battery_ewma":
+            return dev.battery_ewma
+        if name == "battery_trend":
+            return self._trend(dev)
+        if name == "error_rate":
+            return dev.window_errors / dev.window_total if dev.window_total else None
+        if name == "interarrival_jitter":
+            p50, p95 = self._quantiles(dev, 0.50, 0.95)
+            return p95 / p50 if p50 else None
+        q = {"interarrival_p50": 0.50, "interarrival_p95": 0.95, "interarrival_p99": 0.99}[name]
+        return self._quantiles(dev, q)[0]
+
+    def _evaluate(self, device_id, dev):
+        anomalies = []
+        for mask, rule, metric, compare, samples, min_samples in self._checks:
+            value = self.metric(dev, metric) if getattr(dev, samples) >= min_samples else None
+            firing = value is not None and compare(value, rule["limit"])
+            if firing and not dev.active & mask:
+                dev.active |= mask
+                anomalies.append({
+                    "type": rule["type"],
+                    "severity": rule.get("severity", "MEDIUM"),
+                    "device_id": device_id,
+                    "metric": metric,
+                    "value": round(value, 3),
+                    "reason": rule.get("reason", "{value}").format(value=value, limit=rule["limit"]),
+                })
+            elif not firing and dev.active & mask:
+                dev.active &= ~mask
+        return anomalies
+
+    def stats(self, device_id):
+        """Current metrics of one device (None values: not enough data yet)."""
+        dev = self.devices.get(device_id)
+        if dev is None:
+            return None
+        p50, p95, p99 = self._quantiles(dev, 0.50, 0.95, 0.99)
+        out = {
+            "battery_ewma": dev.battery_ewma,
+            "battery_trend": self.metric(dev, "battery_trend"),
+            "error_rate": self.metric(dev, "error_rate"),
+            "window_samples": dev.window_total,
+            "interarrival_p50": p50,
+            "interarrival_p95": p95,
+            "interarrival_p99": p99,
+            "active": [r["type"] for bit, r in enumerate(self.rules) if dev.active & (1 << bit)],
+        }
+        return {k: round(v, 3) if isinstance(v, float) else v for k, v in out.items()}
+
+
+if __name__ == "__main__":
+    from heartbeat_codec import CodecError, get_codec, parse_ts
+
+    parser = argparse.ArgumentParser(description="Replay a heartbeat log through the health statistics engine")
+    parser.add_argument("log", help="device_heartbeats.log style JSONL")
+    parser.add_argument("--window", type=int, default=WINDOW_MINUTES, help="Error-rate window in minutes")
+    parser.add_argument("--top", type=int, default=10, help="Show the devices with the highest error rate")
+    parser.add_argument("--quiet", action="store_true", help="Don't print each anomaly")
+    args = parser.parse_args()
+
+    codec = get_codec()
+    health = DeviceHealth(window_minutes=args.window)
+    lines = fired = 0
+    with open(args.log, "rb") as fh:
+        for line in fh:
+            try:
+                entry = codec.loads(line)
+                ts = parse_ts(entry["ts"])
+                device_id = entry["device_id"]
+            except (CodecError, ValueError, TypeError, KeyError):
+                continue
+            lines += 1
+            for anomaly in health.observe(device_id, ts, entry):
+                fired += 1
+                if not args.quiet:
+                    print(f"[health] {entry['ts']} {anomaly['severity']} {anomaly['type']} "
+                          f"{device_id}: {anomaly['reason']}")
+    print(f"{lines} heartbeat(s), {len(health)} device(s), {fired} anomaly(ies)")
+    worst = sorted(health.devices, key=lambda d: -(health.metric(health.devices[d], "error_rate") or 0))
+    for device_id in worst[:args.top]:
+        sys.stdout.write(f"  {device_id}: {json.dumps(health.stats(device_id))}\n")
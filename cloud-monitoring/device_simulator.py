@@ -4,68 +4,48 @@ Device Heartbeat Simulator — HIPAA/GDPR-safe
 - Writes sanitized heartbeat/error events to device_heartbeats.log
 - Sends NON-PII metrics to CloudWatch (if boto3 & creds present)
 - Demo PII fields can be added with --demo-pii but will be masked in logs
+  (pii_sanitizer.sanitize_log_entry, shared with hl7_listener)
+- Log lines and metrics are batched (heartbeat_writer.py): the log stays
+  open and is flushed by size/time, metrics go out in multi-datum
+  put_metric_data calls
 
 Usage examples:
   python cloud-monitoring/device_simulator.py
   python cloud-monitoring/device_simulator.py --devices 5 --interval 3 --drop-rate 0.2 --demo-pii
+  python cloud-monitoring/device_simulator.py --devices 2000 --interval 1 --quiet --cloudwatch-stub
 """
 
 import time
-import json
 import random
 import argparse
 from datetime import datetime, UTC
 
+from heartbeat_writer import BufferedLogWriter, MetricBatcher, StubCloudWatchClient
+from heartbeat_codec import get_codec
+from pii_sanitizer import sanitize_log_entry
+
 LOG_FILE = "device_heartbeats.log"
+CODEC = get_codec()  # orjson/msgspec when installed, else stdlib json
+METRIC_NAMESPACE = "IoTDeviceMetrics"
 
 # ---- Optional CloudWatch (won't fail if boto3 not installed) ----
-CW_ENABLED = False
-try:
-    import boto3
-    cloudwatch = boto3.client("cloudwatch")
-    CW_ENABLED = True
-except Exception:
-    cloudwatch = None
-    CW_ENABLED = False
-
-
-# -------------------- Compliance Helpers --------------------
-def sanitize_log_entry(entry: dict) -> dict:
-    """
-    Remove or mask sensitive info to meet HIPAA/GDPR requirements.
-    Masks common PII/PHI fields if present; safe to call on any entry.
-    """
-    sanitized = entry.copy()
-
-    # Names
-    for k in ("patient_name", "full_name", "name"):
-        if k in sanitized and sanitized[k]:
-            sanitized[k] = "REDACTED"
-
-    # Identifiers (MRN, patient_id, SSN, phone, email)
-    if "patient_id" in sanitized and sanitized["patient_id"]:
-        pid = str(sanitized["patient_id"])
-        sanitized["patient_id"] = f"{pid[:3]}****" if len(pid) >= 3 else "****"
+# boto3 is imported and the client created on first use, not at import:
+# both are slow, and --cloudwatch-stub runs never need them.
+_cloudwatch = None
 
-    if "mrn" in sanitized and sanitized["mrn"]:
-        mrn = str(sanitized["mrn"])
-        sanitized["mrn"] = f"{mrn[:3]}****"
 
-    if "ssn" in sanitized and sanitized["ssn"]:
-        sanitized["ssn"] = "***-**-****"
+def cloudwatch_client():
+    """The boto3 CloudWatch client, or None without boto3 / credentials."""
+    global _cloudwatch
+    if _cloudwatch is None:
+        try:
+            import boto3
+            _cloudwatch = boto3.client("cloudwatch")
+        except Exception:
+            _cloudwatch = False
+    return _cloudwatch or None
 
-    if "phone" in sanitized and sanitized["phone"]:
-        sanitized["phone"] = "REDACTED"
-
-    if "email" in sanitized and sanitized["email"]:
-        sanitized["email"] = "redacted@example.com"
-
-    # Addresses / DOB
-    for k in ("address", "dob", "date_of_birth"):
-        if k in sanitized and sanitized[k]:
-            sanitized[k] = "REDACTED"
-
-    return sanitized
+metric_batcher = None  # set up by simulate(); put_metric_safe() queues into it
 
 
 def iso_now() -> str:
@@ -75,10 +55,10 @@ def iso_now() -> str:
 
 def put_metric_safe(metric_name: str, value: float, device_id: str, extra_dim: dict | None = None):
     """
-    Send NON-PII metrics to CloudWatch. Ignores if CloudWatch is unavailable.
+    Queue a NON-PII metric for CloudWatch. Ignores if CloudWatch is unavailable.
     Dimensions are restricted to non-identifying technical fields.
     """
-    if not CW_ENABLED:
+    if metric_batcher is None:
         return
     dims = [{"Name": "DeviceID", "Value": device_id}]
     if extra_dim:
@@ -87,30 +67,32 @@ def put_metric_safe(metric_name: str, value: float, device_id: str, extra_dim: d
             if k.lower() in {"errortype", "status"}:
                 dims.append({"Name": k, "Value": str(v)})
 
-    try:
-        cloudwatch.put_metric_data(
-            Namespace="IoTDeviceMetrics",
-            MetricData=[{
-                "MetricName": metric_name,
-                "Dimensions": dims,
-                "Timestamp": datetime.now(UTC),
-                "Value": float(value),
-                "Unit": "Count" if metric_name == "ErrorCount" else "None",
-            }]
-        )
-    except Exception:
-        # Keep simulator resilient; never crash on metrics
-        pass
+    metric_batcher.add({
+        "MetricName": metric_name,
+        "Dimensions": dims,
+        "Timestamp": datetime.now(UTC),
+        "Value": float(value),
+        "Unit": "Count" if metric_name == "ErrorCount" else "None",
+    })
 
 
 # -------------------- Simulator Core --------------------
-def simulate(devices, interval, drop_rate, demo_pii=False):
+def simulate(devices, interval, drop_rate, demo_pii=False, quiet=False, metrics_client=None,
+             flush_lines=500, flush_interval=1.0):
     """
     devices: list of device IDs (ints)
     interval: seconds between heartbeats per device
     drop_rate: probability (0..1) to skip or error a heartbeat
     demo_pii: include fake PII fields (will be masked in logs)
+    quiet: don't echo every written line
+    metrics_client: CloudWatch-compatible client (default: boto3 client if available)
+    flush_lines / flush_interval: log and metric batch triggers
     """
+    global metric_batcher
+    client = metrics_client if metrics_client is not None else cloudwatch_client()
+    metric_batcher = MetricBatcher(client, METRIC_NAMESPACE, max_delay=flush_interval) if client else None
+    writer = BufferedLogWriter(LOG_FILE, max_lines=flush_lines, max_delay=flush_interval)
+
     print(f"Starting simulator: devices={len(devices)} interval={interval}s drop_rate={drop_rate} demo_pii={demo_pii}")
     try:
         while True:
@@ -158,17 +140,25 @@ def simulate(devices, interval, drop_rate, demo_pii=False):
                 if entry:
                     # Sanitize before writing anywhere
                     sanitized = sanitize_log_entry(entry)
-                    line = json.dumps(sanitized)
-                    with open(LOG_FILE, "a", encoding="utf-8") as fh:
-                        fh.write(line + "\n")
-                    print(f"[sim] wrote (sanitized): {line}")
+                    line = CODEC.dumps(sanitized)
+                    writer.write(line)
+                    if not quiet:
+                        print(f"[sim] wrote (sanitized): {line}")
 
                 # small sleep between device heartbeats so timestamps vary
                 time.sleep(interval / max(1, len(devices)))
+            # time-based flush even when no device wrote this cycle
+            writer.maybe_flush()
+            if metric_batcher:
+                metric_batcher.maybe_flush()
             # brief pause after each cycle through all devices
             time.sleep(0.2)
     except KeyboardInterrupt:
         print("\nSimulator stopped by user.")
+    finally:
+        writer.close()
+        if metric_batcher:
+            metric_batcher.close()
 
 
 # -------------------- CLI --------------------
@@ -178,8 +168,15 @@ if __name__ == "__main__":
     parser.add_argument("--interval", type=float, default=5.0, help="Heartbeat interval (seconds)")
     parser.add_argument("--drop-rate", type=float, default=0.0, help="Probability to drop/error heartbeat (0..1)")
     parser.add_argument("--demo-pii", action="store_true", help="Include fake PII fields to demonstrate masking")
+    parser.add_argument("--quiet", action="store_true", help="Don't print every written heartbeat")
+    parser.add_argument("--cloudwatch-stub", action="store_true",
+                        help="Record metric batches locally instead of calling CloudWatch")
+    parser.add_argument("--flush-lines", type=int, default=500, help="Flush log/metrics after this many entries")
+    parser.add_argument("--flush-interval", type=float, default=1.0, help="...or after this many seconds")
     args = parser.parse_args()
 
     devices = list(range(1, args.devices + 1))
-    simulate(devices, args.interval, args.drop_rate, demo_pii=args.demo_pii)
+    simulate(devices, args.interval, args.drop_rate, demo_pii=args.demo_pii, quiet=args.quiet,
+             metrics_client=StubCloudWatchClient(verbose=True) if args.cloudwatch_stub else None,
+             flush_lines=args.flush_lines, flush_interval=args.flush_interval)
 
@@ -1,15 +1,30 @@
 #!/usr/bin/env python3
 """Dialysis Machine HL7 Simulator with Enhanced Alerting"""
 
+import sys
 import random
 import time
 import logging
 import argparse
+from itertools import islice
+from pathlib import Path
 from datetime import datetime
-from alert_handler import HL7AlertHandler
 
-# Initialize alert system
-alert_handler = HL7AlertHandler()
+# hl7_reader.py lives at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from hl7_reader import iter_messages  # noqa: E402
+
+_alert_handler = None
+
+
+def get_alert_handler():
+    """The shared HL7AlertHandler, created (and its rules compiled) on first use"""
+    global _alert_handler
+    if _alert_handler is None:
+        from alert_handler import HL7AlertHandler
+        _alert_handler = HL7AlertHandler()
+    return _alert_handler
 
 def generate_hl7_oru(patient_id):
     """Generate HL7 messages for dialysis patients"""
@@ -20,23 +35,42 @@ OBR|1|||1234^Dialysis Treatment
 OBX|1|NM|KtV^Dialysis Adequacy||{random.uniform(1.0, 2.0):.2f}||1.2-2.0||||F
 OBX|2|ST|BP^Blood Pressure||{random.randint(90,140)}/{random.randint(60,90)}||||||F"""
 
+BATCH_SIZE = 5000
+
 def read_hl7_file(file_path):
-    """Read pre-recorded HL7 messages from file"""
-    try:
-        with open(file_path, 'r') as f:
-            return [msg.strip() for msg in f.read().split('\n\n') if msg.strip()]
-    except FileNotFoundError:
+    """Stream pre-recorded HL7 messages (str, \\r between segments) from file"""
+    if not Path(file_path).is_file():
         logging.error(f"File not found: {file_path}")
-        return []
+        return
+    for message in iter_messages(file_path):
+        yield message.decode('utf-8', 'replace')
 
-def simulate_from_file(file_path):
+def _batch_alerts(messages):
+    while True:
+        chunk = list(islice(messages, BATCH_SIZE))
+        if not chunk:
+            return
+        for alerts in get_alert_handler().analyze_batch(chunk):
+            yield from alerts
+
+def simulate_from_file(file_path, batch=False, correlate=False):
     """Process messages from file instead of generating"""
     messages = read_hl7_file(file_path)
-    if not messages:
+    alert_handler = get_alert_handler()
+
+    if batch:
+        # Replay mode: evaluate BATCH_SIZE messages per vectorised batch, no pacing
+        alerts = _batch_alerts(messages)
+        if correlate:
+            from alert_correlator import AlertCorrelator, correlate_alerts
+            # one ticket per alert storm instead of one per alert
+            alerts = correlate_alerts(alerts, AlertCorrelator())
+        for alert in alerts:
+            print(alert_handler.ticket_for(alert))
         return
-    
+
     for msg in messages:
-        print(f"\nProcessing message:\n{msg}")
+        print(f"\nProcessing message:\n{msg.replace(chr(13), chr(10))}")
         alerts = alert_handler.analyze_hl7(msg)
         for alert in alerts:
             print(alert_handler.generate_support_ticket(alert))
@@ -44,6 +78,7 @@ def simulate_from_file(file_path):
 
 def simulate_dialysis_messages():
     """Main simulation loop with enhanced alerts"""
+    alert_handler = get_alert_handler()
     while True:
         message = generate_hl7_oru(f"DIAL{random.randint(100,999)}")
         print(f"\nGenerated message:\n{message}")
@@ -68,9 +103,14 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
     parser.add_argument('--input-file', help='Path to HL7 file for testing')
+    parser.add_argument('--batch', action='store_true',
+                        help=f'Evaluate the input file in batches of {BATCH_SIZE} messages, no delay '
+                             '(vectorised if NumPy is installed, else one at a time)')
+    parser.add_argument('--correlate', action='store_true',
+                        help='With --batch: group repeated alert types into incident tickets')
     args = parser.parse_args()
 
     if args.input_file:
-        simulate_from_file(args.input_file)
+        simulate_from_file(args.input_file, batch=args.batch, correlate=args.correlate)
     else:
         simulate_dialysis_messages()
\ No newline at end of file
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+heartbeat_codec.py
+Shared JSON codec for device heartbeat lines (device_heartbeats.log).
+
+Backends, fastest first; the first one that imports is the default:
+  msgspec  typed decoding straight into the Heartbeat struct
+  orjson   dicts, compact output
+  json     stdlib fallback, always available
+
+Every codec offers:
+  dumps(entry)  dict (or Heartbeat) -> one log line (str)
+  loads(line)   str/bytes -> dict, as json.loads
+  decode(line)  str/bytes -> Heartbeat; raises CodecError when the line is
+                not JSON or lacks ts / device_id / status
+All errors are CodecError (a ValueError), whichever backend is in use.
+
+parse_ts() replaces datetime.strptime for the fixed "YYYY-MM-DDTHH:MM:SSZ"
+format: it slices the string and is cached, since a busy log repeats the
+same second thousands of times.
+
+Usage:
+  python cloud-monitoring/heartbeat_codec.py                 # list backends
+  python cloud-monitoring/heartbeat_codec.py device_heartbeats.log --codec json
+"""
+
+import sys
+import json
+import argparse
+from datetime import datetime
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+TS_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+REQUIRED_FIELDS = ("ts", "device_id", "status")
+
+
+class CodecError(ValueError):
+    pass
+
+
+# -------------------- schema --------------------
+if msgspec is not None:
+    class Heartbeat(msgspec.Struct, omit_defaults=True):
+        ts: str
+        device_id: str
+        status: str
+        battery: int | None = None
+        metric: float | None = None
+        reason: str | None = None
+
+    def as_dict(heartbeat):
+        return msgspec.structs.asdict(heartbeat)
+else:
+    # same shape as the Struct; a plain slots class rather than a dataclass,
+    # which would pull in inspect (~15 ms) on every CLI start
+    class Heartbeat:
+        __slots__ = ("ts", "device_id", "status", "battery", "metric", "reason")
+        __annotations__ = {"ts": str, "device_id": str, "status": str,
+                           "battery": int | None, "metric": float | None, "reason": str | None}
+
+        def __init__(self, ts, device_id, status, battery=None, metric=None, reason=None):
+            self.ts = ts
+            self.device_id = device_id
+            self.status = status
+            self.battery = battery
+            self.metric = metric
+            self.reason = reason
+
+        def __repr__(self):
+            return "Heartbeat(" + ", ".join(f"{k}={getattr(self, k)!r}" for k in self.__slots__) + ")"
+
+        def __eq__(self, other):
+            if not isinstance(other, Heartbeat):
+                return NotImplemented
+            return all(getattr(self, k) == getattr(other, k) for k in self.__slots__)
+
+    def as_dict(heartbeat):
+        return {name: getattr(heartbeat, name) for name in FIELDS}
+
+FIELDS = tuple(Heartbeat.__annotations__)
+
+
+def heartbeat_from_dict(obj):
+    """Heartbeat from a decoded dict; unknown keys are ignored like msgspec does."""
+    if not isinstance(obj, dict):
+        raise CodecError("heartbeat is not a JSON object")
+    for name in REQUIRED_FIELDS:
+        if not isinstance(obj.get(name), str):
+            raise CodecError(f"heartbeat field {name!r} missing or not a string")
+    return Heartbeat(**{name: obj[name] for name in FIELDS if name in obj})
+
+
+@lru_cache(maxsize=65536)
+def parse_ts(value):
+    """'2025-08-14T19:21:05Z' -> naive datetime, same result as strptime(TS_FORMAT)."""
+    if (len(value) != 20 or value[4] != "-" or value[7] != "-" or value[10] != "T"
+            or value[13] != ":" or value[16] != ":" or value[19] != "Z"):
+        raise ValueError(f"time data {value!r} does not match format {TS_FORMAT!r}")
+    return datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                    int(value[11:13]), int(value[14:16]), int(value[17:19]))
+
+
+# -------------------- backends --------------------
+class JsonCodec:
+    name = "json"
+
+    def dumps(self, entry):
+        if isinstance(entry, Heartbeat):
+            entry = {k: v for k, v in as_dict(entry).items() if v is not None}
+        return json.dumps(entry)
+
+    def loads(self, line):
+        try:
+            return json.loads(line)
+        except ValueError as e:
+            raise CodecError(str(e)) from None
+
+    def decode(self, line):
+        return heartbeat_from_dict(self.loads(line))
+
+
+class OrjsonCodec(JsonCodec):
+    name = "orjson"
+
+    def dumps(self, entry):
+        if isinstance(entry, Heartbeat):
+            entry = {k: v for k, v in as_dict(entry).items() if v is not None}
+        return orjson.dumps(entry).decode("utf-8")
+
+    def loads(self, line):
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            raise CodecError(str(e)) from None
+
+
+class MsgspecCodec:
+    name = "msgspec"
+
+    def __init__(self):
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+        self._typed = msgspec.json.Decoder(Heartbeat)
+
+    def dumps(self, entry):
+        return self._encoder.encode(entry).decode("utf-8")
+
+    def loads(self, line):
+        try:
+            return self._decoder.decode(line)
+        except msgspec.DecodeError as e:
+            raise CodecError(str(e)) from None
+
+    def decode(self, line):
+        try:
+            return self._typed.decode(line)
+        except msgspec.DecodeError as e:
+            raise CodecError(str(e)) from None
+
+
+CODECS = {"json": JsonCodec}
+if orjson is not None:
+    CODECS["orjson"] = OrjsonCodec
+if msgspec is not None:
+    CODECS["msgspec"] = MsgspecCodec
+PREFERENCE = ("msgspec", "orjson", "json")
+
+_instances = {}
+
+
+def get_codec(name="auto"):
+    """Codec by name; 'auto' (or None) picks the fastest installed backend."""
+    if name in (None, "auto"):
+        name = next(n for n in PREFERENCE if n in CODECS)
+    if name not in CODECS:
+        raise CodecError(f"heartbeat codec {name!r} is not available (installed: {', '.join(CODECS)})")
+    if name not in _instances:
+        _instances[name] = CODECS[name]()
+    return _instances[name]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Heartbeat JSON codec backends")
+    parser.add_argument("log", nargs="?", help="Decode this heartbeat log and report bad lines")
+    parser.add_argument("--codec", default="auto", help=f"One of: auto, {', '.join(CODECS)}")
+    args = parser.parse_args()
+
+    codec = get_codec(args.codec)
+    print(f"installed: {', '.join(n for n in PREFERENCE if n in CODECS)} (using {codec.name})")
+    if args.log:
+        good = bad = 0
+        with open(args.log, "rb") as fh:
+            for line in fh:
+                if not line.strip():
+                    continue
+                try:
+                    parse_ts(codec.decode(line).ts)
+                    good += 1
+                except ValueError as e:
+                    bad += 1
+                    if bad <= 5:
+                        print(f"  bad line: {e}", file=sys.stderr)
+        print(f"{good} heartbeat(s), {bad} invalid line(s)")
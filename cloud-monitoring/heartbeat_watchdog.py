@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+heartbeat_watchdog.py
+Deadline-heap heartbeat watchdog.
+
+Every heartbeat pushes (last_seen + threshold, device_id) onto a min-heap,
+O(log n). expire(now) only pops deadlines that have passed, so a tick costs
+O(expired * log n) instead of a sweep over every known device, and
+next_deadline() tells the caller how long it may sleep.
+
+Each device moves through explicit states and a transition is reported
+exactly once:
+
+  OK --(deadline passes)--> MISSING --(heartbeat)--> RECOVERED
+  OK --(status=ERROR)-----> ERROR   --(OK heartbeat)-> RECOVERED
+
+RECOVERED behaves like OK afterwards; repeated ERROR entries or further
+scans of a silent device do not produce new transitions.
+"""
+
+import heapq
+from datetime import timedelta
+
+OK = "OK"
+ERROR = "ERROR"
+MISSING = "MISSING"
+RECOVERED = "RECOVERED"
+
+ALERT_STATES = (ERROR, MISSING, RECOVERED)
+
+
+class DeviceState:
+    __slots__ = ("state", "last_seen", "deadline", "entry")
+
+    def __init__(self, state, last_seen, deadline, entry):
+        self.state = state
+        self.last_seen = last_seen
+        self.deadline = deadline
+        self.entry = entry
+
+
+class HeartbeatWatchdog:
+    def __init__(self, threshold_seconds):
+        self.threshold = timedelta(seconds=threshold_seconds)
+        self.devices = {}
+        self._heap = []
+
+    def __len__(self):
+        return len(self.devices)
+
+    def state(self, device_id):
+        dev = self.devices.get(device_id)
+        return dev.state if dev else None
+
+    def heartbeat(self, device_id, ts, entry=None, alert=True):
+        """
+        Record a heartbeat seen at `ts`. Returns a transition tuple
+        (device_id, old_state, new_state, DeviceState) or None.
+        alert=False seeds state (e.g. after a restart) without reporting.
+        """
+        dev = self.devices.get(device_id)
+        if dev is not None and ts <= dev.last_seen:
+            return None  # older or duplicate line
+
+        deadline = ts + self.threshold
+        heapq.heappush(self._heap, (deadline, device_id))
+
+        old = dev.state if dev else None
+        if entry and entry.get("status") == "ERROR":
+            new = ERROR
+        elif old in (MISSING, ERROR):
+            new = RECOVERED
+        elif old == RECOVERED:
+            new = RECOVERED  # stays healthy; no second recovery alert
+        else:
+            new = OK
+
+        if dev is None:
+            dev = self.devices[device_id] = DeviceState(new, ts, deadline, entry)
+        else:
+            dev.state, dev.last_seen, dev.deadline, dev.entry = new, ts, deadline, entry
+        self._compact()
+
+        if alert and new != old and new in ALERT_STATES:
+            return device_id, old, new, dev
+        return None
+
+    def mark_missing(self, device_id):
+        """Restore a device already reported MISSING (e.g. before a restart), without reporting it again."""
+        dev = self.devices.get(device_id)
+        if dev is not None:
+            dev.state = MISSING  # its heap entry is skipped from now on
+
+    def expire(self, now):
+        """Pop deadlines <= now; return MISSING transitions."""
+        transitions = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            deadline, device_id = heapq.heappop(heap)
+            dev = self.devices.get(device_id)
+            if dev is None or dev.deadline != deadline or dev.state == MISSING:
+                continue  # superseded by a later heartbeat
+            old = dev.state
+            dev.state = MISSING
+            transitions.append((device_id, old, MISSING, dev))
+        return transitions
+
+    def next_deadline(self):
+        """Earliest live deadline, or None if nothing is being watched."""
+        heap = self._heap
+        while heap:
+            deadline, device_id = heap[0]
+            dev = self.devices.get(device_id)
+            if dev is not None and dev.deadline == deadline and dev.state != MISSING:
+                return deadline
+            heapq.heappop(heap)
+        return None
+
+    def _compact(self):
+        # superseded entries are skipped lazily; rebuild once they dominate
+        if len(self._heap) > 2 * len(self.devices) + 64:
+            self._heap = [(dev.deadline, device_id) for device_id, dev in self.devices.items()
+                          if dev.state != MISSING]
+            heapq.heapify(self._heap)
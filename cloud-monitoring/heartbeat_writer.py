@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+heartbeat_writer.py
+Writer stage for device_simulator: batched log lines and batched metrics.
+
+- BufferedLogWriter keeps device_heartbeats.log open and writes lines in
+  batches, when `max_lines` are queued or the oldest queued line has
+  waited `max_delay` seconds.
+- MetricBatcher coalesces the datums of one namespace into put_metric_data
+  calls of up to MAX_METRIC_DATA entries (the PutMetricData per-request
+  limit), flushed on the same size/time triggers.
+- StubCloudWatchClient counts calls (and keeps the most recent) instead of
+  sending them, for tests and local runs without AWS credentials.
+"""
+
+import time
+import logging
+from collections import deque
+
+MAX_METRIC_DATA = 1000
+
+
+class BufferedLogWriter:
+    def __init__(self, path, max_lines=500, max_delay=1.0):
+        self.path = path
+        self.max_lines = max_lines
+        self.max_delay = max_delay
+        self._fh = open(path, "a", encoding="utf-8")
+        self._lines = []
+        self._oldest = 0.0  # monotonic time the first buffered line arrived
+        self.lines_written = 0
+
+    def write(self, line):
+        if not self._lines:
+            self._oldest = time.monotonic()
+        self._lines.append(line)
+        if len(self._lines) >= self.max_lines:
+            self.flush()
+        else:
+            self.maybe_flush()
+
+    def maybe_flush(self):
+        """Flush if the oldest buffered line has waited max_delay."""
+        if self._lines and time.monotonic() - self._oldest >= self.max_delay:
+            self.flush()
+
+    def flush(self):
+        if self._lines:
+            self._fh.write("\n".join(self._lines) + "\n")
+            self._fh.flush()
+            self.lines_written += len(self._lines)
+            self._lines.clear()
+
+    def close(self):
+        if self._fh is not None:
+            self.flush()
+            self._fh.close()
+            self._fh = None
+
+
+class MetricBatcher:
+    def __init__(self, client, namespace, max_batch=MAX_METRIC_DATA, max_delay=1.0):
+        self.client = client
+        self.namespace = namespace
+        self.max_batch = min(max_batch, MAX_METRIC_DATA)
+        self.max_delay = max_delay
+        self._data = []
+        self._oldest = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    def add(self, datum):
+        if not self._data:
+            self._oldest = time.monotonic()
+        self._data.append(datum)
+        if len(self._data) >= self.max_batch:
+            self.flush()
+        else:
+            self.maybe_flush()
+
+    def maybe_flush(self):
+        """Flush if the oldest buffered datum has waited max_delay."""
+        if self._data and time.monotonic() - self._oldest >= self.max_delay:
+            self.flush()
+
+    def flush(self):
+        data, self._data = self._data, []
+        for i in range(0, len(data), self.max_batch):
+            try:
+                self.client.put_metric_data(Namespace=self.namespace, MetricData=data[i:i + self.max_batch])
+                self.requests += 1
+            except Exception as e:
+                # Keep simulator resilient; never crash on metrics
+                self.errors += 1
+                logging.debug(f"put_metric_data failed: {e}")
+
+    def close(self):
+        self.flush()
+
+
+class StubCloudWatchClient:
+    """
+    Drop-in for boto3's CloudWatch client that just records batches: totals
+    for the whole run, and only the last `keep` calls themselves, so a long
+    simulator run doesn't grow without bound.
+    """
+
+    def __init__(self, verbose=False, keep=100):
+        self.calls = deque(maxlen=keep)
+        self.call_count = 0
+        self.datums = 0
+        self.verbose = verbose
+
+    def put_metric_data(self, Namespace, MetricData):
+        self.calls.append((Namespace, list(MetricData)))
+        self.call_count += 1
+        self.datums += len(MetricData)
+        if self.verbose:
+            print(f"[cw-stub] put_metric_data {Namespace}: {len(MetricData)} datum(s)")
+        return {}
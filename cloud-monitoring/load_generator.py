@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+load_generator.py
+High-scale load mode for the simulators, to stress the listener and monitor.
+
+  hl7         dialysis ORU^R01 messages MLLP-framed to --host/--port over a
+              pool of persistent connections (asyncio), optionally waiting
+              for an ACK frame per message
+  heartbeats  device heartbeat lines for --devices devices appended to
+              device_heartbeats.log through the batched writer
+
+Arrivals follow a target-rate schedule: fixed spacing, or --poisson for
+open-loop exponential inter-arrival times. Latency is measured from the
+*scheduled* send time, so a backed-up receiver shows up as latency instead
+of silently lowering the offered rate. --processes splits the rate across
+worker processes. A summary (achieved rate, latency percentiles) is printed
+and written as JSON with --summary.
+
+Usage:
+  python cloud-monitoring/load_generator.py hl7 --rate 500 --duration 30 --connections 50
+  python cloud-monitoring/load_generator.py hl7 --rate 2000 --poisson --processes 4 --summary load.json
+  python cloud-monitoring/load_generator.py heartbeats --devices 20000 --rate 20000 --duration 60
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+from datetime import datetime, UTC
+from concurrent.futures import ProcessPoolExecutor
+
+# mllp.py lives at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mllp import FrameDecoder, frame  # noqa: E402
+from heartbeat_writer import BufferedLogWriter  # noqa: E402
+from heartbeat_codec import get_codec  # noqa: E402
+
+LOG_FILE = "device_heartbeats.log"
+DISPATCH_SLICE = 0.005  # seconds of arrivals released per dispatcher wake-up
+
+
+def arrival_offsets(rate, duration, poisson=False, rng=None):
+    """Scheduled send offsets (seconds from start) for a target rate."""
+    rng = rng or random.Random()
+    t = 0.0
+    while t < duration:
+        yield t
+        t += rng.expovariate(rate) if poisson else 1.0 / rate
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def summarize(mode, target_rate, elapsed, sent, errors, latencies):
+    latencies = sorted(latencies)
+    summary = {
+        "mode": mode,
+        "target_rate": target_rate,
+        "sent": sent,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "achieved_rate": round(sent / elapsed, 1) if elapsed else 0.0,
+    }
+    if latencies:
+        summary.update({
+            "latency_p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "latency_p90_ms": round(percentile(latencies, 90) * 1000, 3),
+            "latency_p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            "latency_max_ms": round(latencies[-1] * 1000, 3),
+        })
+    return summary
+
+
+# -------------------- HL7 over MLLP --------------------
+def make_oru(rng, device_no, control_id):
+    """
+    Dialysis ORU^R01 with dialysis_hl7_simulator's segments. Its MSH is a
+    field short (MSH-10 would read "P" for every message); here MSH-4..6
+    are filled in so MSH-9 is the type and MSH-10 the control ID.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    return (f"MSH|^~\\&|Dialysis|Ward1|EMR|Main|{timestamp}||ORU^R01|{control_id}|P|2.3\r"
+            f"PID|||DIAL{device_no}||Doe^John||19600101|M\r"
+            f"OBR|1|||1234^Dialysis Treatment\r"
+            f"OBX|1|NM|KtV^Dialysis Adequacy||{rng.uniform(1.0, 2.0):.2f}||1.2-2.0||||F\r"
+            f"OBX|2|ST|BP^Blood Pressure||{rng.randint(90, 140)}/{rng.randint(60, 90)}||||||F")
+
+
+async def _read_frame(reader, decoder):
+    while True:
+        for view in decoder:
+            return bytes(view)
+        chunk = await reader.read(65536)
+        if not chunk:
+            raise ConnectionError("connection closed before ACK")
+        decoder.feed(chunk)
+
+
+async def _hl7_connection(host, port, queue, devices, wait_ack, stats, seed, id_prefix):
+    rng = random.Random(seed)
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        stats["errors"] += 1
+        return
+    decoder = FrameDecoder()
+    # MSH-10 must be unique: ACKs are matched on it and a --dedup listener drops repeats
+    counter = 0
+    try:
+        while True:
+            scheduled = await queue.get()
+            if scheduled is None:
+                return
+            counter += 1
+            try:
+                writer.write(frame(make_oru(rng, rng.randrange(devices), f"{id_prefix}-{counter}")))
+                await writer.drain()
+                if wait_ack:
+                    await _read_frame(reader, decoder)
+                stats["latencies"].append(time.perf_counter() - scheduled)
+                stats["sent"] += 1
+            except (ConnectionError, OSError):
+                stats["errors"] += 1
+                return
+    finally:
+        writer.close()
+
+
+async def _run_hl7(host, port, rate, duration, connections, devices, poisson, wait_ack, seed):
+    stats = {"sent": 0, "errors": 0, "latencies": []}
+    queue = asyncio.Queue()
+    # control IDs are <process seed>-<connection>-<n>: process seeds differ, so no two messages share one
+    workers = [asyncio.create_task(_hl7_connection(host, port, queue, devices, wait_ack, stats, seed + i,
+                                                   f"{seed}-{i}"))
+               for i in range(connections)]
+    start = time.perf_counter()
+    # open-loop dispatcher: release every arrival that is due, whatever the workers are doing
+    for offset in arrival_offsets(rate, duration, poisson, random.Random(seed)):
+        due = start + offset
+        delay = due - time.perf_counter()
+        if delay > DISPATCH_SLICE:
+            await asyncio.sleep(delay)
+        # arrivals released a little early are timed from release, late ones from schedule
+        queue.put_nowait(min(due, time.perf_counter()))
+    for _ in workers:
+        queue.put_nowait(None)
+    await asyncio.gather(*workers, return_exceptions=True)
+    stats["elapsed"] = time.perf_counter() - start
+    return stats
+
+
+def _hl7_worker(args):
+    return asyncio.run(_run_hl7(*args))
+
+
+def run_hl7(host, port, rate, duration, connections=50, devices=10000, poisson=False,
+            wait_ack=False, processes=1, seed=None):
+    seed = random.randrange(1 << 30) if seed is None else seed
+    per_rate = rate / processes
+    per_conns = max(1, connections // processes)
+    jobs = [(host, port, per_rate, duration, per_conns, devices, poisson, wait_ack, seed + 1000 * i)
+            for i in range(processes)]
+    if processes == 1:
+        results = [_hl7_worker(jobs[0])]
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            results = list(pool.map(_hl7_worker, jobs))
+    latencies = [lat for r in results for lat in r["latencies"]]
+    return summarize("hl7", rate, max(r["elapsed"] for r in results),
+                     sum(r["sent"] for r in results), sum(r["errors"] for r in results), latencies)
+
+
+# -------------------- Heartbeats --------------------
+def run_heartbeats(devices, rate, duration, poisson=False, drop_rate=0.0, log_file=LOG_FILE, seed=None):
+    rng = random.Random(seed)
+    writer = BufferedLogWriter(log_file, max_lines=5000, max_delay=0.5)
+    codec = get_codec()
+    sent = 0
+    start = time.perf_counter()
+    try:
+        for offset in arrival_offsets(rate, duration, poisson, rng):
+            delay = start + offset - time.perf_counter()
+            if delay > DISPATCH_SLICE:
+                time.sleep(delay)
+            device = f"dev-{sent % devices + 1}"
+            ts = datetime.now(UTC).strftime("%Y-%m-%dT%H:%M:%SZ")
+            if rng.random() < drop_rate:
+                entry = {"ts": ts, "device_id": device, "status": "ERROR",
+                         "reason": rng.choice(["sensor-fault", "low-battery", "comm-failure"])}
+            else:
+                entry = {"ts": ts, "device_id": device, "status": "OK",
+                         "battery": rng.randint(30, 100), "metric": round(rng.uniform(0.0, 200.0), 2)}
+            writer.write(codec.dumps(entry))
+            sent += 1
+    finally:
+        writer.close()
+    return summarize("heartbeats", rate, time.perf_counter() - start, sent, 0, [])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="High-scale load generator for the HL7 listener and monitor")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    hl7 = sub.add_parser("hl7", help="Send dialysis ORU messages over MLLP")
+    hl7.add_argument("--host", default="127.0.0.1")
+    hl7.add_argument("--port", type=int, default=2575)
+    hl7.add_argument("--connections", type=int, default=50, help="Persistent connections (total)")
+    hl7.add_argument("--devices", type=int, default=10000, help="Distinct simulated dialysis units")
+    hl7.add_argument("--wait-ack", action="store_true", help="Wait for an MLLP ACK frame per message")
+    hl7.add_argument("--processes", type=int, default=1, help="Worker processes sharing the rate")
+
+    hb = sub.add_parser("heartbeats", help="Append device heartbeats to the log")
+    hb.add_argument("--devices", type=int, default=10000)
+    hb.add_argument("--drop-rate", type=float, default=0.0, help="Probability of an ERROR entry")
+    hb.add_argument("--log-file", default=LOG_FILE)
+
+    for p in (hl7, hb):
+        p.add_argument("--rate", type=float, default=500.0, help="Target messages/lines per second")
+        p.add_argument("--duration", type=float, default=10.0, help="Seconds to run")
+        p.add_argument("--poisson", action="store_true", help="Open-loop Poisson arrivals")
+        p.add_argument("--seed", type=int, default=None)
+        p.add_argument("--summary", help="Write the summary JSON here")
+    args = parser.parse_args()
+
+    if args.mode == "hl7":
+        summary = run_hl7(args.host, args.port, args.rate, args.duration, args.connections, args.devices,
+                          args.poisson, args.wait_ack, args.processes, args.seed)
+    else:
+        summary = run_heartbeats(args.devices, args.rate, args.duration, args.poisson, args.drop_rate,
+                                 args.log_file, args.seed)
+
+    print(json.dumps(summary, indent=2))
+    if args.summary:
+        Path(args.summary).write_text(json.dumps(summary, indent=2), encoding="utf-8")
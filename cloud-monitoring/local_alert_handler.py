@@ -1,11 +1,19 @@
-import json
+import sys
+import argparse
+from pathlib import Path
+
+from heartbeat_codec import CodecError, get_codec
+
+CODEC = get_codec()
 
 def handle_device_message(message: str):
     if not message.strip():  # skip empty lines
         return
+    # loads(), not the typed decode(): any JSON object is a message here,
+    # with or without ts / status
     try:
-        data = json.loads(message)
-    except json.JSONDecodeError:
+        data = CODEC.loads(message)
+    except CodecError:
         print(f"[WARN] Skipping invalid JSON line: {message}")
         return
 
@@ -16,9 +24,33 @@ def handle_device_message(message: str):
     else:
         print(f"[INFO] Device {data.get('device_id')} OK")
 
+def summarize_log(log_file, workers, out_path):
+    """Large logs: sharded parallel scan, ERROR heartbeats go to out_path (JSONL)."""
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from log_analytics import analyze
+
+    summary = analyze(log_file, out_path, workers=workers, fmt="heartbeats")
+    print(f"[INFO] {summary['lines']} heartbeat(s), {summary['alerts']} ERROR(s) "
+          f"from {len(summary['devices'])} device(s) in {summary['elapsed_s']}s -> {summary['output']}")
+    for level, n in summary["levels"].items():
+        print(f"  {level:<10} {n}")
+    errors = {d: c["ERROR"] for d, c in summary["devices"].items() if c.get("ERROR")}
+    for device_id, n in sorted(errors.items(), key=lambda kv: -kv[1])[:10]:
+        print(f"[ALERT] Device {device_id}: {n} ERROR heartbeat(s)")
+    return summary
+
 if __name__ == "__main__":
-    log_file = "device_heartbeats.log"
-    with open(log_file, "r") as f:
+    parser = argparse.ArgumentParser(description="Alert on ERROR device heartbeats")
+    parser.add_argument("log_file", nargs="?", default="device_heartbeats.log")
+    parser.add_argument("--workers", type=int,
+                        help="Summarize with a sharded multi-process scan instead of printing every line")
+    parser.add_argument("--out", default="heartbeat_alerts.jsonl", help="ERROR heartbeats (with --workers)")
+    args = parser.parse_args()
+
+    if args.workers:
+        summarize_log(args.log_file, args.workers, args.out)
+        raise SystemExit(0)
+    with open(args.log_file, "r") as f:
         for line in f:
             handle_device_message(line.strip())
 
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+log_tailer.py
+Incremental reader for an append-only log (device_heartbeats.log).
+
+Each poll() returns only the complete lines appended since the last call.
+The byte offset and inode are kept in a small JSON checkpoint so a restart
+resumes where it stopped, and:
+  - rotation (path now points at a new inode): the old file is drained
+    through its still-open handle, then reading restarts at 0 on the new one
+  - truncation (file shorter than our offset): reading restarts at 0
+A trailing partial line is left for the next poll.
+
+Usage:
+  python cloud-monitoring/log_tailer.py device_heartbeats.log --checkpoint tail.checkpoint.json
+"""
+
+import os
+import json
+import argparse
+from pathlib import Path
+
+READ_CHUNK = 1024 * 1024
+
+
+class LogTailer:
+    def __init__(self, path, checkpoint_path=None):
+        self.path = Path(path)
+        self.checkpoint_path = Path(checkpoint_path) if checkpoint_path else None
+        self.offset = 0
+        self.inode = None
+        self.state = {}        # caller data persisted alongside the offset
+        self._fh = None
+        self._load_checkpoint()
+
+    # -------------------- checkpoint --------------------
+    def _load_checkpoint(self):
+        if not self.checkpoint_path or not self.checkpoint_path.exists():
+            return
+        try:
+            data = json.loads(self.checkpoint_path.read_text(encoding="utf-8"))
+            self.offset = int(data.get("offset", 0))
+            self.inode = data.get("inode")
+            self.state = data.get("state", {})
+        except (ValueError, OSError):
+            self.offset, self.inode, self.state = 0, None, {}
+
+    def save_checkpoint(self):
+        """Atomically persist offset/inode (and self.state)."""
+        if not self.checkpoint_path:
+            return
+        tmp = self.checkpoint_path.with_name(self.checkpoint_path.name + ".tmp")
+        tmp.write_text(json.dumps({
+            "path": str(self.path),
+            "inode": self.inode,
+            "offset": self.offset,
+            "state": self.state,
+        }), encoding="utf-8")
+        os.replace(tmp, self.checkpoint_path)
+
+    # -------------------- reading --------------------
+    def _open(self):
+        try:
+            fh = self.path.open("rb")
+        except FileNotFoundError:
+            return False
+        st = os.fstat(fh.fileno())
+        if st.st_ino != self.inode or st.st_size < self.offset:
+            # new file (first run, rotation) or truncated in place
+            self.offset = 0
+        self.inode = st.st_ino
+        self._fh = fh
+        return True
+
+    def _drain(self):
+        lines = []
+        fh = self._fh
+        fh.seek(self.offset)
+        pending = b""
+        while True:
+            chunk = fh.read(READ_CHUNK)
+            if not chunk:
+                break
+            data = pending + chunk if pending else chunk
+            end = data.rfind(b"\n")
+            if end < 0:
+                pending = data  # no complete line yet
+                continue
+            lines.extend(data[:end].split(b"\n"))
+            self.offset += end + 1
+            pending = data[end + 1:]
+        # anything still pending is a partial line; it is re-read next poll
+        return lines
+
+    def poll(self):
+        """Return the list of complete new lines (bytes, without newline)."""
+        if self._fh is None and not self._open():
+            return []
+        lines = self._drain()
+
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return lines  # rotated away, new file not created yet
+        if st.st_ino != self.inode:
+            # rotated: old handle has been drained above, switch to the new file
+            self.close()
+            self.inode = None
+            if self._open():
+                lines.extend(self._drain())
+        elif st.st_size < self.offset:
+            # truncated in place
+            self.offset = 0
+            lines.extend(self._drain())
+        return lines
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print lines appended to a log since the last run")
+    parser.add_argument("path")
+    parser.add_argument("--checkpoint", help="Checkpoint file for offset/inode")
+    args = parser.parse_args()
+
+    tailer = LogTailer(args.path, args.checkpoint)
+    for line in tailer.poll():
+        print(line.decode("utf-8", "replace"))
+    tailer.save_checkpoint()
+    tailer.close()
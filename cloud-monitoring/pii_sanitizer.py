@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+pii_sanitizer.py
+Shared HIPAA/GDPR masking for device heartbeat logs and received HL7.
+
+- sanitize_log_entry(entry): FIELD_MASKS maps each PII key straight to its
+  replacement, and one set check against the entry's keys finds the fields
+  to mask, so an ordinary heartbeat (no PII keys) is just copied.
+- sanitize_hl7(buf): masks PHI fields of PID, NK1, GT1 and IN1 segments in a
+  bytearray *in place*. Segments are located with a substring search per
+  segment ID, only those segments are split, and each listed field's bytes are
+  overwritten with '*' (component/repetition separators kept, so the
+  structure is still readable). Nothing is decoded or re-parsed, and the
+  message length does not change.
+
+Usage:
+  python cloud-monitoring/pii_sanitizer.py logs/received_message.hl7   # print masked copy
+  python cloud-monitoring/pii_sanitizer.py device_heartbeats.log --json
+"""
+
+import sys
+import json
+import argparse
+
+# -------------------- JSON log entries --------------------
+def _keep_prefix(value):
+    text = str(value)
+    return f"{text[:3]}****" if len(text) >= 3 else "****"
+
+
+# key -> replacement string, or function(value) -> replacement
+FIELD_MASKS = {
+    # Names
+    "patient_name": "REDACTED",
+    "full_name": "REDACTED",
+    "name": "REDACTED",
+    # Identifiers (MRN, patient_id, SSN, phone, email)
+    "patient_id": _keep_prefix,
+    "mrn": lambda value: f"{str(value)[:3]}****",
+    "ssn": "***-**-****",
+    "phone": "REDACTED",
+    "email": "redacted@example.com",
+    # Addresses / DOB
+    "address": "REDACTED",
+    "dob": "REDACTED",
+    "date_of_birth": "REDACTED",
+}
+_PII_KEYS = FIELD_MASKS.keys()
+
+
+def sanitize_log_entry(entry: dict) -> dict:
+    """
+    Return a copy of `entry` with PII/PHI fields masked (empty values are left
+    as they are). Safe to call on any entry.
+    """
+    sanitized = dict(entry)
+    if _PII_KEYS.isdisjoint(entry):
+        return sanitized  # plain heartbeat: no per-key work at all
+    for key in _PII_KEYS & entry.keys():
+        value = sanitized[key]
+        if value:
+            mask = FIELD_MASKS[key]
+            sanitized[key] = mask if type(mask) is str else mask(value)
+    return sanitized
+
+
+# -------------------- HL7 segments --------------------
+# segment ID -> field numbers holding patient/relative identity
+HL7_PHI_FIELDS = {
+    b"PID": (2, 3, 4, 5, 6, 7, 9, 11, 13, 14, 19, 20),  # IDs, name, DOB, alias, address, phones, SSN, licence
+    b"NK1": (2, 4, 5, 6, 30, 31, 32),                   # name, address, phones, contact person
+    b"GT1": (3, 5, 6, 7, 8, 12),                        # guarantor name, address, phones, DOB, SSN
+    b"IN1": (16, 18, 19),                               # insured name, DOB, address
+}
+
+MASK_BYTE = ord("*")
+_SEGMENT_STARTS = b"\r\n\x0b"   # bytes that may precede a segment ID (terminators, MLLP start block)
+
+_MASK_TABLES = {}   # MSH-1 + MSH-2 -> bytes.translate table keeping those bytes
+
+
+def _mask_table(header):
+    table = _MASK_TABLES.get(header)
+    if table is None:
+        field_sep = header[:1]
+        # MSH-2 normally has 4 characters; stop early if it is shorter
+        keep = field_sep + header[1:].split(field_sep, 1)[0] + b"\r\n"
+        table = bytearray([MASK_BYTE]) * 256
+        for b in keep:
+            table[b] = b
+        table = _MASK_TABLES[header] = bytes(table)
+    return table
+
+
+def sanitize_hl7(buf, fields=HL7_PHI_FIELDS):
+    """
+    Mask PHI fields in an HL7 message held in a bytearray, in place.
+    Returns the number of fields masked. Works on framed or unframed data and
+    on any segment terminator (\\r, \\n, \\r\\n).
+    """
+    msh = buf.find(b"MSH")
+    header = bytes(buf[msh + 3:msh + 8]) if msh >= 0 else b"|^~\\&"
+    table = _mask_table(header)
+    sep_byte = header[:1]
+    masked = 0
+    for name, wanted in fields.items():
+        needle = name + sep_byte
+        last = wanted[-1]
+        found = buf.find(needle)
+        while found >= 0:
+            if found and buf[found - 1] not in _SEGMENT_STARTS:
+                found = buf.find(needle, found + 1)
+                continue
+            start = found + 4
+            # segment ends at the next terminator (or the end of the buffer)
+            end = buf.find(b"\r", start)
+            if end < 0:
+                end = len(buf)
+            nl = buf.find(b"\n", start, end)
+            if nl >= 0:
+                end = nl
+            # split just this segment; masked fields keep their length, so the
+            # rejoined bytes drop back into the same slice
+            parts = buf[start:end].split(sep_byte, last)
+            count = len(parts)
+            hit = False
+            for n in wanted:
+                if n > count:
+                    break
+                if parts[n - 1]:
+                    parts[n - 1] = parts[n - 1].translate(table)
+                    masked += 1
+                    hit = True
+            if hit:
+                buf[start:end] = sep_byte.join(parts)
+            found = buf.find(needle, end)
+    return masked
+
+
+def sanitize_hl7_text(message: str) -> str:
+    """Convenience wrapper for str messages."""
+    buf = bytearray(message.encode("utf-8"))
+    sanitize_hl7(buf)
+    return buf.decode("utf-8", "replace")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print a PII-masked copy of an HL7 file or JSON-lines log")
+    parser.add_argument("path")
+    parser.add_argument("--json", action="store_true", help="Input is JSON lines (heartbeat log)")
+    args = parser.parse_args()
+
+    if args.json:
+        with open(args.path, "r", encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    print(json.dumps(sanitize_log_entry(json.loads(line))))
+                except ValueError:
+                    continue
+    else:
+        with open(args.path, "rb") as fh:
+            data = bytearray(fh.read())
+        sanitize_hl7(data)
+        sys.stdout.write(data.decode("utf-8", "replace"))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+hl7_ack.py
+HL7 v2 original-mode acknowledgements (ACK^ with MSA) for received messages.
+
+  AA  accepted: the message is durably stored
+  AE  application error: well-formed, but we could not store/process it
+  AR  rejected: not an HL7 message we can read (no MSH header)
+
+The ACK swaps sending/receiving application and facility, reuses the
+sender's separators and version, and echoes the original MSH-10 in MSA-2 so
+the sender can match the acknowledgement to its message.
+"""
+
+import time
+import itertools
+
+from hl7_message import Message, parse_message
+
+ACCEPT = "AA"
+ERROR = "AE"
+REJECT = "AR"
+
+_ack_ids = itertools.count(1)
+_clock = [0, ""]  # cached second -> HL7 timestamp
+
+
+def _timestamp():
+    now = int(time.time())
+    if now != _clock[0]:
+        _clock[0] = now
+        _clock[1] = time.strftime("%Y%m%d%H%M%S", time.localtime(now))
+    return _clock[1]
+
+
+def control_id(header):
+    """
+    MSH-10, or MSH-9 for senders that drop an empty field in front of the
+    message type (see alert_rules.message_type).
+    """
+    if len(header.components(9)) < 2 and len(header.components(8)) >= 2:
+        return header.field(9)
+    return header.field(10)
+
+
+def build_ack(message, code=ACCEPT, text=None):
+    """
+    message: raw bytes/str or hl7_message.Message (may lack an MSH header)
+    Returns the ACK as bytes (not MLLP-framed).
+    """
+    if not isinstance(message, Message):
+        try:
+            message = parse_message(message)
+        except Exception:
+            message = None
+    header = message.header() if message is not None else None
+
+    if header is not None:
+        fs = message.field_sep
+        encoding = header.field(2) or "^~\\&"
+        shifted = len(header.components(9)) < 2 and len(header.components(8)) >= 2
+        type_field = 8 if shifted else 9
+        event = header.component(type_field, 2)
+        version = header.field(type_field + 3) or "2.3"
+        original_id = control_id(header)
+        apps = (header.field(5), header.field(6), header.field(3), header.field(4))
+    else:
+        fs, encoding, event, version, original_id = "|", "^~\\&", "", "2.3", ""
+        apps = ("", "", "", "")
+
+    ack_type = f"ACK^{event}^ACK" if event else "ACK"
+    msh = fs.join(("MSH", encoding, *apps, _timestamp(), "", ack_type,
+                   f"ACK{next(_ack_ids):08d}", "P", version))
+    msa = fs.join(("MSA", code, original_id) + ((text.replace(fs, " "),) if text else ()))
+    return f"{msh}\r{msa}\r".encode("utf-8")
+
+
+def ack_code(ack):
+    """MSA-1 of a received ACK (bytes or str), or None."""
+    message = parse_message(ack)
+    return message.value("MSA", 1) or None
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+hl7_dedup.py
+Bounded duplicate detection for retransmitted HL7 messages.
+
+A sender that misses an ACK sends the same message again, unchanged, so
+MSH-3 (sending application) plus MSH-10 (message control ID) identify a
+copy. DedupCache remembers keys for `ttl` seconds in an LRU of at most
+`max_entries`: a copy inside the window refreshes its key, the least
+recently seen key is evicted when the cache is full, and expired keys are
+dropped from the cold end on every insert. Memory is bounded by
+max_entries whatever the storm.
+
+Looking a key up (seen) and remembering it (remember) are separate steps:
+a caller remembers a key only once its message is safely stored, so a
+message that failed (AE) is accepted again when the sender retries.
+check() does both, for callers whose processing cannot fail.
+
+An optional store keeps keys across restarts (and beyond max_entries):
+  sqlite:path  exact; new keys written in batches, looked up on a cache
+               miss, expired rows pruned as it goes
+  bloom:path   fixed size (3.6 bytes per key and generation at the default
+               error_rate of 1e-6), memory-mapped. Two generations, rotated
+               every ttl or when one holds max_entries keys, so a key is
+               forgotten after at most 2*ttl. A false positive (rate
+               `error_rate`) makes a new message look like a copy
+
+In ACK mode the ingest pipeline remembers a key once its message is in
+the WAL, and ACKs a later copy (AA) -- the sender is waiting for exactly
+that -- without logging, alerting or storing it again. A copy that arrives
+while the original is still being written waits for that write's outcome.
+
+Usage:
+  python ingest_pipeline.py --port 2575 --dedup --dedup-store sqlite:logs/dedup.db
+  python hl7_listener.py --dedup --dedup-ttl 3600
+  python hl7_dedup.py logs/received_message.hl7      # count copies in a capture
+"""
+
+import math
+import time
+import struct
+import argparse
+from pathlib import Path
+from collections import OrderedDict
+
+DEFAULT_TTL = 3600.0
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_ERROR_RATE = 1e-6
+STORE_BATCH = 256
+STORE_INTERVAL = 1.0
+
+
+def dedup_key(message):
+    """'MSH-3|MSH-10' of a parsed Message; None when there is no control ID."""
+    header = message.header()
+    if header is None:
+        return None
+    control_id = header.field(10).strip()
+    if not control_id:
+        return None
+    return f"{header.field(3)}|{control_id}"
+
+
+# -------------------- persistent stores --------------------
+class SqliteStore:
+    def __init__(self, path):
+        import sqlite3  # stores are optional; don't pay for them on every start
+        self._conn = sqlite3.connect(str(path))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY, expires REAL) WITHOUT ROWID")
+        self._conn.commit()
+        self._pending = {}
+        self._last_flush = time.monotonic()
+
+    def contains(self, key, now):
+        expires = self._pending.get(key)
+        if expires is None:
+            row = self._conn.execute("SELECT expires FROM seen WHERE key = ?", (key,)).fetchone()
+            expires = row[0] if row else None
+        return expires is not None and expires > now
+
+    def add(self, key, expires):
+        self._pending[key] = expires
+        if len(self._pending) >= STORE_BATCH or time.monotonic() - self._last_flush >= STORE_INTERVAL:
+            self.flush()
+
+    def recent(self, now, limit):
+        """Unexpired (key, expires), oldest first, to warm the cache after a restart."""
+        rows = self._conn.execute(
+            "SELECT key, expires FROM seen WHERE expires > ? ORDER BY expires DESC LIMIT ?", (now, limit))
+        return reversed(rows.fetchall())
+
+    def flush(self, now=None):
+        if self._pending:
+            self._conn.executemany("INSERT OR REPLACE INTO seen (key, expires) VALUES (?, ?)",
+                                   self._pending.items())
+            self._conn.execute("DELETE FROM seen WHERE expires <= ?", (now or time.time(),))
+            self._conn.commit()
+            self._pending.clear()
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if self._conn is not None:
+            self.flush()
+            self._conn.close()
+            self._conn = None
+
+
+class BloomStore:
+    """Two-generation Bloom filter in one memory-mapped file."""
+    MAGIC = b"HL7BLOOM"
+    _HEADER = struct.Struct("<8sIQd")  # magic, hashes, bits per generation, ttl
+    _GEN = struct.Struct("<dQ")        # started (epoch seconds), keys added
+
+    def __init__(self, path, capacity=DEFAULT_MAX_ENTRIES, error_rate=DEFAULT_ERROR_RATE, ttl=DEFAULT_TTL):
+        import mmap
+        self.path = Path(path)
+        nbits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        nbits = (nbits + 7) // 8 * 8
+        hashes = max(1, round(nbits / capacity * math.log(2)))
+        self.capacity = capacity
+        self._gens_at = self._HEADER.size
+        self._bits_at = self._gens_at + 2 * self._GEN.size
+        size = self._bits_at + 2 * nbits // 8
+        fresh = not self.path.exists() or self.path.stat().st_size != size
+        self._fh = open(self.path, "w+b" if fresh else "r+b")
+        if fresh:
+            self._fh.truncate(size)
+        self._mm = mmap.mmap(self._fh.fileno(), size)
+        if fresh or self._HEADER.unpack_from(self._mm, 0) != (self.MAGIC, hashes, nbits, ttl):
+            self._mm[:] = bytes(size)
+            self._HEADER.pack_into(self._mm, 0, self.MAGIC, hashes, nbits, ttl)
+            self._GEN.pack_into(self._mm, self._gens_at, time.time(), 0)
+        self.hashes = hashes
+        self.nbits = nbits
+        self.ttl = ttl
+        # generation headers live in memory and are written back on flush()
+        gens = [self._GEN.unpack_from(self._mm, self._gens_at + g * self._GEN.size) for g in (0, 1)]
+        self._started = [started for started, _ in gens]
+        self._added = [added for _, added in gens]
+        self._current = 0 if self._started[0] >= self._started[1] else 1
+        self._gen_bytes = nbits // 8
+        from hashlib import blake2b
+        self._blake2b = blake2b
+
+    def _positions(self, key):
+        digest = self._blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.nbits for i in range(self.hashes)]
+
+    def _test(self, g, positions):
+        base = self._bits_at + g * self._gen_bytes
+        mm = self._mm
+        for p in positions:
+            if not mm[base + (p >> 3)] & (1 << (p & 7)):
+                return False
+        return True
+
+    def contains(self, key, now):
+        positions = self._positions(key)
+        # a generation only takes keys for ttl, so after 2*ttl all of them have expired
+        for g in (self._current, self._current ^ 1):
+            if now - self._started[g] < 2 * self.ttl and self._test(g, positions):
+                return True
+        return False
+
+    def add(self, key, expires):
+        now = expires - self.ttl
+        g = self._current
+        if now - self._started[g] >= self.ttl or self._added[g] >= self.capacity:
+            # the older generation goes; keys in it are between ttl and 2*ttl old
+            g = self._current = g ^ 1
+            base = self._bits_at + g * self._gen_bytes
+            self._mm[base:base + self._gen_bytes] = bytes(self._gen_bytes)
+            self._started[g], self._added[g] = now, 0
+            self.flush()
+        base = self._bits_at + g * self._gen_bytes
+        mm = self._mm
+        for p in self._positions(key):
+            mm[base + (p >> 3)] |= 1 << (p & 7)
+        self._added[g] += 1
+
+    def recent(self, now, limit):
+        return ()  # keys are not recoverable from the bits; contains() covers them
+
+    def flush(self, now=None):
+        for g in (0, 1):
+            self._GEN.pack_into(self._mm, self._gens_at + g * self._GEN.size, self._started[g], self._added[g])
+        self._mm.flush()
+
+    def close(self):
+        if self._mm is not None:
+            self.flush()
+            self._mm.close()
+            self._fh.close()
+            self._mm = None
+
+
+def open_store(spec, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+    """'sqlite:path' or 'bloom:path' -> store; None/'' -> None (memory only)."""
+    if not spec:
+        return None
+    kind, _, location = spec.partition(":")
+    if kind == "sqlite":
+        return SqliteStore(location or "dedup.db")
+    if kind == "bloom":
+        return BloomStore(location or "dedup.bloom", capacity=max_entries, ttl=ttl)
+    raise ValueError(f"Unknown dedup store {spec!r} (expected sqlite:path or bloom:path)")
+
+
+# -------------------- cache --------------------
+class DedupCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, store=None, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.store = store
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> expiry, least recently seen first
+        self.counts = {"checked": 0, "duplicates": 0, "evicted": 0, "expired": 0}
+        if store is not None:
+            for key, expires in store.recent(clock(), max_entries):
+                self._entries[key] = expires
+
+    def __len__(self):
+        return len(self._entries)
+
+    def seen(self, key):
+        """True if `key` was remembered within ttl (a copy); refreshes it. Does not remember new keys."""
+        if key is None:
+            return False
+        self.counts["checked"] += 1
+        now = self.clock()
+        entries = self._entries
+        known = entries.get(key)
+        duplicate = known is not None and known > now
+        if not duplicate and known is None and self.store is not None:
+            duplicate = self.store.contains(key, now)
+        if duplicate:
+            self.counts["duplicates"] += 1
+            entries[key] = now + self.ttl
+            entries.move_to_end(key)
+        return duplicate
+
+    def remember(self, key):
+        """Record `key` for ttl seconds; call once its message is stored/processed."""
+        if key is None:
+            return
+        now = self.clock()
+        expires = now + self.ttl
+        entries = self._entries
+        entries[key] = expires
+        entries.move_to_end(key)
+        if self.store is not None:
+            self.store.add(key, expires)
+        # the cold end holds the oldest expiries: drop the expired ones, then trim to size
+        while entries:
+            oldest, oldest_expires = next(iter(entries.items()))
+            if oldest_expires > now:
+                break
+            del entries[oldest]
+            self.counts["expired"] += 1
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.counts["evicted"] += 1
+
+    def check(self, key):
+        """seen(key), remembering it if not: for processing that cannot fail."""
+        if self.seen(key):
+            return True
+        self.remember(key)
+        return False
+
+    def check_message(self, message):
+        return self.check(dedup_key(message))
+
+    def stats(self):
+        return {**self.counts, "size": len(self._entries), "max_entries": self.max_entries}
+
+    def flush(self):
+        if self.store is not None:
+            self.store.flush()
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+
+def add_dedup_arguments(parser):
+    parser.add_argument("--dedup", action="store_true",
+                        help="Drop retransmitted copies (same MSH-3 + MSH-10 within --dedup-ttl)")
+    parser.add_argument("--dedup-ttl", type=float, default=DEFAULT_TTL, help="Seconds a control ID is remembered")
+    parser.add_argument("--dedup-size", type=int, default=DEFAULT_MAX_ENTRIES, help="Control IDs kept in memory")
+    parser.add_argument("--dedup-store", help="Keep them across restarts: sqlite:path or bloom:path")
+
+
+def dedup_from_args(args):
+    if not args.dedup:
+        return None
+    store = open_store(args.dedup_store, args.dedup_size, args.dedup_ttl)
+    return DedupCache(args.dedup_size, args.dedup_ttl, store)
+
+
+if __name__ == "__main__":
+    from hl7_reader import iter_messages
+    from hl7_message import parse_message
+
+    parser = argparse.ArgumentParser(description="Count retransmitted copies in an HL7 capture")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--ttl", type=float, default=DEFAULT_TTL)
+    parser.add_argument("--size", type=int, default=DEFAULT_MAX_ENTRIES)
+    args = parser.parse_args()
+
+    # a capture has no arrival times: every copy counts, however far apart
+    cache = DedupCache(args.size, args.ttl, clock=lambda: 0.0)
+    messages = 0
+    for path in args.files:
+        for raw in iter_messages(path):
+            messages += 1
+            cache.check_message(parse_message(raw))
+    stats = cache.stats()
+    print(f"{messages} message(s), {stats['duplicates']} duplicate(s), "
+          f"{stats['checked']} with a control ID, {stats['evicted']} evicted")
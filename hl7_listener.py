@@ -1,10 +1,119 @@
+import sys
 import socket
-import hl7
+import logging
+import argparse
+import threading
+from pathlib import Path
 
-def start_listener():
-    host = '127.0.0.1'
-    port = 2575
+from mllp import FrameDecoder
+from hl7_message import parse_message
+from hl7_dedup import dedup_from_args, dedup_key
+from metrics import REGISTRY, start_exporters
+from ingest_pipeline import add_pipeline_arguments, run_pipeline
 
+# pii_sanitizer.py lives in cloud-monitoring/ (shared with device_simulator)
+sys.path.insert(0, str(Path(__file__).resolve().parent / "cloud-monitoring"))
+
+from pii_sanitizer import sanitize_hl7  # noqa: E402
+
+RECEIVED = REGISTRY.counter("hl7_messages_received_total", "HL7 messages received")
+HANDLE_SECONDS = REGISTRY.histogram("hl7_stage_seconds", "Time per message in each stage (persist: per batch)",
+                                    ("stage",)).labels("listener")
+DUPLICATES = REGISTRY.counter("hl7_duplicates_total", "Retransmitted copies dropped by the dedup cache")
+DEDUP = None  # hl7_dedup.DedupCache with --dedup
+DUPLICATE = object()
+_IN_PROGRESS = set()  # --async: dedup keys of messages being handled in worker threads
+_OUTPUT_LOCK = threading.Lock()  # --async: one message's printout and log entry at a time
+
+
+def handle_message(data):
+    """Mask PHI, then parse, print and save one HL7 message (bytes or str)."""
+    key = _dedup_check(data)
+    if key is DUPLICATE:
+        return
+    with HANDLE_SECONDS.time():
+        _handle_message(data)
+    if key is not None:
+        DEDUP.remember(key)  # only once it was handled without an error
+
+
+def _dedup_check(data):
+    """Count the message; its dedup key (None without --dedup), or DUPLICATE for a copy."""
+    RECEIVED.inc()
+    if DEDUP is None:
+        return None
+    key = dedup_key(parse_message(data))
+    if key is not None and (key in _IN_PROGRESS or DEDUP.seen(key)):
+        DUPLICATES.inc()
+        print("Duplicate message (retransmission) skipped")
+        return DUPLICATE
+    return key
+
+
+def _handle_message(data):
+    # Mask patient identifiers before anything is printed or written
+    buf = bytearray(data.encode('utf-8') if isinstance(data, str) else data)
+    sanitize_hl7(buf)
+    data = buf.decode('utf-8', 'replace')
+
+    # Parse HL7 message (python-hl7 is only needed by the legacy modes)
+    import hl7
+    message = hl7.parse(data)
+
+    with _OUTPUT_LOCK:
+        print("Parsed HL7 message:")
+
+        # Extract and print key segments
+        for segment in message:
+            if segment[0] == 'MSH':
+                print(f"MSH - Sending Application: {segment[2]}, Receiving Application: {segment[4]}")
+            elif segment[0] == 'PID':
+                print(f"PID - Patient ID: {segment[3]}, Patient Name: {segment[5]}")
+            elif segment[0] == 'OBX':
+                print(f"OBX - Observation ID: {segment[3]}, Value: {segment[5]}")
+
+        print("Full raw HL7 message:")
+        print(data)
+        print("\n--- End of Message ---\n")
+
+        # Save raw message to logs
+        with open("logs/received_message.hl7", "a") as f:
+            f.write(data + "\n\n")
+
+
+def start_async_listener(host='127.0.0.1', port=2575):
+    """
+    Concurrent MLLP mode: every device keeps its own connection open.
+    Parsing, printing and the log append run in worker threads, so one
+    message's disk I/O doesn't hold up the other connections; the dedup
+    lookup stays on the event loop (its store is single-threaded).
+    """
+    import asyncio  # only this mode needs it
+    from mllp_server import run_server
+
+    def _handle(message, peer):
+        print(f"Message from {peer}")
+        with HANDLE_SECONDS.time():
+            _handle_message(message)
+
+    async def _on_message(message, peer):
+        key = _dedup_check(message)
+        if key is DUPLICATE:
+            return
+        if key is None:
+            await asyncio.to_thread(_handle, message, peer)
+            return
+        _IN_PROGRESS.add(key)  # a copy arriving meanwhile is dropped
+        try:
+            await asyncio.to_thread(_handle, message, peer)
+            DEDUP.remember(key)
+        finally:
+            _IN_PROGRESS.discard(key)
+
+    run_server(_on_message, host, port)
+
+
+def start_listener(host='127.0.0.1', port=2575):
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         s.bind((host, port))
         s.listen()
@@ -14,32 +123,34 @@ def start_listener():
             conn, addr = s.accept()
             with conn:
                 print(f"Connection from {addr}")
-                data = conn.recv(4096).decode('utf-8')
-                if not data:
-                    continue
-
-                # Parse HL7 message
-                message = hl7.parse(data)
-                print("Parsed HL7 message:")
-
-                # Extract and print key segments
-                for segment in message:
-                    if segment[0] == 'MSH':
-                        print(f"MSH - Sending Application: {segment[2]}, Receiving Application: {segment[4]}")
-                    elif segment[0] == 'PID':
-                        print(f"PID - Patient ID: {segment[3]}, Patient Name: {segment[5]}")
-                    elif segment[0] == 'OBX':
-                        print(f"OBX - Observation ID: {segment[3]}, Value: {segment[5]}")
-
-                print("Full raw HL7 message:")
-                print(data)
-                print("\n--- End of Message ---\n")
-                
-                
-                # Save raw message to logs
-                with open("logs/received_message.hl7", "a") as f:
-                    f.write(data + "\n\n")
+                decoder = FrameDecoder()
+                while True:
+                    chunk = conn.recv(65536)
+                    if not chunk:
+                        break
+                    decoder.feed(chunk)
+                    for frame in decoder:
+                        handle_message(frame)
 
 
 if __name__ == "__main__":
-    start_listener()
+    parser = argparse.ArgumentParser(description="HL7 MLLP listener")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2575)
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Serve many persistent connections concurrently (asyncio)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Staged ingest: parse, alert and persist in bounded concurrent stages")
+    add_pipeline_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    DEDUP = dedup_from_args(args) if not args.pipeline else None
+    if args.pipeline:
+        run_pipeline(args, args.host, args.port)
+    elif args.use_async:
+        start_exporters(args)
+        start_async_listener(args.host, args.port)
+    else:
+        start_exporters(args)
+        start_listener(args.host, args.port)
@@ -0,0 +1,215 @@
+"""
+hl7_message.py
+Lazy, index-based HL7 v2 message model.
+
+parse_message() only records where each segment starts and ends in the
+original buffer. Segment objects and their field offsets are created the
+first time a segment is read, and repetitions/components are split only for the field
+being asked for -- most consumers read a handful of fields per message, so
+nothing else is ever decoded.
+
+  msg = parse_message(raw)
+  msg.segment("MSH").field(9)                  # 'ORU^R01'
+  msg.segment("PID").component(5, 1)           # family name
+  [obx.field(5) for obx in msg.segments("OBX")]  # repeated segments kept
+  parse_header(raw).header().field(10)         # MSH only: cheap enough to ACK with
+
+Field numbering follows the HL7 spec: MSH-1 is the field separator itself
+and MSH-2 the encoding characters, which are read from the message rather
+than assumed to be |^~\\&.
+"""
+
+import re
+
+DEFAULT_ENCODING_CHARACTERS = "^~\\&"
+_LEADING_WS_RE = re.compile(rb"\s*")
+_FIRST_SEGMENT_RE = re.compile(rb"\s*[^\r\n]*")
+_LINE_RE = re.compile(rb"[^\r\n]+")
+
+
+class Segment:
+    __slots__ = ("message", "name", "start", "end", "_bounds")
+
+    def __init__(self, message, name, start, end):
+        self.message = message
+        self.name = name
+        self.start = start
+        self.end = end
+        self._bounds = None
+
+    def __repr__(self):
+        return f"<Segment {self.name} {self.raw()!r}>"
+
+    def raw(self):
+        return self.message.raw[self.start:self.end].decode(self.message.charset, "replace")
+
+    def _field_bounds(self):
+        # [start - 1, sep, sep, ..., end]: field k spans bounds[k] + 1 ..
+        # bounds[k + 1]; index 0 is the segment ID. Only the separator
+        # offsets are recorded, the fields themselves are not copied.
+        bounds = self._bounds
+        if bounds is None:
+            raw, sep, end = self.message.raw, self.message.field_sep_byte, self.end
+            bounds = self._bounds = [self.start - 1]
+            i = raw.find(sep, self.start, end)
+            while i != -1:
+                bounds.append(i)
+                i = raw.find(sep, i + 1, end)
+            bounds.append(end)
+        return bounds
+
+    def __len__(self):
+        """Number of fields (MSH counts MSH-1, the separator itself)."""
+        n = len(self._field_bounds()) - 2
+        return n + 1 if self.name == "MSH" else n
+
+    def field(self, n, default=""):
+        """Raw text of field n (1-based, HL7 numbering)."""
+        if self.name == "MSH":
+            if n == 1:
+                return self.message.field_sep
+            n -= 1
+        bounds = self._field_bounds()
+        if n < 1 or n >= len(bounds) - 1:
+            return default
+        return self.message.raw[bounds[n] + 1:bounds[n + 1]].decode(self.message.charset, "replace")
+
+    def repetitions(self, n):
+        """Field n split on the repetition separator."""
+        value = self.field(n)
+        if self.name == "MSH" and n <= 2:
+            return [value]
+        return value.split(self.message.repetition_sep)
+
+    def components(self, n, rep=0):
+        """Components of repetition `rep` (0-based) of field n."""
+        reps = self.repetitions(n)
+        if rep >= len(reps):
+            return []
+        if self.name == "MSH" and n <= 2:
+            return reps
+        return reps[rep].split(self.message.component_sep)
+
+    def component(self, n, c, rep=0, default=""):
+        """Component c (1-based) of field n, e.g. PID-5.1 is component(5, 1)."""
+        comps = self.components(n, rep)
+        return comps[c - 1] if 0 < c <= len(comps) else default
+
+
+class Message:
+    __slots__ = ("raw", "charset", "field_sep", "field_sep_byte", "component_sep",
+                 "repetition_sep", "escape_char", "subcomponent_sep",
+                 "_starts", "_ends", "_names", "_segments")
+
+    def __init__(self, raw, charset="utf-8"):
+        if isinstance(raw, str):
+            raw = raw.encode(charset)
+        elif not isinstance(raw, bytes):
+            raw = bytes(raw)  # bytearray / memoryview from the MLLP decoder
+        self.raw = raw
+        self.charset = charset
+        self._read_encoding_characters()
+        self._index_segments()
+
+    def _read_encoding_characters(self):
+        raw = self.raw
+        i = 0 if raw[:3] == b"MSH" else _LEADING_WS_RE.match(raw).end()
+        encoding = DEFAULT_ENCODING_CHARACTERS
+        self.field_sep = "|"
+        if raw.startswith(b"MSH", i) and len(raw) > i + 3:
+            self.field_sep = chr(raw[i + 3])
+            declared = raw[i + 4:i + 8].decode("ascii", "replace")
+            for stop in (self.field_sep, "\r", "\n"):
+                declared = declared.split(stop, 1)[0]
+            encoding = declared + DEFAULT_ENCODING_CHARACTERS[len(declared):]
+        self.field_sep_byte = self.field_sep.encode("ascii")
+        self.component_sep = encoding[0]
+        self.repetition_sep = encoding[1]
+        self.escape_char = encoding[2]
+        self.subcomponent_sep = encoding[3]
+
+    def _index_segments(self):
+        # \r, \n and \r\n all end a segment; lines are located in place
+        # and only their offsets are kept, no line is copied out of raw
+        raw = self.raw
+        sep = self.field_sep_byte
+        starts, ends = [], []
+        for line in _LINE_RE.finditer(raw):
+            start, end = line.span()
+            # a segment is a 3-char ID followed by the field separator or the
+            # line end; blank or annotation lines are not segments
+            if end - start >= 3 and (end - start == 3 or raw[start + 3:start + 4] == sep) \
+                    and raw[start:start + 3].isalnum():
+                starts.append(start)
+                ends.append(end)
+        self._starts = starts
+        self._ends = ends
+        self._names = [raw[s:s + 3] for s in starts]
+        self._segments = [None] * len(starts)
+
+    def _segment_at(self, i):
+        seg = self._segments[i]
+        if seg is None:
+            seg = self._segments[i] = Segment(
+                self, self._names[i].decode("ascii"), self._starts[i], self._ends[i])
+        return seg
+
+    def __len__(self):
+        return len(self._names)
+
+    def __iter__(self):
+        return (self._segment_at(i) for i in range(len(self._names)))
+
+    def __repr__(self):
+        return f"<Message {self.message_type or '?'} {len(self._names)} segments>"
+
+    def __contains__(self, name):
+        return name.encode("ascii") in self._names
+
+    def header(self):
+        """The MSH segment if the message starts with one, else None."""
+        if self._names and self._names[0] == b"MSH" \
+                and self._starts[0] == _LEADING_WS_RE.match(self.raw).end():
+            return self._segment_at(0)
+        return None
+
+    def segments(self, name=None):
+        """All segments, or every segment with this ID in message order."""
+        if name is None:
+            return list(self)
+        key = name.encode("ascii")
+        return [self._segment_at(i) for i, n in enumerate(self._names) if n == key]
+
+    def segment(self, name):
+        """First segment with this ID, or None."""
+        try:
+            return self._segment_at(self._names.index(name.encode("ascii")))
+        except ValueError:
+            return None
+
+    def value(self, name, n, c=None, default=""):
+        """Shortcut for segment(name).field(n) / .component(n, c)."""
+        seg = self.segment(name)
+        if seg is None:
+            return default
+        return seg.field(n, default) if c is None else seg.component(n, c, default=default)
+
+    @property
+    def message_type(self):
+        return self.value("MSH", 9)
+
+    @property
+    def control_id(self):
+        return self.value("MSH", 10)
+
+
+def parse_message(raw, charset="utf-8"):
+    """Index one HL7 message (str, bytes, bytearray or memoryview)."""
+    return Message(raw, charset)
+
+
+def parse_header(raw, charset="utf-8"):
+    """Index only the first segment (the MSH): enough to dedup or ACK a message."""
+    if isinstance(raw, str):
+        raw = raw.encode(charset)
+    return Message(raw[:_FIRST_SEGMENT_RE.match(raw).end()], charset)
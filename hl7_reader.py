@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+hl7_reader.py
+Streaming reader for files holding many HL7 messages.
+
+iter_messages() yields one message at a time (bytes, segments joined with
+\\r) while reading the file in fixed-size chunks, so memory stays constant
+whatever the file size -- multi-GB replays of logs/received_message.hl7
+included. Pass use_mmap=True to read the chunks from a memory map instead.
+
+Message boundaries:
+  - a line starting with MSH
+  - MLLP start/end blocks (<VT> ... <FS><CR>), e.g. captured streams
+  - a blank line (the layout of the demo files and the listener's log), so
+    a message without a valid MSH still comes out on its own; pass
+    blank_lines=False for annotated files with blank lines inside messages
+Segment terminators may be \\r, \\n or \\r\\n, mixed freely.
+
+Usage:
+  python hl7_reader.py logs/received_message.hl7            # count messages
+  python hl7_reader.py cloud-monitoring/demo_errors.hl7 --print
+"""
+
+import sys
+import mmap
+import argparse
+
+DEFAULT_CHUNK = 1024 * 1024
+
+# MLLP block characters and bare CR all become line breaks; CRLF is folded first
+_TERMINATORS = bytes.maketrans(b"\r\x0b\x1c", b"\n\n\n")
+
+
+def _chunks(source, chunk_size, use_mmap):
+    if use_mmap:
+        with open(source, "rb") as fh:
+            try:
+                mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                return  # empty file
+            with mm:
+                for pos in range(0, len(mm), chunk_size):
+                    yield mm[pos:pos + chunk_size]
+        return
+    fh = open(source, "rb") if not hasattr(source, "read") else source
+    try:
+        while True:
+            chunk = fh.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        if fh is not source:
+            fh.close()
+
+
+def _lines(source, chunk_size, use_mmap):
+    """Complete lines (bytes, no terminator) from any mix of terminators."""
+    carry = b""
+    for chunk in _chunks(source, chunk_size, use_mmap):
+        data = carry + chunk
+        # a trailing \r may be the first half of \r\n: keep that line for the next chunk
+        cut = max(data.rfind(b"\n"), data.rfind(b"\r", 0, len(data) - 1), data.rfind(b"\x1c"))
+        if cut < 0:
+            carry = data
+            continue
+        carry = data[cut + 1:]
+        lines = data[:cut + 1].replace(b"\r\n", b"\n").translate(_TERMINATORS).split(b"\n")
+        lines.pop()  # empty remainder after the final terminator
+        yield from lines
+    if carry:
+        yield from carry.replace(b"\r\n", b"\n").translate(_TERMINATORS).split(b"\n")
+
+
+def _is_header(line):
+    return line.startswith(b"MSH") and (len(line) == 3 or not line[3:4].isalnum())
+
+
+def iter_messages(source, chunk_size=DEFAULT_CHUNK, use_mmap=False, blank_lines=True):
+    """
+    source: path or binary file object (use_mmap needs a path)
+    Yields each message as bytes with \\r segment terminators.
+    """
+    segments = []
+    for line in _lines(source, chunk_size, use_mmap):
+        if not line.strip():
+            if segments and blank_lines:
+                yield b"\r".join(segments)
+                segments = []
+            continue
+        if _is_header(line) and segments:
+            yield b"\r".join(segments)
+            segments = []
+        segments.append(line)
+    if segments:
+        yield b"\r".join(segments)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream the messages of an HL7 batch/log file")
+    parser.add_argument("path")
+    parser.add_argument("--print", dest="show", action="store_true", help="Print each message")
+    parser.add_argument("--mmap", action="store_true", help="Read through a memory map")
+    parser.add_argument("--msh-only", action="store_true",
+                        help="Blank lines don't end a message (annotated example files)")
+    args = parser.parse_args()
+
+    count = 0
+    for message in iter_messages(args.path, use_mmap=args.mmap, blank_lines=not args.msh_only):
+        count += 1
+        if args.show:
+            sys.stdout.write(message.replace(b"\r", b"\n").decode("utf-8", "replace") + "\n\n")
+    print(f"{count} message(s)")
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+hl7_wal.py
+Write-ahead log for received HL7 messages, with group commit.
+
+append() resolves only once the message is on disk (written and fsync'ed),
+which is the point after which the listener may send AA. It returns the
+record's position, (segment number, end offset). A single committer
+task writes every message that arrived since the previous commit with one
+write() and one fsync(), off the event loop. While that fsync runs, new
+appends queue up for the next group, so the number of fsyncs stays roughly
+constant as the message rate goes up.
+
+Records are length-prefixed and CRC-checked:
+  <u32 little-endian length><u32 crc32 of payload><payload>
+in size-rotated segment files (logs/wal/wal-000001.log, ...). Readers stop a
+segment at the first torn or corrupt record (a crash mid-group), so nothing
+may follow one: on start the last segment is cut back to its last intact
+record, and after a failed write the torn bytes are cut off and appends move
+on to a new segment. A failed commit fails the appends of that group (the
+listener answers AE); it never leaves an append waiting.
+
+Each position is handed back with done() once the pipeline has finished
+with its message. The checkpoint (logs/wal/checkpoint) is the position
+before which every record is done; it is written by the committer, off
+the event loop. On start, replay() yields every record after it, i.e.
+messages that were ACKed but not yet persisted when the process stopped,
+so delivery is at-least-once: a message done after the last checkpoint
+write is replayed again.
+
+The WAL holds raw messages, including PHI, so segment files are created
+owner-read/write only (0600), and segments wholly before the checkpoint
+are deleted when it is written (keep_segments of them are retained).
+
+Usage:
+  python hl7_wal.py count --dir logs/wal
+  python hl7_wal.py count --dir logs/wal --pending
+  python hl7_wal.py dump --dir logs/wal --out replay.hl7
+"""
+
+import os
+import re
+import sys
+import zlib
+import struct
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+from itertools import islice
+from collections import OrderedDict
+
+DEFAULT_WAL_DIR = Path("logs/wal")
+DEFAULT_SEGMENT_BYTES = 256 * 1024 * 1024
+MAX_GROUP = 4096  # records per write/fsync
+REPLAY_BATCH = 256  # records read per thread hop in replay()
+CHECKPOINT_NAME = "checkpoint"
+
+_HEADER = struct.Struct("<II")
+_SEGMENT_RE = re.compile(r"wal-(\d{6})\.log$")
+_sync = getattr(os, "fdatasync", os.fsync)
+
+
+class WriteAheadLog:
+    def __init__(self, directory=DEFAULT_WAL_DIR, max_bytes=DEFAULT_SEGMENT_BYTES, fsync=True, keep_segments=0):
+        """keep_segments: fully checkpointed segments to retain (the rest are deleted)"""
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self.keep_segments = keep_segments
+        self.records = 0
+        self.groups = 0
+        self.pruned = 0
+        self._fd = None
+        self._size = 0
+        self._pending = []
+        self._wakeup = None
+        self._committer = None
+        self._outstanding = OrderedDict()  # position -> done, in log order
+        self._checkpoint = self._saved_checkpoint = read_checkpoint(self.directory)
+        segments = self.segments()
+        self._segment_no = _segment_number(segments[-1]) if segments else 1
+
+    def segments(self):
+        """Segment files in write order."""
+        return _segments(self.directory)
+
+    def _open_segment(self):
+        path = self.directory / f"wal-{self._segment_no:06d}.log"
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        size = os.fstat(self._fd).st_size
+        self._size = _valid_length(path) if size else 0
+        if self._size < size:
+            # torn tail from a crash: readers would stop there and miss every later record
+            os.ftruncate(self._fd, self._size)
+            _sync(self._fd)
+
+    # -------------------- lifecycle --------------------
+    async def start(self):
+        self._open_segment()
+        self._wakeup = asyncio.Event()
+        self._committer = asyncio.create_task(self._commit_loop())
+        return self
+
+    async def close(self):
+        """Commit whatever is pending, then close the segment."""
+        if self._committer is not None:
+            self._pending.append(None)
+            self._wakeup.set()
+            await self._committer
+            self._committer = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    # -------------------- writing --------------------
+    async def append(self, payload):
+        """Durably log one message (bytes); returns its position once it is fsync'ed."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((payload, future))
+        self._wakeup.set()
+        return await future
+
+    async def _commit_loop(self):
+        closing = False
+        while not closing:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending and not closing:
+                group, self._pending = self._pending[:MAX_GROUP], self._pending[MAX_GROUP:]
+                closing = group[-1] is None
+                if closing:
+                    group.pop()
+                if group:
+                    await self._commit(group)
+            if self._checkpoint != self._saved_checkpoint:
+                await self._save_checkpoint()
+
+    async def _commit(self, group):
+        try:
+            parts = []
+            for payload, _ in group:
+                parts.append(_HEADER.pack(len(payload), zlib.crc32(payload)))
+                parts.append(payload)
+            segment_no, offset = await asyncio.to_thread(self._write, b"".join(parts))
+        except Exception as e:  # anything: the committer must keep running and answer every append
+            for _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.records += len(group)
+        self.groups += 1
+        for payload, future in group:
+            offset += _HEADER.size + len(payload)
+            position = (segment_no, offset)
+            self._outstanding[position] = False
+            if not future.done():
+                future.set_result(position)
+
+    def _write(self, data):
+        """Write and sync one group; returns (segment number, offset) where it starts."""
+        if self._fd is None:
+            self._open_segment()  # the previous one was abandoned after a failed write
+        elif self._size and self._size + len(data) > self.max_bytes:
+            os.close(self._fd)
+            self._fd = None  # if the open below fails, the next write retries it
+            self._segment_no += 1
+            self._open_segment()
+        try:
+            view = memoryview(data)
+            while view:
+                written = os.write(self._fd, view)
+                view = view[written:]
+            if self.fsync:
+                _sync(self._fd)
+        except BaseException:
+            self._abandon_segment()
+            raise
+        start = self._size
+        self._size += len(data)
+        return self._segment_no, start
+
+    def _abandon_segment(self):
+        """After a failed write: drop any partial group, continue in a new segment."""
+        try:
+            os.ftruncate(self._fd, self._size)
+        except OSError:
+            pass  # the new segment keeps later records readable either way
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+        self._fd = None
+        self._segment_no += 1  # opened by the next write
+
+    # -------------------- checkpoint and replay --------------------
+    def done(self, position):
+        """The pipeline is finished with the record at `position` (from append() or replay())."""
+        if position not in self._outstanding:
+            return
+        self._outstanding[position] = True
+        while self._outstanding:
+            first, finished = next(iter(self._outstanding.items()))
+            if not finished:
+                break
+            self._outstanding.popitem(last=False)
+            self._checkpoint = first
+        if self._checkpoint != self._saved_checkpoint and self._wakeup is not None:
+            self._wakeup.set()  # the committer writes it
+
+    @property
+    def pending(self):
+        """Records appended or replayed but not yet done."""
+        return len(self._outstanding)
+
+    async def replay(self):
+        """
+        Async-iterate (payload, position) for every record after the
+        checkpoint, oldest first. Call after start() and before the first
+        append(); pass each position to done() like an appended one.
+        """
+        records = _records_after(self.directory, self._checkpoint, (self._segment_no, self._size))
+        while batch := await asyncio.to_thread(list, islice(records, REPLAY_BATCH)):
+            for payload, position in batch:
+                self._outstanding[position] = False
+                yield payload, position
+
+    async def _save_checkpoint(self):
+        checkpoint = self._checkpoint
+        try:
+            self.pruned += await asyncio.to_thread(self._write_checkpoint, checkpoint)
+        except OSError as e:
+            logging.error(f"WAL checkpoint not saved: {e}")  # retried with the next one
+            return
+        self._saved_checkpoint = checkpoint
+
+    def _write_checkpoint(self, checkpoint):
+        """Replace the checkpoint file, then delete segments it has passed; returns how many."""
+        tmp = self.directory / (CHECKPOINT_NAME + ".tmp")
+        with open(tmp, "w", encoding="ascii") as fh:
+            fh.write("%d %d\n" % checkpoint)
+            fh.flush()
+            _sync(fh.fileno())
+        os.replace(tmp, self.directory / CHECKPOINT_NAME)
+        passed = [p for p in self.segments() if _segment_number(p) < checkpoint[0]]
+        pruned = 0
+        for path in passed[:len(passed) - self.keep_segments]:
+            path.unlink(missing_ok=True)
+            pruned += 1
+        return pruned
+
+
+def _records(fh):
+    """(payload, end offset) of each intact record from the start of fh."""
+    pos = 0
+    while True:
+        header = fh.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return
+        length, crc = _HEADER.unpack(header)
+        payload = fh.read(length)
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return  # torn tail of this segment
+        pos += _HEADER.size + length
+        yield payload, pos
+
+
+def _valid_length(path):
+    """Bytes of `path` up to the end of its last intact record."""
+    end = 0
+    with open(path, "rb") as fh:
+        for _, end in _records(fh):
+            pass
+    return end
+
+
+def _segment_number(path):
+    return int(_SEGMENT_RE.search(path.name).group(1))
+
+
+def _segments(directory):
+    return sorted(p for p in directory.iterdir() if _SEGMENT_RE.search(p.name))
+
+
+def _records_after(directory, after, upto=None):
+    """(payload, position) of each intact record with after < position <= upto."""
+    for path in _segments(directory):
+        segment_no = _segment_number(path)
+        if segment_no < after[0] or (upto is not None and segment_no > upto[0]):
+            continue
+        with path.open("rb") as fh:
+            for payload, end in _records(fh):
+                position = (segment_no, end)
+                if upto is not None and position > upto:
+                    break
+                if position > after:
+                    yield payload, position
+
+
+def read_checkpoint(directory=DEFAULT_WAL_DIR):
+    """Position before which every record is done; (0, 0) when there is none."""
+    try:
+        segment_no, offset = (Path(directory) / CHECKPOINT_NAME).read_text(encoding="ascii").split()
+        return int(segment_no), int(offset)
+    except (OSError, ValueError):
+        return 0, 0  # none yet, or unreadable: replay everything that is left
+
+
+def read_records(directory=DEFAULT_WAL_DIR, pending=False):
+    """Yield every intact payload in write order (pending: only those after the checkpoint)."""
+    directory = Path(directory)
+    if not directory.is_dir():
+        return
+    after = read_checkpoint(directory) if pending else (0, 0)
+    for payload, _ in _records_after(directory, after):
+        yield payload
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the HL7 write-ahead log")
+    sub = parser.add_subparsers(dest="command", required=True)
+    cnt = sub.add_parser("count", help="Count intact records")
+    cnt.add_argument("--dir", default=str(DEFAULT_WAL_DIR))
+    dump = sub.add_parser("dump", help="Write logged messages as a blank-line separated .hl7 file")
+    dump.add_argument("--dir", default=str(DEFAULT_WAL_DIR))
+    dump.add_argument("--out", default="-", help="Output path, '-' for stdout")
+    for command in (cnt, dump):
+        command.add_argument("--pending", action="store_true",
+                             help="Only records after the checkpoint (replayed on the next start)")
+    args = parser.parse_args()
+
+    if args.command == "count":
+        print(sum(1 for _ in read_records(args.dir, args.pending)))
+    else:
+        out = sys.stdout.buffer if args.out == "-" else open(args.out, "wb")
+        try:
+            for payload in read_records(args.dir, args.pending):
+                out.write(payload + b"\n\n")
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+"""
+ingest_pipeline.py
+Staged HL7 ingest for the listener: receive -> parse -> alert -> persist.
+
+  receive  MLLPServer connections hand each frame to receive(): only the
+           MSH is read, the raw message is appended to the write-ahead log
+           (hl7_wal, group commit) and only then ACKed (AA; AE if it could
+           not be logged, AR if it has no MSH header). Without a WAL,
+           submit() only enqueues
+  replay   on start, before the server listens, messages the WAL holds
+           past its checkpoint (ACKed, not yet persisted when the process
+           stopped) are fed to the parse stage again
+  parse    hl7_message.parse_message, inline or in a process pool
+           (--parse-processes), in both modes
+  alert    HL7AlertHandler.analyze_hl7 (cloud-monitoring/alert_handler.py)
+  persist  PHI-masked raw message appended to the received-message log,
+           alerts written to an alert store; batched per wake-up and run
+           in a worker thread, so file and database I/O never blocks the
+           event loop (and several persist workers each use their own
+           pooled connection with a database store)
+
+Once a message is persisted (or failed to parse, which no retry fixes),
+its WAL position is marked done and the checkpoint moves past it. A batch
+whose persist fails stays pending: it is retried on the next start,
+together with whatever was ACKed after it.
+
+Stages are joined by bounded asyncio queues. A full queue blocks the stage
+before it, and ultimately the socket reads of the connection that is
+sending, so memory stays bounded under overload. Every stage has its own
+worker count; with several workers, messages can complete out of order.
+stats() reports queue depths (current and high-water) and per-stage
+counts, so the slowest stage is the one whose input queue sits full.
+
+Every message is also timed (metrics.py): hl7_stage_seconds per stage
+(receive, parse, alert; persist per batch), hl7_message_seconds from
+receive to persisted, plus error/ACK counters and queue-depth gauges,
+exported with --metrics-port (Prometheus) and --metrics-interval (log).
+
+With a DedupCache (hl7_dedup, --dedup), retransmitted copies (same
+MSH-3 + MSH-10) are ACKed but go no further than receive. A key is
+remembered only once its message is in the WAL (in --no-ack mode, once it
+is enqueued), so a message that got AE is accepted when the sender retries;
+a copy arriving while the original is still being written waits for it.
+
+Usage:
+  python ingest_pipeline.py --port 2575 --parse-processes 4 --stats-interval 5
+  python ingest_pipeline.py --port 2575 --wal logs/wal --wal-keep-segments 2
+  python ingest_pipeline.py --port 2575 --no-ack
+  python ingest_pipeline.py --port 2575 --metrics-port 9108 --metrics-interval 30
+  python ingest_pipeline.py --port 2575 --dedup --dedup-store sqlite:logs/dedup.db
+  python ingest_pipeline.py --port 2575 --alert-store db:postgresql://localhost/hl7db
+  python hl7_listener.py --pipeline --parse-workers 4 --parse-processes 4
+"""
+
+import sys
+import time
+import json
+import asyncio
+import threading
+import contextlib
+import logging
+import argparse
+from pathlib import Path
+
+from mllp import frame
+from hl7_ack import ACCEPT, ERROR, REJECT, build_ack
+from hl7_wal import DEFAULT_WAL_DIR, WriteAheadLog
+from hl7_dedup import add_dedup_arguments, dedup_from_args, dedup_key
+from hl7_message import parse_header, parse_message
+from mllp_server import MLLPServer
+from metrics import REGISTRY, add_metrics_arguments, start_exporters
+
+# alert_handler.py / alert_store.py / pii_sanitizer.py live in cloud-monitoring/
+sys.path.insert(0, str(Path(__file__).resolve().parent / "cloud-monitoring"))
+
+from alert_handler import HL7AlertHandler  # noqa: E402
+from alert_store import open_sink  # noqa: E402
+from pii_sanitizer import sanitize_hl7  # noqa: E402
+
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_LOG_PATH = Path("logs/received_message.hl7")
+PERSIST_BATCH = 256
+STAGES = ("parse", "alert", "persist")
+ACK_CODES = (ACCEPT, ERROR, REJECT)
+
+RECEIVED = REGISTRY.counter("hl7_messages_received_total", "HL7 messages received")
+STAGE_SECONDS = REGISTRY.histogram("hl7_stage_seconds", "Time per message in each stage (persist: per batch)",
+                                   ("stage",))
+MESSAGE_SECONDS = REGISTRY.histogram("hl7_message_seconds", "Receive to persisted, per message")
+ERRORS = REGISTRY.counter("hl7_errors_total", "Messages that failed, by stage", ("stage",))
+ACKS = REGISTRY.counter("hl7_acks_total", "ACKs sent, by acknowledgment code", ("code",))
+QUEUE_DEPTH = REGISTRY.gauge("hl7_queue_depth", "Messages waiting in each stage queue", ("stage",))
+DUPLICATES = REGISTRY.counter("hl7_duplicates_total", "Retransmitted copies dropped by the dedup cache")
+
+
+def _parse_job(raw):
+    """Process-pool entry point (module level so it pickles)."""
+    return parse_message(raw)
+
+
+class IngestPipeline:
+    def __init__(self, parse_workers=1, alert_workers=1, persist_workers=1, parse_processes=0,
+                 queue_size=DEFAULT_QUEUE_SIZE, log_path=DEFAULT_LOG_PATH, alert_sink=None,
+                 alert_handler=None, wal=None, dedup=None):
+        """
+        parse_processes: 0 parses in the event loop; N > 0 uses a pool of N
+            processes (give parse_workers >= N so the pool is kept busy)
+        alert_sink: object with write(alert)/flush()/close() (alert_store sinks)
+        wal: hl7_wal.WriteAheadLog; required for receive() (ACK mode)
+        dedup: hl7_dedup.DedupCache; copies are dropped (and still ACKed)
+        """
+        self.workers = {"parse": parse_workers, "alert": alert_workers, "persist": persist_workers}
+        self.parse_processes = parse_processes
+        self.queue_size = queue_size
+        self.log_path = Path(log_path) if log_path else None
+        self.alert_sink = alert_sink
+        # sinks that aren't thread-safe (jsonl, sqlite, correlator) are used by one persist thread at a time
+        self._sink_lock = (contextlib.nullcontext() if getattr(alert_sink, "thread_safe", False)
+                           else threading.Lock())
+        self.alert_handler = alert_handler or HL7AlertHandler()
+        self.wal = wal
+        self.dedup = dedup
+        self._inflight = {}  # dedup key -> future resolved when its message is stored (or failed)
+        self.queues = {}
+        self.high_water = dict.fromkeys(STAGES, 0)
+        self.counts = dict.fromkeys(("received", "replayed") + STAGES + ("alerts", "errors", "duplicates")
+                                    + ACK_CODES, 0)
+        self._tasks = {}
+        self._pool = None
+        self._log = None
+
+    # -------------------- lifecycle --------------------
+    async def start(self):
+        if self.wal is not None:
+            await self.wal.start()
+        self.queues = {stage: asyncio.Queue(maxsize=self.queue_size) for stage in STAGES}
+        for stage, q in self.queues.items():
+            QUEUE_DEPTH.set_function(q.qsize, stage)
+        if self.parse_processes:
+            # multiprocessing is ~20 ms of imports; only --parse-processes needs it
+            from concurrent.futures import ProcessPoolExecutor
+            self._pool = ProcessPoolExecutor(self.parse_processes)
+        if self.log_path:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            self._log = self.log_path.open("ab")
+        runners = {"parse": self._parse_worker, "alert": self._alert_worker, "persist": self._persist_worker}
+        self._tasks = {stage: [asyncio.create_task(runners[stage]()) for _ in range(self.workers[stage])]
+                       for stage in STAGES}
+        if self.wal is not None:
+            await self._replay()
+        return self
+
+    async def _replay(self):
+        """Feed the WAL's pending records (ACKed before a stop or crash) to the parse stage."""
+        async for raw, position in self.wal.replay():
+            self.counts["replayed"] += 1
+            if self.dedup is not None:
+                # a sender that missed the ACK will retransmit it: that copy is a duplicate
+                try:
+                    self.dedup.remember(dedup_key(parse_header(raw)))
+                except Exception:
+                    pass  # the parse stage reports it
+            await self._enqueue(raw, None, None, time.perf_counter(), position)
+        if self.counts["replayed"]:
+            logging.info(f"Replayed {self.counts['replayed']} message(s) from the WAL")
+
+    async def stop(self):
+        """Drain every queue in stage order, then release the pool and files."""
+        for stage in STAGES:
+            for _ in self._tasks.get(stage, ()):
+                await self.queues[stage].put(None)
+            await asyncio.gather(*self._tasks.get(stage, ()))
+        self._tasks = {}
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        if self.alert_sink is not None:
+            self.alert_sink.close()
+        if self.dedup is not None:
+            self.dedup.close()
+        if self.wal is not None:
+            await self.wal.close()
+
+    # -------------------- receive --------------------
+    async def submit(self, message, peer=None, parsed=None):
+        """
+        MLLPServer handler: enqueue one raw frame (blocks while parse is full).
+        `parsed` (a Message already built for it) lets the parse stage skip it.
+        """
+        received = time.perf_counter()
+        key = None
+        if self.dedup is not None:
+            try:
+                head = parsed or parse_header(message)
+            except Exception:
+                head = None  # the parse stage reports it
+            key = dedup_key(head) if head is not None else None
+            if await self._is_copy(key):
+                return
+        self._begin(key)
+        stored = False
+        try:
+            await self._enqueue(message, peer, parsed, received, None)
+            stored = True
+        finally:
+            self._end(key, stored)
+
+    async def _enqueue(self, message, peer, parsed, received, position):
+        """position: the message's WAL position (None without a WAL), marked done once persisted."""
+        self.counts["received"] += 1
+        RECEIVED.inc()
+        await self._put("parse", (message, peer, parsed, received, position))
+
+    async def _is_copy(self, key):
+        """True for a retransmission of a message that was stored; counts it."""
+        if key is None:
+            return False
+        # an earlier copy is still being stored: its outcome decides
+        while (pending := self._inflight.get(key)) is not None:
+            await pending
+        if self.dedup.seen(key):
+            self.counts["duplicates"] += 1
+            DUPLICATES.inc()
+            return True
+        return False
+
+    def _begin(self, key):
+        if key is not None:
+            self._inflight[key] = asyncio.get_running_loop().create_future()
+
+    def _end(self, key, stored):
+        """Remember the key only if its message was stored, then release waiting copies."""
+        if key is None:
+            return
+        if stored:
+            self.dedup.remember(key)
+        self._inflight.pop(key).set_result(None)
+
+    async def receive(self, message, peer=None):
+        """
+        MLLPServer handler in ACK mode: log durably, enqueue, return the
+        framed ACK. Never raises, so every message gets an answer.
+        """
+        received = time.perf_counter()
+        # the MSH is all the ACK needs; the full parse is left to the parse stage (and its pool)
+        try:
+            parsed = parse_header(message)
+            header = parsed.header()
+        except Exception:
+            parsed = header = None
+        if header is None:
+            self.counts[REJECT] += 1
+            ACKS.labels(REJECT).inc()
+            return frame(build_ack(parsed if parsed is not None else message, REJECT, "No MSH segment"))
+        key = dedup_key(parsed) if self.dedup is not None else None
+        if await self._is_copy(key):
+            # its original is in the WAL; the sender just missed our ACK
+            self.counts[ACCEPT] += 1
+            ACKS.labels(ACCEPT).inc()
+            return frame(build_ack(parsed, ACCEPT))
+        self._begin(key)
+        stored = False
+        try:
+            position = await self.wal.append(message)
+            stored = True
+        except Exception as e:
+            logging.error(f"WAL append failed for message from {peer}: {e}")
+            self.counts[ERROR] += 1
+            ACKS.labels(ERROR).inc()
+            return frame(build_ack(parsed, ERROR, "Message could not be stored"))
+        finally:
+            self._end(key, stored)
+        STAGE_SECONDS.labels("receive").observe(time.perf_counter() - received)
+        await self._enqueue(message, peer, None, received, position)
+        self.counts[ACCEPT] += 1
+        ACKS.labels(ACCEPT).inc()
+        return frame(build_ack(parsed, ACCEPT))
+
+    async def _put(self, stage, item):
+        queue = self.queues[stage]
+        await queue.put(item)
+        depth = queue.qsize()
+        if depth > self.high_water[stage]:
+            self.high_water[stage] = depth
+
+    # -------------------- stages --------------------
+    async def _parse_worker(self):
+        queue = self.queues["parse"]
+        loop = asyncio.get_running_loop()
+        timer = STAGE_SECONDS.labels("parse")
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            raw, peer, message, received, position = item
+            if message is None:
+                t0 = time.perf_counter()
+                try:
+                    if self._pool is not None:
+                        message = await loop.run_in_executor(self._pool, _parse_job, raw)
+                    else:
+                        message = parse_message(raw)
+                except Exception:
+                    self.counts["errors"] += 1
+                    ERRORS.labels("parse").inc()
+                    logging.exception(f"HL7 parse failed for message from {peer}")
+                    self._done(position)
+                    continue
+                timer.observe(time.perf_counter() - t0)
+            self.counts["parse"] += 1
+            await self._put("alert", (raw, peer, message, received, position))
+
+    async def _alert_worker(self):
+        queue = self.queues["alert"]
+        timer = STAGE_SECONDS.labels("alert")
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            raw, peer, message, received, position = item
+            t0 = time.perf_counter()
+            try:
+                alerts = self.alert_handler.analyze_hl7(message)
+            except Exception:
+                self.counts["errors"] += 1
+                ERRORS.labels("alert").inc()
+                logging.exception(f"Alert evaluation failed for message from {peer}")
+                alerts = []
+            timer.observe(time.perf_counter() - t0)
+            self.counts["alert"] += 1
+            await self._put("persist", (raw, peer, message, alerts, received, position))
+
+    async def _persist_worker(self):
+        queue = self.queues["persist"]
+        timer = STAGE_SECONDS.labels("persist")
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < PERSIST_BATCH and not queue.empty():
+                item = queue.get_nowait()
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            t0 = time.perf_counter()
+            try:
+                alerts = await asyncio.to_thread(self._persist, batch)
+            except Exception:
+                self.counts["errors"] += len(batch)
+                ERRORS.labels("persist").inc(len(batch))
+                logging.exception(f"Persisting {len(batch)} message(s) failed; any in the WAL are retried on restart")
+            else:
+                done = time.perf_counter()
+                timer.observe(done - t0)
+                self.counts["alerts"] += alerts
+                self.counts["persist"] += len(batch)
+                for *_, received, position in batch:
+                    MESSAGE_SECONDS.observe(done - received)
+                    self._done(position)
+            if stop:
+                return
+
+    def _persist(self, batch):
+        """Runs in a worker thread; returns the number of alerts written."""
+        chunks = []
+        per_message = []
+        for raw, peer, message, alerts, _, _ in batch:
+            buf = bytearray(raw)
+            sanitize_hl7(buf)
+            chunks.append(buf)
+            per_message.append((message, [dict(alert, control_id=message.control_id,
+                                               peer=f"{peer[0]}:{peer[1]}" if peer else None)
+                                          for alert in alerts]))
+        if self._log is not None:
+            chunks.append(b"")
+            self._log.write(b"\n\n".join(chunks))
+            self._log.flush()
+        if self.alert_sink is None:
+            for _, alerts in per_message:
+                for alert in alerts:
+                    logging.warning(f"{alert['severity']} {alert['type']} (MSH-10 {alert['control_id']})")
+        else:
+            # database sinks (alert_db) also link each alert to the message's patient
+            write_message = getattr(self.alert_sink, "write_message", None)
+            with self._sink_lock:
+                for message, alerts in per_message:
+                    if write_message is not None:
+                        write_message(message, alerts)
+                    else:
+                        for alert in alerts:
+                            self.alert_sink.write(alert)
+                self.alert_sink.flush()
+        return sum(len(alerts) for _, alerts in per_message)
+
+    def _done(self, position):
+        if position is not None:
+            self.wal.done(position)
+
+    # -------------------- observability --------------------
+    def stats(self):
+        """Queue depth/high-water per stage plus processed counts."""
+        return {
+            "queues": {stage: {"depth": self.queues[stage].qsize() if self.queues else 0,
+                               "high_water": self.high_water[stage],
+                               "maxsize": self.queue_size,
+                               "workers": self.workers[stage]}
+                       for stage in STAGES},
+            "counts": dict(self.counts),
+            "wal": {"records": self.wal.records, "groups": self.wal.groups, "pending": self.wal.pending,
+                    "pruned_segments": self.wal.pruned} if self.wal else None,
+            "dedup": self.dedup.stats() if self.dedup else None,
+        }
+
+
+async def serve(pipeline, host="127.0.0.1", port=2575, stats_interval=0.0, **server_kwargs):
+    """Run an MLLPServer feeding `pipeline` until cancelled."""
+    await pipeline.start()
+    if pipeline.wal is not None:
+        server = MLLPServer(pipeline.receive, host, port, pipelined=True, **server_kwargs)
+    else:
+        server = MLLPServer(pipeline.submit, host, port, **server_kwargs)
+    await server.start()
+    print(f"HL7 ingest pipeline listening on {host}:{server.port} "
+          f"(workers {pipeline.workers}, parse processes {pipeline.parse_processes})")
+    reporter = None
+    if stats_interval:
+        async def _report():
+            while True:
+                await asyncio.sleep(stats_interval)
+                logging.info(f"ingest stats {json.dumps(pipeline.stats())}")
+        reporter = asyncio.create_task(_report())
+    try:
+        await server.serve_forever()
+    finally:
+        if reporter:
+            reporter.cancel()
+        await server.close()
+        await pipeline.stop()
+        print(f"Pipeline stopped: {json.dumps(pipeline.stats()['counts'])}")
+
+
+def add_pipeline_arguments(parser):
+    parser.add_argument("--parse-workers", type=int, default=1)
+    parser.add_argument("--alert-workers", type=int, default=1)
+    parser.add_argument("--persist-workers", type=int, default=1)
+    parser.add_argument("--parse-processes", type=int, default=0,
+                        help="Parse in a pool of N processes (0 = in the event loop)")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="Bound of each stage queue")
+    parser.add_argument("--alert-store", default=None,
+                        help="jsonl[:dir], sqlite[:path] or db:<url> for alerts (default: log them)")
+    parser.add_argument("--correlate", action="store_true",
+                        help="Group alert storms into incidents before the alert store")
+    parser.add_argument("--topology", help="JSON device_id -> {ward, subnet, device_type} (with --correlate)")
+    parser.add_argument("--stats-interval", type=float, default=0.0,
+                        help="Log queue depths every N seconds (0 = off)")
+    parser.add_argument("--wal", default=str(DEFAULT_WAL_DIR), help="Write-ahead log directory")
+    parser.add_argument("--wal-keep-segments", type=int, default=0,
+                        help="Fully persisted WAL segments to keep (older ones are deleted: they hold PHI)")
+    parser.add_argument("--no-ack", action="store_true",
+                        help="Don't log to the WAL or send ACKs (fire-and-forget senders)")
+    add_dedup_arguments(parser)
+    add_metrics_arguments(parser)
+
+
+def pipeline_from_args(args):
+    sink = open_sink(args.alert_store) if args.alert_store else None
+    if sink is not None and args.correlate:
+        from alert_correlator import AlertCorrelator, CorrelatingSink, Topology
+        topology = Topology.load(args.topology) if args.topology else Topology()
+        sink = CorrelatingSink(sink, AlertCorrelator(topology))
+    return IngestPipeline(args.parse_workers, args.alert_workers, args.persist_workers,
+                          args.parse_processes, args.queue_size, alert_sink=sink,
+                          wal=None if args.no_ack else WriteAheadLog(args.wal, keep_segments=args.wal_keep_segments),
+                          dedup=dedup_from_args(args))
+
+
+def run_pipeline(args, host="127.0.0.1", port=2575):
+    start_exporters(args)
+    try:
+        asyncio.run(serve(pipeline_from_args(args), host, port, args.stats_interval))
+    except KeyboardInterrupt:
+        print("\nIngest pipeline stopped by user.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Staged HL7 ingest: receive -> parse -> alert -> persist")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2575)
+    add_pipeline_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    run_pipeline(args, args.host, args.port)
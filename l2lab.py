@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+l2lab.py
+One entry point for the lab's tools.
+
+  python l2lab.py <command> [options]
+
+Each command runs the existing script as if started directly (same
+options, same working-directory files), so `l2lab.py scan --workers 8`
+is `alert_scanner.py --workers 8`. Only the chosen script is loaded, and
+the scripts themselves import heavy or optional packages (hl7, numpy,
+boto3, sqlite3, http.server, the alert handler) where they are first
+used, so a scan or a one-shot monitor starts in well under 100 ms of
+imports. benchmarks/bench_cold_start.py checks that budget with
+-X importtime.
+
+Usage:
+  python l2lab.py scan monitoring.log
+  python l2lab.py monitor --once --threshold 12
+  python l2lab.py listen --port 2575 --async
+  python l2lab.py simulate-devices --cloudwatch-stub
+  python l2lab.py --list
+"""
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+MONITORING = ROOT / "cloud-monitoring"
+
+# command -> (script, one-line description)
+COMMANDS = {
+    "scan": (ROOT / "alert_scanner.py", "Extract WARN/ERROR alerts from monitoring.log"),
+    "analyze": (ROOT / "log_analytics.py", "Sharded scan of multi-GB logs"),
+    "monitor": (MONITORING / "cloud-monitoring.py", "Heartbeat staleness monitor"),
+    "listen": (ROOT / "hl7_listener.py", "MLLP listener"),
+    "pipeline": (ROOT / "ingest_pipeline.py", "Staged ingest pipeline with ACKs and WAL"),
+    "send": (ROOT / "send_hl7.py", "Send HL7 messages over MLLP"),
+    "sanitize": (MONITORING / "pii_sanitizer.py", "Mask PHI in log lines"),
+    "dedup": (ROOT / "hl7_dedup.py", "Count retransmitted copies in a capture"),
+    "db": (MONITORING / "alert_db.py", "Patient/alert database (init, load, day6)"),
+    "archive": (MONITORING / "heartbeat_archive.py", "Heartbeat archive tools"),
+    "simulate-devices": (MONITORING / "device_simulator.py", "Device heartbeat simulator"),
+    "simulate-dialysis": (MONITORING / "dialysis_hl7_simulator.py", "Dialysis HL7 message simulator"),
+    "load": (MONITORING / "load_generator.py", "Heartbeat load generator"),
+}
+
+
+def usage():
+    lines = ["usage: l2lab.py <command> [options]   (l2lab.py <command> --help for its options)", "", "commands:"]
+    lines += [f"  {name:<18} {description}" for name, (_, description) in COMMANDS.items()]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ("-h", "--help", "--list"):
+        print(usage())
+        return 0
+    command, rest = argv[0], argv[1:]
+    if command not in COMMANDS:
+        print(f"l2lab.py: unknown command {command!r}\n\n{usage()}", file=sys.stderr)
+        return 2
+    script = COMMANDS[command][0]
+    # what `python <script>` would set up: its directory first on the path, its own argv
+    sys.path.insert(0, str(script.parent))
+    sys.argv = [str(script)] + rest
+    import runpy
+    runpy.run_path(str(script), run_name="__main__")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
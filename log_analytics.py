@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+log_analytics.py
+Multi-core scan of large monitoring/heartbeat logs.
+
+The file is cut into byte ranges whose edges are moved forward to the next
+newline, so every line belongs to exactly one chunk. A process pool scans
+the chunks; each worker parses lines with precompiled (bytes) regexes,
+streams its alerts to a part file as JSON lines, and returns its counts.
+The parent then concatenates the part files in file order into one JSONL
+output and sums the counts per level and per device. Workers share
+nothing, so throughput grows with the number of cores until the disk
+becomes the limit.
+
+Formats (auto-detected from the first line):
+  monitoring  "[YYYY-MM-DD HH:MM:SS] LEVEL - message" (monitoring.log);
+              alerts are lines containing WARN or ERROR, as in alert_scanner
+  heartbeats  device_heartbeats.log JSON lines; alerts are status ERROR
+
+Usage:
+  python log_analytics.py monitoring.log --out alerts.jsonl
+  python log_analytics.py device_heartbeats.log --workers 8 --summary summary.json
+  python log_analytics.py monitoring.log --check-parity   # same alerts as alert_scanner?
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+READ_BLOCK = 8 * 1024 * 1024
+CHUNKS_PER_WORKER = 4
+
+MONITORING_DEVICE_RE = re.compile(rb"(?:\bfrom |\bdevice(?:_id)?[=: ]\s*)([\w.:-]+)")
+HEARTBEAT_FIELDS = {
+    name: re.compile(rb'"' + name.encode() + rb'":\s*"((?:[^"\\]|\\.)*)"')
+    for name in ("ts", "device_id", "status", "reason")
+}
+
+
+# -------------------- line parsers --------------------
+# Parsers return (alert as a JSON string or None, level, device or None);
+# level and device stay bytes until the parent merges the counts. Alerts
+# are formatted like json.dumps(dict) but without building the dict.
+_quote = json.encoder.encode_basestring_ascii
+
+
+def _text(value):
+    return _quote(value.decode("utf-8", "replace"))
+
+
+def _json_str(value):
+    # value was captured from inside a JSON string: already escaped
+    return '"' + value.decode("utf-8", "replace") + '"'
+
+
+def split_monitoring_line(line):
+    """
+    (timestamp, level, message), sliced exactly like
+    alert_scanner.parse_alert_line (so both paths agree on malformed
+    lines); None where that falls back to UNKNOWN.
+    """
+    ts_end = line.find(b"]")
+    if ts_end < 0:
+        return None
+    level, sep, message = line[ts_end + 2:].partition(b" - ")
+    if not sep:
+        return None
+    return line[1:ts_end], level.strip(), message
+
+
+def parse_monitoring_line(line):
+    """
+    Same fields and fallbacks as alert_scanner: unparseable WARN/ERROR
+    lines become level UNKNOWN with the whole line as message.
+    """
+    m = split_monitoring_line(line)
+    level = m[1] if m else b"UNKNOWN"
+    device = None
+    if b"from " in line or b"device" in line:
+        d = MONITORING_DEVICE_RE.search(line)
+        if d:
+            device = d.group(1)
+    if b"WARN" not in line and b"ERROR" not in line:
+        return None, level, device
+    if m:
+        alert = (f'{{"timestamp": {_text(m[0])}, "level": {_text(level)}, '
+                 f'"message": {_text(m[2])}}}')
+    else:
+        alert = f'{{"timestamp": "", "level": "UNKNOWN", "message": {_text(line)}}}'
+    return alert, level, device
+
+
+def parse_heartbeat_line(line):
+    """device_heartbeats.log line, matched with regexes instead of json.loads."""
+    status = HEARTBEAT_FIELDS["status"].search(line)
+    device = HEARTBEAT_FIELDS["device_id"].search(line)
+    if status is None or device is None:
+        return None, b"INVALID", None
+    level = status.group(1)
+    device_id = device.group(1)
+    if level != b"ERROR":
+        return None, level, device_id
+    ts = HEARTBEAT_FIELDS["ts"].search(line)
+    reason = HEARTBEAT_FIELDS["reason"].search(line)
+    ts = _json_str(ts.group(1)) if ts else "null"
+    reason = _json_str(reason.group(1)) if reason else '"unknown"'
+    alert = f'{{"ts": {ts}, "device_id": {_json_str(device_id)}, "status": "ERROR", "reason": {reason}}}'
+    return alert, level, device_id
+
+
+PARSERS = {"monitoring": parse_monitoring_line, "heartbeats": parse_heartbeat_line}
+
+
+def check_parity(path):
+    """Lines of a monitoring log where this parser and alert_scanner's disagree."""
+    from alert_scanner import parse_alert_line
+
+    mismatches = []
+    with open(path, "rb") as fh:
+        for number, raw in enumerate(fh, 1):
+            line = raw.strip()
+            if not line:
+                continue
+            alert = parse_monitoring_line(line)[0]
+            expected = parse_alert_line(line.decode("utf-8", "replace"))
+            if (json.loads(alert) if alert else None) != expected:
+                mismatches.append((number, line.decode("utf-8", "replace")))
+    return mismatches
+
+
+def detect_format(path):
+    with open(path, "rb") as fh:
+        for line in fh:
+            line = line.strip()
+            if line:
+                return "heartbeats" if line.startswith(b"{") else "monitoring"
+    return "monitoring"
+
+
+# -------------------- sharding --------------------
+def chunk_ranges(path, chunks):
+    """(start, end) byte ranges covering the file, each ending just after a newline."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    step = max(1, size // max(1, chunks))
+    edges = [0]
+    with open(path, "rb") as fh:
+        pos = step
+        while pos < size:
+            fh.seek(pos - 1)
+            fh.readline()  # finish the line that straddles the cut
+            edge = fh.tell()
+            if edge >= size:
+                break
+            if edge > edges[-1]:
+                edges.append(edge)
+            pos = max(edge, pos) + step
+    edges.append(size)
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def _lines_in_range(fh, start, end):
+    fh.seek(start)
+    remaining = end - start
+    carry = b""
+    while remaining > 0:
+        block = fh.read(min(READ_BLOCK, remaining))
+        if not block:
+            break
+        remaining -= len(block)
+        lines = (carry + block).split(b"\n")
+        carry = lines.pop()
+        yield from lines
+    if carry:
+        yield carry
+
+
+def scan_chunk(job):
+    """Process-pool worker: (path, start, end, fmt, part_path) -> counts."""
+    path, start, end, fmt, part_path = job
+    parse = PARSERS[fmt]
+    levels = Counter()
+    devices = Counter()
+    lines = alerts = 0
+    with open(path, "rb") as fh, open(part_path, "w", encoding="utf-8") as out:
+        buffer = []
+        for line in _lines_in_range(fh, start, end):
+            line = line.strip()
+            if not line:
+                continue
+            lines += 1
+            alert, level, device = parse(line)
+            levels[level] += 1
+            if device is not None:
+                devices[(device, level)] += 1
+            if alert is not None:
+                alerts += 1
+                buffer.append(alert)
+                if len(buffer) >= 1000:
+                    out.write("\n".join(buffer) + "\n")
+                    buffer.clear()
+        if buffer:
+            out.write("\n".join(buffer) + "\n")
+    return {"lines": lines, "alerts": alerts, "levels": levels, "devices": devices}
+
+
+# -------------------- driver --------------------
+def analyze(path, out_path="alerts.jsonl", workers=None, fmt=None, chunks=None):
+    """Scan `path` in parallel, write alerts to `out_path` (JSONL), return merged counts."""
+    path = str(path)
+    fmt = fmt or detect_format(path)
+    workers = workers or os.cpu_count() or 1
+    ranges = chunk_ranges(path, chunks or workers * CHUNKS_PER_WORKER)
+    out_path = Path(out_path)
+    t0 = time.perf_counter()
+
+    with tempfile.TemporaryDirectory(dir=out_path.resolve().parent, prefix=".scan-") as tmp:
+        jobs = [(path, start, end, fmt, os.path.join(tmp, f"part-{i:05d}.jsonl"))
+                for i, (start, end) in enumerate(ranges)]
+        if workers == 1 or len(jobs) <= 1:
+            results = [scan_chunk(job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(workers) as pool:
+                results = list(pool.map(scan_chunk, jobs))
+        # parts are concatenated in file order -> same order as a serial scan
+        with out_path.open("wb") as out:
+            for job in jobs:
+                with open(job[4], "rb") as part:
+                    shutil.copyfileobj(part, out)
+
+    levels, devices = Counter(), Counter()
+    for r in results:
+        levels.update(r["levels"])
+        devices.update(r["devices"])
+    levels = Counter({level.decode("utf-8", "replace"): n for level, n in levels.items()})
+    by_device = {}
+    for (device, level), n in sorted(devices.items()):
+        by_device.setdefault(device.decode("utf-8", "replace"), {})[level.decode("utf-8", "replace")] = n
+    elapsed = time.perf_counter() - t0
+    return {
+        "file": path,
+        "format": fmt,
+        "bytes": os.path.getsize(path),
+        "chunks": len(ranges),
+        "workers": workers,
+        "lines": sum(r["lines"] for r in results),
+        "alerts": sum(r["alerts"] for r in results),
+        "levels": dict(levels.most_common()),
+        "devices": by_device,
+        "elapsed_s": round(elapsed, 3),
+        "output": str(out_path),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded multi-core log scan (alerts to JSONL + counts)")
+    parser.add_argument("path", help="monitoring.log or device_heartbeats.log style file")
+    parser.add_argument("--format", choices=sorted(PARSERS), help="Default: detect from the first line")
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: CPU count)")
+    parser.add_argument("--chunks", type=int, default=None, help="Byte-range chunks (default: 4 per worker)")
+    parser.add_argument("--out", default="alerts.jsonl", help="Alerts output (JSON lines)")
+    parser.add_argument("--summary", help="Also write the merged counts here as JSON")
+    parser.add_argument("--check-parity", action="store_true",
+                        help="Compare every line with alert_scanner's parser instead of scanning")
+    args = parser.parse_args()
+
+    if not Path(args.path).exists():
+        print(f"{args.path} not found.")
+        sys.exit(1)
+    if args.check_parity:
+        mismatches = check_parity(args.path)
+        for number, line in mismatches[:20]:
+            print(f"  line {number}: {line}")
+        print(f"{len(mismatches)} line(s) parsed differently from alert_scanner")
+        sys.exit(1 if mismatches else 0)
+    summary = analyze(args.path, args.out, args.workers, args.format, args.chunks)
+    print(f"{summary['lines']} line(s), {summary['alerts']} alert(s) in {summary['elapsed_s']}s "
+          f"({summary['workers']} worker(s), {summary['chunks']} chunk(s)) -> {summary['output']}")
+    for level, n in summary["levels"].items():
+        print(f"  {level:<10} {n}")
+    print(f"  {len(summary['devices'])} device(s)")
+    if args.summary:
+        Path(args.summary).write_text(json.dumps(summary, indent=2), encoding="utf-8")
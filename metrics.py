@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+metrics.py
+In-process metrics: counters, gauges and HDR-style latency histograms.
+
+  REGISTRY.counter("hl7_messages_received_total", "Frames received").inc()
+  PARSE = REGISTRY.histogram("hl7_stage_seconds", "Time per stage", ("stage",))
+  PARSE.labels("parse").observe(elapsed)
+
+Histograms keep log-linear buckets like HdrHistogram: values are recorded
+in microseconds, exact below 128 us and within 1/64 (1.6 %) above, from
+1 us to ~19 hours, in a flat list of counts. observe() is a handful of
+integer operations, so timing every message costs well under a
+microsecond. Quantiles (p50/p90/p99/max) come from the buckets.
+
+Metrics are read in two ways:
+  serve_http(port)         GET /metrics in the Prometheus text format
+                           (histograms as cumulative _bucket{le=...} at
+                           PROMETHEUS_BUCKETS plus _sum and _count)
+  start_log_thread(30)     one structured line every N seconds:
+                           "metrics {json}" with counters, gauges and
+                           histogram count/mean/quantiles
+
+Updates are plain attribute writes and are meant to come from one thread
+(the event loop); the HTTP and log threads only read.
+
+Usage:
+  python ingest_pipeline.py --port 2575 --metrics-port 9108 --metrics-interval 30
+  curl -s localhost:9108/metrics
+"""
+
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+SUB_BITS = 7  # 2**SUB_BITS sub-buckets per power of two
+_SUB = 1 << SUB_BITS
+_HALF = _SUB >> 1
+MAX_MICROS = (1 << 36) - 1
+PROMETHEUS_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                      0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def _bucket_index(micros):
+    if micros < _SUB:
+        return micros
+    shift = micros.bit_length() - SUB_BITS
+    return _SUB + (shift - 1) * _HALF + (micros >> shift) - _HALF
+
+
+def _bucket_upper(index):
+    """Largest value (us) recorded into bucket `index`."""
+    if index < _SUB:
+        return index
+    shift, sub = divmod(index - _SUB, _HALF)
+    shift += 1
+    return ((sub + _HALF + 1) << shift) - 1
+
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+# -------------------- metric types --------------------
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class _CallbackValue:
+    __slots__ = ("fn",)
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    @property
+    def value(self):
+        return self.fn()
+
+
+class HistogramValue:
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (_bucket_index(MAX_MICROS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        micros = int(seconds * 1e6)
+        if micros < _SUB:
+            self.counts[micros if micros > 0 else 0] += 1
+        else:
+            if micros > MAX_MICROS:
+                micros = MAX_MICROS
+            shift = micros.bit_length() - SUB_BITS
+            self.counts[_SUB + (shift - 1) * _HALF + (micros >> shift) - _HALF] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @contextmanager
+    def time(self):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0)
+
+    def quantile(self, q):
+        """Upper bound (seconds) of the bucket holding the q-th value."""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            if n:
+                seen += n
+                if seen >= rank:
+                    return min(_bucket_upper(index) / 1e6, self.max)
+        return self.max
+
+    def cumulative(self, bounds):
+        """Counts at or below each bound (seconds), for Prometheus buckets."""
+        out = []
+        seen = 0
+        index = 0
+        counts = self.counts
+        for bound in bounds:
+            limit = int(bound * 1e6)
+            while index < len(counts) and _bucket_upper(index) <= limit:
+                seen += counts[index]
+                index += 1
+            out.append(seen)
+        return out
+
+    def summary(self):
+        out = {"count": self.count,
+               "mean_ms": round(self.sum / self.count * 1000, 3) if self.count else 0.0}
+        for q in QUANTILES:
+            out[f"p{int(q * 100)}_ms"] = round(self.quantile(q) * 1000, 3)
+        out["max_ms"] = round(self.max * 1000, 3)
+        return out
+
+
+class Metric:
+    kind = None
+    value_type = _Value
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        if not self.labelnames:
+            self._default = self._children[()] = self.value_type()
+
+    def labels(self, *values):
+        """Child for these label values (positional, in labelnames order)."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[values] = self.value_type()
+        return child
+
+    def children(self):
+        return list(self._children.items())
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1):
+        self._default.value += amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value):
+        self._default.value = value
+
+    def inc(self, amount=1):
+        self._default.value += amount
+
+    def dec(self, amount=1):
+        self._default.value -= amount
+
+    def set_function(self, fn, *values):
+        """Read the value from fn() at collection time (e.g. a queue depth)."""
+        self._children[values] = _CallbackValue(fn)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+    value_type = HistogramValue
+
+    def observe(self, seconds):
+        self._default.observe(seconds)
+
+    def time(self):
+        return self._default.time()
+
+
+# -------------------- registry --------------------
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, labelnames):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labelnames)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"metric {name} already registered as {metric.kind} {metric.labelnames}")
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._get(Counter, name, help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._get(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=()):
+        return self._get(Histogram, name, help_text, labelnames)
+
+    def render(self):
+        """Prometheus text exposition format 0.0.4."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for values, child in metric.children():
+                if metric.kind != "histogram":
+                    lines.append(f"{metric.name}{_label_text(metric.labelnames, values)} {child.value}")
+                    continue
+                for bound, n in zip(PROMETHEUS_BUCKETS, child.cumulative(PROMETHEUS_BUCKETS)):
+                    labels = _label_text(metric.labelnames, values, [("le", bound)])
+                    lines.append(f"{metric.name}_bucket{labels} {n}")
+                labels = _label_text(metric.labelnames, values, [("le", "+Inf")])
+                lines.append(f"{metric.name}_bucket{labels} {child.count}")
+                labels = _label_text(metric.labelnames, values)
+                lines.append(f"{metric.name}_sum{labels} {child.sum}")
+                lines.append(f"{metric.name}_count{labels} {child.count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """{name: value, or {label values joined by ',': value}}; histograms summarized."""
+        out = {}
+        for metric in list(self._metrics.values()):
+            values = {}
+            for labels, child in metric.children():
+                values[",".join(map(str, labels))] = child.summary() if metric.kind == "histogram" else child.value
+            out[metric.name] = values.get("", values) if not metric.labelnames else values
+        return out
+
+
+REGISTRY = Registry()
+
+
+# -------------------- exporters --------------------
+def serve_http(port, host="0.0.0.0", registry=REGISTRY):
+    """Prometheus scrape endpoint on a daemon thread; returns the server."""
+    # imported here: http.server costs ~30 ms at startup and is rarely enabled
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # scrapes every few seconds would flood the log
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def start_log_thread(interval, registry=REGISTRY, logger=None):
+    """Log "metrics {json}" every `interval` seconds; set() the returned Event to stop."""
+    logger = logger or logging.getLogger("metrics")
+    stop = threading.Event()
+
+    def _run():
+        while not stop.wait(interval):
+            logger.info("metrics %s", json.dumps(registry.snapshot(), separators=(",", ":")))
+
+    threading.Thread(target=_run, name="metrics-log", daemon=True).start()
+    return stop
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="Serve Prometheus metrics on this port (0 = off)")
+    parser.add_argument("--metrics-interval", type=float, default=0.0,
+                        help="Log a metrics line every N seconds (0 = off)")
+
+
+def start_exporters(args, registry=REGISTRY):
+    if args.metrics_port:
+        serve_http(args.metrics_port, registry=registry)
+        logging.info(f"Prometheus metrics on :{args.metrics_port}/metrics")
+    if args.metrics_interval:
+        start_log_thread(args.metrics_interval, registry)
+
+
+if __name__ == "__main__":
+    # overhead check: cost of one counter inc and one histogram observe
+    hist = REGISTRY.histogram("demo_seconds", "demo")
+    count = REGISTRY.counter("demo_total", "demo")
+    n = 1_000_000
+    t0 = time.perf_counter()
+    for i in range(n):
+        count.inc()
+    t1 = time.perf_counter()
+    for i in range(n):
+        hist.observe(i * 1e-7)
+    t2 = time.perf_counter()
+    print(f"counter.inc {(t1 - t0) / n * 1e9:.0f} ns, histogram.observe {(t2 - t1) / n * 1e9:.0f} ns")
+    print(json.dumps(REGISTRY.snapshot()["demo_seconds"]))
+    print(REGISTRY.render())
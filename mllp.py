@@ -0,0 +1,106 @@
+"""
+mllp.py
+MLLP framing shared by the listener, the async server and the clients.
+
+  <VT> message <FS><CR>
+
+FrameDecoder is incremental: feed() it whatever recv() returned and iterate
+it for complete frames. Frames come back as memoryview slices of the
+decoder's own bytearray, with no intermediate copies. Once a frame has been
+handed out the decoder never resizes that buffer again -- the next feed()
+moves the (partial-frame) tail into a fresh one -- so views stay valid for as
+long as the caller keeps them.
+"""
+
+START_BLOCK = b"\x0b"
+END_BLOCK = b"\x1c\x0d"
+
+DEFAULT_MAX_FRAME = 1024 * 1024
+
+
+def frame(message):
+    """Wrap one HL7 message (str or bytes) in MLLP start/end blocks."""
+    if isinstance(message, str):
+        message = message.encode("utf-8")
+    return b"".join((START_BLOCK, message, END_BLOCK))
+
+
+class FrameDecoder:
+    """
+    Streaming MLLP decoder over a growing bytearray.
+
+    - bytes before a start block are skipped (resync after garbage)
+    - a second start block before the end block abandons the truncated frame
+    - a frame that grows past max_frame without an end block is dropped
+    """
+
+    def __init__(self, max_frame=DEFAULT_MAX_FRAME):
+        self.max_frame = max_frame
+        self.discarded_bytes = 0
+        self.oversized_frames = 0
+        self._buf = bytearray()
+        self._pos = 0       # first unconsumed byte
+        self._scan = 0      # where to resume looking for END_BLOCK
+        self._exported = False
+
+    def __len__(self):
+        """Bytes buffered but not yet returned as a frame."""
+        return len(self._buf) - self._pos
+
+    def feed(self, data):
+        pos = self._pos
+        if self._exported:
+            # views into the old buffer are still out there: leave it alone
+            self._buf = self._buf[pos:]
+            self._exported = False
+        elif pos:
+            del self._buf[:pos]
+        self._scan = max(0, self._scan - pos)
+        self._pos = 0
+        self._buf += data
+
+    def __iter__(self):
+        return self._frames()
+
+    def _frames(self):
+        buf = self._buf
+        find = buf.find
+        whole = memoryview(buf)
+        pos = self._pos
+        try:
+            while True:
+                start = find(START_BLOCK, pos)
+                if start < 0:
+                    self.discarded_bytes += len(buf) - pos
+                    pos = len(buf)
+                    return
+                if start > pos:
+                    self.discarded_bytes += start - pos
+
+                scan = self._scan if self._scan > start else start + 1
+                end = find(END_BLOCK, scan)
+                restart = find(START_BLOCK, scan, len(buf) if end < 0 else end)
+                if restart >= 0:
+                    # frame was cut off by a new start block: resync to it
+                    self.discarded_bytes += restart - start
+                    pos = self._scan = restart
+                    continue
+                if end < 0:
+                    pos = start
+                    # the end block may straddle this read and the next one
+                    self._scan = len(buf) - 1
+                    if len(buf) - start > self.max_frame:
+                        self.oversized_frames += 1
+                        self.discarded_bytes += len(buf) - start
+                        pos = self._scan = len(buf)
+                    return
+
+                pos = end + 2
+                if end - start - 1 > self.max_frame:
+                    self.oversized_frames += 1
+                    self.discarded_bytes += pos - start
+                    continue
+                self._exported = True
+                yield whole[start + 1:end]
+        finally:
+            self._pos = pos
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+mllp_client.py
+Pooled, persistent MLLP client: send HL7 and wait for the ACK without a TCP
+handshake per message.
+
+- MLLPConnectionPool (asyncio) keeps up to `max_connections` keepalive
+  connections per (host, port) and up to `max_in_flight` unacknowledged
+  messages on each. ACKs are matched to messages by MSA-2 = MSH-10, falling
+  back to send order for ACKs that don't echo a known control ID.
+- Connection errors, ACK timeouts and AE answers are retried with
+  exponential backoff and jitter. AR (rejected) is final. A lost
+  connection fails every message in flight on it, so those are retried too
+  (at-least-once: receivers may see duplicates).
+- A per-endpoint circuit breaker opens after `failure_threshold`
+  consecutive connection errors or ACK timeouts (an AE is an answer, so it
+  is retried but never counts against the endpoint) and fails calls fast (CircuitOpenError) until
+  `reset_timeout` has passed; then one trial call decides whether it closes.
+- MLLPClient is the blocking facade (its own event loop in a background
+  thread) for scripts such as send_hl7.py.
+- send_many(iterable) streams messages (e.g. a .hl7 file) through the pool
+  with a bounded window, so memory does not grow with the input.
+
+Usage:
+  python mllp_client.py cloud-monitoring/demo_errors.hl7 --port 2575
+  python mllp_client.py big_batch.hl7 --connections 8 --in-flight 64
+"""
+
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import threading
+from collections import deque, namedtuple
+
+from mllp import FrameDecoder, frame
+from hl7_ack import ERROR, control_id
+from hl7_message import parse_message
+from hl7_reader import iter_messages
+
+AckResult = namedtuple("AckResult", "control_id code ack attempts")
+
+
+class MLLPError(Exception):
+    """Message could not be delivered/acknowledged."""
+
+
+class CircuitOpenError(MLLPError):
+    """Endpoint circuit breaker is open; call rejected without trying."""
+
+
+def _prepare(message):
+    """-> (bytes, MSH-10 or None)"""
+    if isinstance(message, str):
+        message = message.encode("utf-8")
+    try:
+        header = parse_message(message).header()
+    except Exception:
+        header = None
+    return message, (control_id(header) if header is not None else None)
+
+
+def _ack_fields(ack):
+    """-> (MSA-1 code, MSA-2 control ID)"""
+    msa = parse_message(ack).segment("MSA")
+    if msa is None:
+        return None, None
+    return msa.field(1) or None, msa.field(2)
+
+
+# -------------------- circuit breaker --------------------
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial = False
+
+    def allow(self):
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"circuit open ({self.failures} consecutive failures)")
+            self.state = self.HALF_OPEN
+            self._trial = False
+        if self.state == self.HALF_OPEN:
+            if self._trial:
+                raise CircuitOpenError("circuit half-open, trial call in progress")
+            self._trial = True
+
+    def success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial = False
+
+    def failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+        self._trial = False
+
+
+# -------------------- one connection --------------------
+class _Connection:
+    def __init__(self, reader, writer, max_in_flight):
+        self.reader = reader
+        self.writer = writer
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = deque()  # (control ID, future) in send order
+        self.closed = False
+        self._acks = asyncio.create_task(self._read_acks())
+
+    async def send(self, message, msg_id, timeout):
+        async with self.slots:
+            if self.closed:
+                raise ConnectionError("connection closed")
+            future = asyncio.get_running_loop().create_future()
+            self.in_flight.append((msg_id, future))
+            self.writer.write(frame(message))
+            await self.writer.drain()
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                # ACK order on this connection is now unknown: drop it
+                self._fail(ConnectionError(f"no ACK within {timeout}s"))
+                raise
+
+    async def _read_acks(self):
+        decoder = FrameDecoder()
+        try:
+            while True:
+                chunk = await self.reader.read(65536)
+                if not chunk:
+                    raise ConnectionError("connection closed by peer")
+                decoder.feed(chunk)
+                for view in decoder:
+                    self._resolve(bytes(view))
+        except (OSError, ConnectionError) as e:
+            self._fail(e)
+
+    def _resolve(self, ack):
+        code, acked_id = _ack_fields(ack)
+        entry = None
+        if acked_id:
+            for item in self.in_flight:
+                if item[0] == acked_id:
+                    entry = item
+                    break
+        if entry is None and self.in_flight:
+            entry = self.in_flight[0]  # unmatched ACK: oldest message
+        if entry is None:
+            return
+        self.in_flight.remove(entry)
+        if not entry[1].done():
+            entry[1].set_result((code, ack))
+
+    def _fail(self, exc):
+        self.closed = True
+        while self.in_flight:
+            _, future = self.in_flight.popleft()
+            if not future.done():
+                future.set_exception(exc)
+        self.writer.close()
+
+    async def close(self):
+        self.closed = True
+        self._acks.cancel()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (OSError, ConnectionError):
+            pass
+
+
+class _Endpoint:
+    def __init__(self, breaker):
+        self.connections = []
+        self.breaker = breaker
+        self.lock = asyncio.Lock()
+
+
+# -------------------- pool --------------------
+class MLLPConnectionPool:
+    def __init__(self, max_connections=4, max_in_flight=32, ack_timeout=10.0, connect_timeout=5.0,
+                 retries=5, backoff_base=0.1, backoff_max=5.0, failure_threshold=5, reset_timeout=30.0):
+        self.max_connections = max_connections
+        self.max_in_flight = max_in_flight
+        self.ack_timeout = ack_timeout
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._endpoints = {}
+        self.connects = 0
+
+    def breaker(self, host, port):
+        return self._endpoint((host, port)).breaker
+
+    def _endpoint(self, key):
+        endpoint = self._endpoints.get(key)
+        if endpoint is None:
+            endpoint = self._endpoints[key] = _Endpoint(
+                CircuitBreaker(self.failure_threshold, self.reset_timeout))
+        return endpoint
+
+    async def _acquire(self, key):
+        endpoint = self._endpoint(key)
+        endpoint.connections = [c for c in endpoint.connections if not c.closed]
+        idle = min(endpoint.connections, key=lambda c: len(c.in_flight), default=None)
+        if idle is not None and (len(idle.in_flight) < self.max_in_flight
+                                 or len(endpoint.connections) >= self.max_connections):
+            return idle
+        async with endpoint.lock:
+            if len(endpoint.connections) < self.max_connections:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(*key), self.connect_timeout)
+                sock = writer.get_extra_info("socket")
+                if sock is not None:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.connects += 1
+                conn = _Connection(reader, writer, self.max_in_flight)
+                endpoint.connections.append(conn)
+                return conn
+        return min(endpoint.connections, key=lambda c: len(c.in_flight))
+
+    def _backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def send(self, message, host="127.0.0.1", port=2575):
+        """Send one message (str/bytes) and return its AckResult; raises MLLPError."""
+        payload, msg_id = _prepare(message)
+        key = (host, port)
+        breaker = self._endpoint(key).breaker
+        last_error = result = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self._backoff(attempt - 1))
+            breaker.allow()
+            try:
+                conn = await self._acquire(key)
+                code, ack = await conn.send(payload, msg_id, self.ack_timeout)
+            except (OSError, ConnectionError, asyncio.TimeoutError) as e:
+                breaker.failure()
+                last_error, result = e, None
+                continue
+            # the endpoint answered, so the link is healthy whatever the code:
+            # an AE is this message's result (retried), not a breaker failure
+            breaker.success()
+            result = AckResult(msg_id, code, ack, attempt + 1)
+            if code != ERROR:
+                return result
+        if result is not None:
+            return result  # still AE after every retry: report it, don't raise
+        raise MLLPError(f"{host}:{port}: no ACK for {msg_id} after {self.retries + 1} attempts: {last_error}")
+
+    async def send_many(self, messages, host="127.0.0.1", port=2575, window=None, on_result=None):
+        """
+        Stream an iterable of messages with at most `window` outstanding
+        (default: every connection's in-flight limit). Returns a summary.
+        """
+        window = window or self.max_connections * self.max_in_flight
+        slots = asyncio.Semaphore(window)
+        summary = {"sent": 0, "codes": {}, "failed": 0, "retried": 0}
+        tasks = set()
+
+        async def _one(message):
+            try:
+                result = await self.send(message, host, port)
+            except MLLPError:
+                summary["failed"] += 1
+                result = None
+            else:
+                summary["codes"][result.code] = summary["codes"].get(result.code, 0) + 1
+                summary["retried"] += result.attempts > 1
+            finally:
+                slots.release()
+            if on_result is not None:
+                on_result(message, result)
+
+        for message in messages:
+            await slots.acquire()
+            summary["sent"] += 1
+            task = asyncio.create_task(_one(message))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        return summary
+
+    async def close(self):
+        for endpoint in self._endpoints.values():
+            for conn in endpoint.connections:
+                await conn.close()
+            endpoint.connections = []
+
+
+# -------------------- blocking facade --------------------
+class MLLPClient:
+    """
+    Synchronous client bound to one endpoint; the pool runs on a private
+    event loop thread so it can be used from plain scripts.
+    """
+
+    def __init__(self, host="127.0.0.1", port=2575, **pool_kwargs):
+        self.host = host
+        self.port = port
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="mllp-client", daemon=True)
+        self._thread.start()
+        self.pool = self._call(self._make_pool(pool_kwargs))
+
+    @staticmethod
+    async def _make_pool(kwargs):
+        return MLLPConnectionPool(**kwargs)
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def send(self, message):
+        return self._call(self.pool.send(message, self.host, self.port))
+
+    def send_many(self, messages, window=None, on_result=None):
+        return self._call(self.pool.send_many(messages, self.host, self.port, window, on_result))
+
+    def close(self):
+        if self._loop.is_running():
+            self._call(self.pool.close())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream an .hl7 file to an MLLP listener over pooled connections")
+    parser.add_argument("path", help=".hl7 file (see hl7_reader for the accepted layouts)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2575)
+    parser.add_argument("--connections", type=int, default=4, help="Connections to the endpoint")
+    parser.add_argument("--in-flight", type=int, default=32, help="Unacknowledged messages per connection")
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--ack-timeout", type=float, default=10.0)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    with MLLPClient(args.host, args.port, max_connections=args.connections, max_in_flight=args.in_flight,
+                    retries=args.retries, ack_timeout=args.ack_timeout) as client:
+        summary = client.send_many(iter_messages(args.path))
+        summary["connections_opened"] = client.pool.connects
+    elapsed = time.perf_counter() - t0
+    summary["elapsed_s"] = round(elapsed, 3)
+    summary["msgs_per_sec"] = round(summary["sent"] / elapsed, 1) if elapsed else 0.0
+    print(json.dumps(summary, indent=2))
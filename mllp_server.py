@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+mllp_server.py
+Asyncio MLLP server for many persistent device connections at once.
+
+Each connection gets its own reader and handler task joined by a small
+bounded queue: when the handler falls behind, the reader stops pulling from
+the socket and TCP flow control pushes back on that one device only.
+Frames are reassembled across reads by mllp.FrameDecoder, so large messages
+and several messages per connection are handled correctly.
+
+With pipelined=True (async handlers only) up to max_pending messages of
+one connection are handled concurrently while responses are still written
+in arrival order, so a sender that streams messages without waiting for
+each ACK is not held to one round trip (e.g. one WAL fsync) per message.
+
+Usage:
+  python mllp_server.py --host 127.0.0.1 --port 2575
+"""
+
+import asyncio
+import argparse
+import inspect
+import logging
+
+from mllp import FrameDecoder, DEFAULT_MAX_FRAME
+
+DEFAULT_READ_SIZE = 64 * 1024
+DEFAULT_MAX_PENDING = 32
+
+
+class MLLPServer:
+    """
+    handler(message: bytes, peer) -> bytes | None, sync or async.
+    A returned value is written back to the peer (e.g. an ACK frame).
+    """
+
+    def __init__(self, handler, host="127.0.0.1", port=2575,
+                 max_pending=DEFAULT_MAX_PENDING, read_size=DEFAULT_READ_SIZE,
+                 max_frame=DEFAULT_MAX_FRAME, pipelined=False):
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self.max_pending = max_pending
+        self.read_size = read_size
+        self.max_frame = max_frame
+        self.connections = 0
+        self.messages = 0
+        self._server = None
+        self._tasks = set()
+        self._is_async = inspect.iscoroutinefunction(handler)
+        if pipelined and not self._is_async:
+            raise ValueError("pipelined=True needs an async handler")
+        self.pipelined = pipelined
+
+    async def start(self):
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port, limit=self.read_size)
+        sock = self._server.sockets[0]
+        self.port = sock.getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        # let connection tasks that are already finishing run to completion
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _handle_connection(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        self.connections += 1
+        queue = asyncio.Queue(maxsize=self.max_pending)
+        process = self._process_pipelined if self.pipelined else self._process
+        worker = asyncio.create_task(process(queue, writer, peer))
+        try:
+            await self._read_frames(reader, queue, peer)
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logging.warning(f"MLLP connection {peer} dropped: {e}")
+        finally:
+            try:
+                await _finish(queue, worker, peer)
+            finally:
+                self.connections -= 1
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except ConnectionError:
+                    pass
+                self._tasks.discard(task)
+
+    async def _read_frames(self, reader, queue, peer):
+        decoder = FrameDecoder(self.max_frame)
+        while True:
+            chunk = await reader.read(self.read_size)
+            if not chunk:
+                if len(decoder):
+                    logging.warning(f"MLLP {peer}: {len(decoder)} bytes of partial frame discarded on close")
+                return
+            decoder.feed(chunk)
+            oversized = decoder.oversized_frames
+            for view in decoder:
+                # put() blocks while the handler is behind -> per-connection backpressure
+                await queue.put(bytes(view))
+            if decoder.oversized_frames != oversized:
+                logging.warning(f"MLLP {peer}: frame exceeds {self.max_frame} bytes, dropped")
+
+    async def _process(self, queue, writer, peer):
+        while True:
+            message = await queue.get()
+            if message is None:
+                return
+            try:
+                if self._is_async:
+                    response = await self.handler(message, peer)
+                else:
+                    response = self.handler(message, peer)
+            except Exception:
+                logging.exception(f"MLLP handler failed for message from {peer}")
+                continue
+            self.messages += 1
+            if response:
+                writer.write(response)
+                try:
+                    await writer.drain()
+                except ConnectionError:
+                    pass  # peer went away; the messages it already sent are still handled
+
+    async def _process_pipelined(self, queue, writer, peer):
+        # handler calls start in arrival order; _respond awaits them in that order
+        responses = asyncio.Queue(maxsize=self.max_pending)
+        responder = asyncio.create_task(self._respond(responses, writer, peer))
+        try:
+            while True:
+                message = await queue.get()
+                if message is None:
+                    return
+                await responses.put(asyncio.ensure_future(self.handler(message, peer)))
+        finally:
+            await _finish(responses, responder, peer)
+
+    async def _respond(self, responses, writer, peer):
+        while True:
+            pending = await responses.get()
+            if pending is None:
+                return
+            try:
+                response = await pending
+            except Exception:
+                logging.exception(f"MLLP handler failed for message from {peer}")
+                continue
+            self.messages += 1
+            if response:
+                writer.write(response)
+                if responses.empty():
+                    try:
+                        await writer.drain()
+                    except ConnectionError:
+                        pass  # peer went away; remaining handlers still complete
+
+
+async def _finish(queue, task, peer):
+    """
+    Put the end-of-input sentinel on `task`'s queue and wait for the task.
+    If the task ends first (it failed), the put is cancelled rather than
+    left blocked on a full queue; the failure is logged, not re-raised.
+    """
+    put = asyncio.ensure_future(queue.put(None))
+    try:
+        await asyncio.wait((put, task), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        put.cancel()  # no-op once it went through
+    try:
+        await task
+    except Exception:
+        logging.exception(f"MLLP connection {peer}: worker failed")
+
+
+def run_server(handler, host="127.0.0.1", port=2575, **kwargs):
+    """Blocking helper for scripts: run an MLLPServer until interrupted."""
+    server = MLLPServer(handler, host, port, **kwargs)
+
+    async def _main():
+        await server.start()
+        print(f"MLLP async server started on {host}:{server.port}... Waiting for messages.")
+        await server.serve_forever()
+
+    try:
+        asyncio.run(_main())
+    except KeyboardInterrupt:
+        print("\nMLLP server stopped by user.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Asyncio MLLP server (prints message summaries)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2575)
+    parser.add_argument("--max-pending", type=int, default=DEFAULT_MAX_PENDING,
+                        help="Queued messages per connection before reads pause")
+    args = parser.parse_args()
+
+    def _print_handler(message, peer):
+        first = message.split(b"\r", 1)[0].split(b"\n", 1)[0]
+        print(f"[{peer[0]}:{peer[1]}] {len(message)} bytes: {first.decode('utf-8', 'replace')}")
+
+    run_server(_print_handler, args.host, args.port, max_pending=args.max_pending)
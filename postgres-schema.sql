@@ -12,6 +12,10 @@ CREATE TABLE IF NOT EXISTS alerts (
     timestamp TIMESTAMP
 );
 
+-- Indexes for the Day-6 queries: latest alerts of a type, alerts per patient
+CREATE INDEX IF NOT EXISTS idx_alerts_type_ts ON alerts (alert_type, timestamp DESC);
+CREATE INDEX IF NOT EXISTS idx_alerts_patient_ts ON alerts (patient_id, timestamp DESC);
+
 -- Insert sample patients
 INSERT INTO patients (patient_id, name) VALUES
 (101, 'John Doe'),
@@ -1,47 +1,42 @@
 # day7_hl7_parser.py
 
-def parse_hl7_message(file_path):
-    with open(file_path, 'r') as f:
-        message = f.read().strip()
+import sys
+from pathlib import Path
+
+# hl7_message.py lives at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-    segments = message.split('\n')
+from hl7_message import parse_message  # noqa: E402
+from hl7_reader import iter_messages  # noqa: E402
 
-    parsed_message = {}
-    for segment in segments:
-        fields = segment.split('|')
-        segment_name = fields[0]
 
-        # For each field, handle repeating fields (~) and components (^)
-        parsed_fields = []
-        for field in fields[1:]:
-            repetitions = field.split('~')
-            parsed_reps = []
-            for rep in repetitions:
-                components = rep.split('^')
-                if len(components) > 1:
-                    parsed_reps.append(components)
-                else:
-                    parsed_reps.append(rep)
-            parsed_fields.append(parsed_reps)
+def parse_hl7_file(file_path):
+    # Messages are streamed from the file one at a time (\r, \n or \r\n
+    # terminators, MSH or MLLP boundaries). Segments are only indexed here;
+    # fields, repetitions (~) and components (^) are decoded when they are
+    # read. Repeated segments (e.g. OBX) are all kept.
+    for raw in iter_messages(file_path, blank_lines=False):
+        yield parse_message(raw)
 
-        parsed_message[segment_name] = parsed_fields
 
-    return parsed_message
+def parse_hl7_message(file_path):
+    """First message of the file."""
+    return next(parse_hl7_file(file_path), None)
 
 
 if __name__ == "__main__":
-    file_path = 'sample-hl7-messages/day7_sample_message.hl7'
-    parsed = parse_hl7_message(file_path)
-
-    print("Parsed HL7 Message:")
-    for segment, fields in parsed.items():
-        print(f"{segment}:")
-        for i, repetitions in enumerate(fields, 1):
-            print(f"  Field {i}:")
-            for rep in repetitions:
-                if isinstance(rep, list):
-                    print(f"    Components: {rep}")
-                else:
-                    print(f"    Value: {rep}")
-        print()
-
+    file_path = sys.argv[1] if len(sys.argv) > 1 else 'sample-hl7-messages/day7_sample_message.hl7'
+
+    for parsed in parse_hl7_file(file_path):
+        print("Parsed HL7 Message:")
+        for segment in parsed:
+            print(f"{segment.name}:")
+            for i in range(1, len(segment) + 1):
+                print(f"  Field {i}:")
+                for rep in range(len(segment.repetitions(i))):
+                    components = segment.components(i, rep)
+                    if len(components) > 1:
+                        print(f"    Components: {components}")
+                    else:
+                        print(f"    Value: {components[0] if components else ''}")
+            print()
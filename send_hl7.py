@@ -1,4 +1,10 @@
 import socket
+import argparse
+
+from mllp import FrameDecoder, frame
+from hl7_ack import ack_code
+from hl7_reader import iter_messages
+from mllp_client import MLLPClient
 
 # Sample HL7 ORU^R01 message
 HL7_MESSAGE = """MSH|^~\\&|Device1|Ward1|EMR|Main|202508031010||ORU^R01|MSG00001|P|2.3
@@ -6,12 +12,48 @@ PID|||123456||DOE^JOHN
 OBR|1|||DIA001^DIALYSIS^L
 OBX|1|NM|BP^Blood Pressure||145|mmHg"""
 
-def send_hl7(ip='127.0.0.1', port=2575):
-    mllp = b'\x0b' + HL7_MESSAGE.encode('utf-8') + b'\x1c\x0d'  # MLLP framing
+def read_ack(sock, timeout=5.0):
+    """Block until one MLLP frame (the ACK) arrives; returns its bytes."""
+    sock.settimeout(timeout)
+    decoder = FrameDecoder()
+    while True:
+        for view in decoder:
+            return bytes(view)
+        chunk = sock.recv(4096)
+        if not chunk:
+            raise ConnectionError("connection closed before ACK")
+        decoder.feed(chunk)
+
+
+def send_hl7(ip='127.0.0.1', port=2575, wait_ack=False):
+    mllp = frame(HL7_MESSAGE)  # MLLP framing
     with socket.create_connection((ip, port)) as sock:
         sock.sendall(mllp)
         print(f"HL7 message sent successfully to {ip}:{port}")
+        if wait_ack:
+            ack = read_ack(sock)
+            print(f"ACK received: MSA-1={ack_code(ack)}")
+            return ack_code(ack)
+
+
+def send_file(path, ip='127.0.0.1', port=2575, connections=4):
+    """Stream every message in an .hl7 file over pooled connections, waiting for ACKs."""
+    with MLLPClient(ip, port, max_connections=connections) as client:
+        summary = client.send_many(iter_messages(path))
+    print(f"{summary['sent']} message(s) sent to {ip}:{port}: ACK codes {summary['codes']}, "
+          f"{summary['failed']} failed")
+    return summary
 
 
 if __name__ == "__main__":
-    send_hl7()
+    parser = argparse.ArgumentParser(description="Send the sample ORU^R01 over MLLP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2575)
+    parser.add_argument("--wait-ack", action="store_true",
+                        help="Wait for the listener's ACK (hl7_listener.py --pipeline)")
+    parser.add_argument("--file", help="Send every message of this .hl7 file instead (pooled, ACKed)")
+    args = parser.parse_args()
+    if args.file:
+        send_file(args.file, args.host, args.port)
+    else:
+        send_hl7(args.host, args.port, args.wait_ack)